@@ -0,0 +1,321 @@
+# asyncio interface to the GZIP decoder, for sockets and subprocess pipes
+# Teoria da Informacao, LEI
+
+import asyncio
+import threading
+from collections import deque
+
+from gzip import GZIP, GZIPError
+from outputwindow import OutputWindow, WINDOW_SIZE
+
+
+# compressed bytes requested from the source at a time
+READ_SIZE = 1 << 16
+
+# compressed bytes read ahead of the decoder (above this, the source is not read)
+PREFETCH = 1 << 18
+
+# output decoded between two returns to the event loop, when decoding in the loop
+ASYNC_FLUSH_SIZE = 1 << 16
+
+# decoding phases of AsyncGZIPDecoder (in the loop)
+HEADER, BLOCKS = 0, 1
+
+
+class _Underrun(Exception):
+    ''' raised by a non blocking FeedBuffer when the decoder needs input that was not received yet '''
+
+
+class FeedBuffer:
+    ''' binary file object over the data fed to it by the event loop, read by the decoder.
+
+        When blocking, read waits for more data (the decoder runs in another thread); otherwise
+        it raises _Underrun. The data from the last release offset onwards is kept, so that
+        the decoder can seek back to a checkpoint and decode it again. '''
+
+    def __init__(self, blocking=True, retain=False):
+        self.blocking = blocking
+        self.retain = retain      # se False, os chunks ja lidos sao descartados
+        self.chunks = deque()     # (offset, bytes)
+        self.pos = 0              # next offset to read
+        self.end = 0              # offset after the last byte fed
+        self.eof = False
+        self.closed = False
+        self.cond = threading.Condition()
+        self.onConsume = None     # called (from the reading thread) after each read
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def buffered(self):
+        ''' number of bytes fed and not read yet '''
+
+        return self.end - self.pos
+
+    def feed(self, data):
+        with self.cond:
+            if data:
+                self.chunks.append((self.end, bytes(data)))
+                self.end += len(data)
+            self.cond.notify_all()
+
+    def feedEOF(self):
+        with self.cond:
+            self.eof = True
+            self.cond.notify_all()
+
+    def close(self):
+        ''' makes pending and future reads fail (to stop a decoder waiting for input) '''
+
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def read(self, n=-1):
+        with self.cond:
+            while self.pos >= self.end and not self.eof and not self.closed:
+                if not self.blocking:
+                    raise _Underrun()
+                self.cond.wait()
+            if self.closed:
+                raise ValueError('read from a closed FeedBuffer')
+            if self.pos >= self.end:
+                return b''
+
+            # chunk que contem pos (os anteriores ja foram libertados ou estao retidos)
+            for offset, chunk in self.chunks:
+                if offset + len(chunk) > self.pos:
+                    break
+            start = self.pos - offset
+            stop = len(chunk) if n is None or n < 0 else min(len(chunk), start + n)
+            data = chunk[start:stop]
+            self.pos += len(data)
+            if not self.retain:
+                self.release(self.pos)
+
+        if self.onConsume is not None:
+            self.onConsume()
+        return data
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        ''' moves back (or forward) to offset, which must not be before the released data '''
+
+        with self.cond:
+            if whence != 0 or offset < (self.chunks[0][0] if self.chunks else self.end):
+                raise ValueError('cannot seek to %d' % offset)
+            self.pos = offset
+            return offset
+
+    def release(self, offset):
+        ''' drops the chunks that end before offset (they will not be read again) '''
+
+        while self.chunks and self.chunks[0][0] + len(self.chunks[0][1]) <= min(offset, self.pos):
+            self.chunks.popleft()
+
+
+class AsyncGZIPDecoder:
+    ''' asynchronous iterator of the decompressed data of a gzip stream read from source, an
+        asyncio.StreamReader (or any object with a coroutine read(n) returning b'' at the end):
+
+            async for chunk in AsyncGZIPDecoder(reader):
+                ...
+
+        Input is only read while less than prefetch bytes are waiting to be decoded, and output
+        is only decoded when the consumer asks for it, so a slow consumer slows down the source.
+
+        With executor=None the blocks are decoded in the event loop, returning to it after each
+        ASYNC_FLUSH_SIZE bytes of output. If the decoder runs out of input in the middle of a
+        block, it goes back to the start of that block once more input arrives (so decoding
+        never waits inside the loop). Otherwise decoding runs on executor (a concurrent.futures
+        executor, or 'default' for the loop's), where it can wait for input, leaving the loop free.
+        Raises GZIPError if the stream is not valid '''
+
+    def __init__(self, source, executor=None, prefetch=PREFETCH, readSize=READ_SIZE, verify=True):
+        self.source = source
+        self.executor = executor
+        self.prefetch = prefetch
+        self.readSize = readSize
+        self.verify = verify
+        self.size = 0         # decompressed bytes returned
+        self.numMembers = 0
+
+    def __aiter__(self):
+        if self.executor is None:
+            return self.decodeInLoop()
+        return self.decodeInExecutor()
+
+    async def readMore(self, feed):
+        ''' reads the next piece of the source into feed. Returns False at its end '''
+
+        data = await self.source.read(self.readSize)
+        if not data:
+            feed.feedEOF()
+            return False
+        feed.feed(data)
+        return True
+
+    # ---------------------------------------------------------------- decoding in an executor
+
+    async def decodeInExecutor(self):
+        loop = asyncio.get_running_loop()
+        executor = None if self.executor == 'default' else self.executor
+        feed = FeedBuffer(blocking=True)
+        space = asyncio.Event()
+        feed.onConsume = lambda: loop.call_soon_threadsafe(space.set)
+
+        async def pump():
+            try:
+                while not feed.eof:
+                    while feed.buffered() >= self.prefetch:
+                        space.clear()
+                        await space.wait()
+                    await self.readMore(feed)
+            except BaseException:
+                # o decoder pode estar a espera de input que ja nao vem
+                feed.close()
+                raise
+
+        gz = GZIP(feed, verify=self.verify)
+        views = gz.stream()
+
+        def step():
+            # a memoryview so e valida ate ao passo seguinte: copia-a
+            view = next(views, None)
+            return None if view is None else bytes(view)
+
+        pumping = asyncio.ensure_future(pump())
+        try:
+            while True:
+                try:
+                    data = await loop.run_in_executor(executor, step)
+                except GZIPError:
+                    # um erro da fonte e mais informativo do que o do decoder que ficou sem input
+                    if pumping.done() and not pumping.cancelled() and pumping.exception() is not None:
+                        raise pumping.exception()
+                    raise
+                if data is None:
+                    break
+                self.size += len(data)
+                yield data
+            self.numMembers = gz.numMembers
+        finally:
+            pumping.cancel()
+            feed.close()
+
+    # ---------------------------------------------------------------- decoding in the loop
+
+    async def decodeInLoop(self):
+        self.feed = feed = FeedBuffer(blocking=False, retain=True)
+        gz = self.gz = GZIP(feed, verify=self.verify, onBlockStart=self.checkpoint)
+        self.phase = HEADER
+        self.window = None
+        self.crc = 0
+        self.produced = 0     # bytes of the current member taken from the window
+        self.delivered = 0    # bytes of the current member already returned (more after a rewind)
+        self.ck = None
+
+        steps = self.run()
+        while True:
+            while not feed.eof and feed.buffered() < self.prefetch:
+                await self.readMore(feed)
+            try:
+                view = next(steps)
+            except StopIteration:
+                break
+            except _Underrun:
+                # volta ao ultimo ponto seguro e espera por mais input (pelo menos o dobro,
+                # para que um bloco maior do que prefetch nao seja descodificado muitas vezes)
+                self.rewind()
+                steps = self.run()
+                need = max(self.prefetch, 2 * feed.buffered())
+                while await self.readMore(feed) and feed.buffered() < need:
+                    pass
+                continue
+            except GZIPError:
+                raise
+            except (ValueError, EOFError) as e:
+                raise GZIPError(str(e)) from e
+
+            # depois de um rewind, o que ja foi entregue e descodificado outra vez
+            start = self.produced
+            self.produced += len(view)
+            if self.delivered > start:
+                view = view[min(self.delivered - start, len(view)):]
+            self.delivered = max(self.delivered, self.produced)
+            if view:
+                self.size += len(view)
+                yield bytes(view)
+            await asyncio.sleep(0)
+
+        self.numMembers = gz.numMembers
+
+    def run(self):
+        ''' generator of the output from the current phase onwards: member headers, then the
+            blocks of the member (from the last checkpoint, after a rewind) '''
+
+        gz = self.gz
+        while True:
+            if self.phase == HEADER:
+                self.headerBit = gz.reader.tell()
+                self.feed.release(self.headerBit // 8)
+                if gz.numMembers == 0:
+                    if gz.getHeader() != 0:
+                        raise GZIPError('invalid gzip header')
+                elif not gz.nextMember():
+                    return
+                self.phase = BLOCKS
+                self.window = OutputWindow(ASYNC_FLUSH_SIZE)
+                self.crc = 0
+                self.produced = self.delivered = 0
+                self.ck = None
+
+            yield from gz.inflate(self.window, self.crc)
+            self.phase = HEADER
+
+    def checkpoint(self, gz):
+        ''' onBlockStart: saves what is needed to decode again from the start of this block '''
+
+        w = gz.window
+        # os ultimos 32 KB e os bytes ainda nao entregues
+        start = min(w.flushed, max(0, w.pos - WINDOW_SIZE))
+        self.ck = (gz.reader.tell(), bytes(w.buf[start:w.pos]), w.pos - w.flushed, w.total, gz.crc, gz.numBlocks)
+        self.feed.release(self.ck[0] // 8)
+
+    def rewind(self):
+        ''' restores the decoder to the last checkpoint (or member header) after an underrun '''
+
+        gz = self.gz
+        if self.phase == HEADER or self.ck is None:
+            self.phase = HEADER
+            gz.reader.seekBit(self.headerBit)
+            return
+
+        bit, history, pending, total, crc, numBlocks = self.ck
+        window = OutputWindow(ASYNC_FLUSH_SIZE)
+        window.write(history)
+        window.flushed = window.pos - pending
+        window.total = total
+        self.window = window
+        self.crc = crc
+        gz.numBlocks = numBlocks
+        gz.reader.seekBit(bit)
+        self.produced = total
+
+
+async def decompressStream(source, out, executor=None):
+    ''' decodes the gzip stream source (an asyncio.StreamReader) and writes the output to out,
+        an asyncio.StreamWriter (waiting for it to drain) or a binary file. Returns the number
+        of bytes written '''
+
+    decoder = AsyncGZIPDecoder(source, executor)
+    async for chunk in decoder:
+        out.write(chunk)
+        if isinstance(out, asyncio.StreamWriter):
+            await out.drain()
+    return decoder.size
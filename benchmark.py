@@ -0,0 +1,594 @@
+# Benchmarks for the GZIP decoder (and compressor) over the example files
+# Teoria da Informacao, LEI
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import crc32
+from compressor import compress
+from gzip import GZIP
+from huffmantree import HuffmanTree
+from huffmantable import canonicalCodes
+from parallel import decompressSpeculative
+from sinks import HashSink
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples to decompress')
+RESULTS_DIR = os.path.join(EXAMPLES_DIR, 'results')
+
+
+def exampleFiles():
+    ''' returns the paths of the .gz files in the examples folder '''
+
+    return sorted(os.path.join(EXAMPLES_DIR, name) for name in os.listdir(EXAMPLES_DIR) if name.endswith('.gz'))
+
+
+def treeFromLens(lenArray):
+    ''' builds a HuffmanTree with the canonical codes of the given code lengths '''
+
+    htr = HuffmanTree()
+    codes = canonicalCodes(lenArray)
+    for n, length in enumerate(lenArray):
+        if length != 0:
+            htr.addCode(codes[n], length, n)
+    return htr
+
+
+class TreeWalkGZIP(GZIP):
+    ''' reference decoder: descends a HuffmanTree one bit at a time for every symbol,
+        the way GZIP decoded before using lookup tables '''
+
+    literalPairs = False
+
+    def createDecodeTable(self, lenArray):
+        return treeFromLens(lenArray)
+
+    def getFixedTables(self):
+        return treeFromLens(self.FixedLITLENLens), treeFromLens(self.FixedDISTLens)
+
+    def decodeSymbol(self, tree):
+        tree.resetCurNode()
+        while True:
+            code = tree.nextNode(self.readBits(1))
+            if code == -1:
+                raise ValueError('invalid Huffman code')
+            if code != -2:
+                return code
+
+    def decompressLZ77(self, LITLENTree, DISTTree):
+        window = self.window
+        while not window.isFull():
+            code = self.decodeSymbol(LITLENTree)
+            if code < 256:
+                window.buf[window.pos] = code
+                window.pos += 1
+                continue
+            if code == 256:
+                return True
+
+            if code < 265:
+                length = code - 257 + 3
+            else:
+                length = self.ExtraLITLENLens[code - 265] + self.readBits(self.ExtraLITLENBits[code - 265])
+
+            code = self.decodeSymbol(DISTTree)
+            if code < 4:
+                distance = code + 1
+            else:
+                distance = self.ExtraDISTLens[code - 4] + self.readBits(self.ExtraDISTBits[code - 4])
+
+            window.copyMatch(distance, length)
+        return False
+
+
+def timeDecompress(decoderClass, path, repeat=1):
+    ''' decompresses path with decoderClass inside a temporary folder and returns
+        (best time in seconds, decompressed bytes) '''
+
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for i in range(repeat):
+                gz = decoderClass(path)
+                start = time.perf_counter()
+                outPath = gz.decompress()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            with open(outPath, 'rb') as f:
+                data = f.read()
+        finally:
+            os.chdir(cwd)
+    return best, data
+
+
+def timeRuns(run, repeat=3):
+    ''' calls run until MIN_TIME has passed, repeat times, and returns the best time per call '''
+
+    best = None
+    for i in range(repeat):
+        runs = 0
+        start = time.perf_counter()
+        while True:
+            run()
+            runs += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_TIME:
+                break
+        elapsed /= runs
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def streamAll(decoderClass, path):
+    ''' decodes path with decoderClass, without storing the output '''
+
+    gz = decoderClass(path)
+    for view in gz.stream():
+        pass
+    gz.close()
+
+
+def checkResult(path, data):
+    ''' compares decompressed data with the expected file in the results folder (None if there is none) '''
+
+    expected = os.path.join(RESULTS_DIR, os.path.basename(path)[:-3])
+    if not os.path.exists(expected):
+        return None
+    with open(expected, 'rb') as f:
+        return f.read() == data
+
+
+def benchHuffman(paths, repeat=1):
+    ''' compares table-driven decoding (GZIP) against the bit-by-bit tree walk (TreeWalkGZIP) '''
+
+    print('%-26s %12s %12s %12s %8s %4s' % ('file', 'bytes', 'tree (s)', 'table (s)', 'speedup', 'ok'))
+    for path in paths:
+        treeTime, treeData = timeDecompress(TreeWalkGZIP, path, repeat)
+        tableTime, tableData = timeDecompress(GZIP, path, repeat)
+        ok = treeData == tableData and checkResult(path, tableData) is not False
+        print('%-26s %12d %12.3f %12.3f %7.2fx %4s' % (os.path.basename(path), len(tableData),
+              treeTime, tableTime, treeTime / tableTime, 'yes' if ok else 'NO'))
+
+
+def benchCRC(paths, repeat=5):
+    ''' measures the cost of verifying the trailer (CRC32 and ISIZE) on the total decode time,
+        and the throughput of the CRC engines on the decompressed data. The output is not
+        written. The decoders with and without verification run in pairs (each run lasting at
+        least MIN_TIME), at least repeat times and for 2 * repeat * MIN_TIME seconds: the best
+        time of each is shown and the overhead is the median ratio of the pairs. crc share is the
+        time of crc32.crc32 alone over the output, against the decode time without it '''
+
+    print('%-26s %12s %12s %12s %9s %9s %13s %13s' % ('file', 'bytes', 'no crc (s)', 'crc (s)', 'overhead',
+          'crc share', 'native MB/s', 'slice8 MB/s'))
+    for path in paths:
+        # pares de execucoes seguidas: a mediana das razoes e pouco afetada pelas variacoes da maquina
+        times = {False: [], True: []}
+        start = time.perf_counter()
+        while len(times[True]) < repeat or time.perf_counter() - start < 2 * repeat * MIN_TIME:
+            for verify in (False, True):
+                times[verify].append(timeRuns(partial(streamAll, partial(GZIP, verify=verify), path), 1))
+        plainTime, verifyTime = min(times[False]), min(times[True])
+        overhead = statistics.median(v / p for p, v in zip(times[False], times[True])) - 1
+        data = b''.join(bytes(view) for view in GZIP(path).stream())
+        # o custo do CRC calculado a parte, sem o ruido da descodificacao
+        share = timeRuns(partial(crc32.crc32, data)) / plainTime
+
+        rates = []
+        for engine in (crc32.nativeCRC32, crc32.crc32Slicing8):
+            if engine is None:
+                rates.append(float('nan'))
+                continue
+            rates.append(len(data) / 1e6 / max(timeRuns(partial(engine, data), 1), 1e-9))
+
+        print('%-26s %12d %12.3f %12.3f %8.1f%% %8.2f%% %13.1f %13.1f' % (os.path.basename(path), len(data), plainTime,
+              verifyTime, 100 * overhead, 100 * share, rates[0], rates[1]))
+
+
+def benchCompress(paths, levels=range(1, 10)):
+    ''' compresses the decompressed contents of each file at every level and reports ratio and
+        throughput, checking that the output decodes back with GZIP and with zlib '''
+
+    print('%-26s %5s %12s %12s %7s %10s %10s %4s' % ('file', 'level', 'bytes', 'compressed', 'ratio',
+          'time (s)', 'MB/s', 'ok'))
+    for path in paths:
+        gz = GZIP(path)
+        data = b''.join(bytes(view) for view in gz.stream())
+        gz.close()
+
+        for level in levels:
+            start = time.perf_counter()
+            packed = compress(data, level)
+            elapsed = time.perf_counter() - start
+
+            gz = GZIP(io.BytesIO(packed))
+            ok = b''.join(bytes(view) for view in gz.stream()) == data
+            if zlib is not None:
+                ok = ok and zlib.decompress(packed, 31) == data
+
+            print('%-26s %5d %12d %12d %6.1f%% %10.3f %10.2f %4s' % (os.path.basename(path), level, len(data),
+                  len(packed), 100 * len(packed) / max(len(data), 1), elapsed, len(data) / 1e6 / max(elapsed, 1e-9),
+                  'yes' if ok else 'NO'))
+
+
+# synthetic corpora: name -> function(size, rng) returning size bytes
+SYNTHETIC = {
+    'text': lambda size, rng: makeText(size, rng),
+    'random': lambda size, rng: rng.randbytes(size),
+    'runs': lambda size, rng: b''.join(bytes([rng.randrange(4)]) * rng.randrange(1, 300)
+                                       for i in range(size // 100 + 1))[:size],
+}
+
+# default size of the synthetic corpora and allowed throughput loss against a baseline
+SYNTHETIC_SIZE = 1 << 20
+THRESHOLD = 0.10
+
+# minimum duration of a timed run: small files are decoded several times and the mean is kept
+MIN_TIME = 0.2
+
+
+def makeText(size, rng):
+    ''' pseudo text: words of a small vocabulary with a skewed (Zipf like) frequency '''
+
+    letters = 'etaoinshrdlucmfwypvbgkqjxz'
+    vocabulary = [''.join(rng.choice(letters) for k in range(rng.randint(1, 9))) for i in range(2000)]
+    weights = [1 / (i + 1) for i in range(len(vocabulary))]
+    words = []
+    length = 0
+    while length < size:
+        line = ' '.join(rng.choices(vocabulary, weights, k=12)) + '.\n'
+        words.append(line)
+        length += len(line)
+    return ''.join(words).encode('ascii')[:size]
+
+
+def syntheticCorpus(folder, size=SYNTHETIC_SIZE, seed=2024):
+    ''' writes the synthetic corpora (and their gzip files) to folder.
+        Returns a list of (name, gzip path, expected output path) '''
+
+    rng = random.Random(seed)
+    corpus = []
+    for name, generate in SYNTHETIC.items():
+        data = generate(size, rng)
+        expected = os.path.join(folder, name)
+        with open(expected, 'wb') as f:
+            f.write(data)
+        # o zlib e muito mais rapido; o compressor do projeto serve de alternativa
+        packed = zlib.compress(data, 6, 31) if zlib is not None else compress(data, 1)
+        with open(expected + '.gz', 'wb') as f:
+            f.write(packed)
+        corpus.append(('synthetic-%s' % name, expected + '.gz', expected))
+    return corpus
+
+
+def peakRSS():
+    ''' peak resident set size of the process in bytes (None if unknown) '''
+
+    # em Linux o ru_maxrss passa do pai para o filho (fork e exec); o VmHWM e so deste programa
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes em Linux, bytes em macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def decodePeakRSS(path):
+    ''' decodes path and returns the peak resident set size of the process. Runs in a new
+        process (see measure), so that the value is not the maximum of all the previous files '''
+
+    gz = GZIP(path)
+    for view in gz.stream():
+        pass
+    gz.close()
+    return peakRSS()
+
+
+def measure(path, expected=None, repeat=3):
+    ''' decodes path repeat times and once more under tracemalloc, comparing the output with
+        the file expected. Each timed run lasts at least MIN_TIME (decoding the file several
+        times if needed). Returns a dict with the best time per decode, throughput, peak memory
+        (traced and, measured in a new process, resident) and the time per phase (from the
+        block statistics) of the best run '''
+
+    best = stats = None
+    size = 0
+    for i in range(repeat):
+        runs = 0
+        start = time.perf_counter()
+        while True:
+            gz = GZIP(path)
+            size = 0
+            for view in gz.stream():
+                size += len(view)
+            gz.close()
+            runs += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_TIME:
+                break
+        elapsed /= runs
+        if best is None or elapsed < best:
+            best, stats = elapsed, gz.totalStats
+
+    # verificacao byte a byte e memoria (a parte, porque o tracemalloc atrasa o decoder)
+    ok = None
+    tracemalloc.start()
+    try:
+        gz = GZIP(path)
+        if expected is not None:
+            with open(expected, 'rb') as f:
+                ok = True
+                for view in gz.stream():
+                    ok = ok and f.read(len(view)) == view
+                ok = ok and f.read(1) == b''
+        else:
+            for view in gz.stream():
+                pass
+        gz.close()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # o pico de RSS e do processo inteiro e nunca desce: mede-se num processo novo
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        rss = pool.submit(decodePeakRSS, path).result()
+
+    return {
+        'bytes': size,
+        'compressed': os.path.getsize(path),
+        'seconds': best,
+        'mbps': size / 1e6 / max(best, 1e-9),
+        'peak_traced': peak,
+        'peak_rss': rss,
+        'phases': {name: getattr(stats, name) for name in ('headerTime', 'tableTime', 'decodeTime', 'flushTime')},
+        'blocks': gz.numBlocks,
+        'ok': ok,
+    }
+
+
+def compareBaseline(results, baseline, threshold=THRESHOLD):
+    ''' returns the names of the entries whose throughput fell more than threshold
+        (a fraction) below the baseline '''
+
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is not None and result['mbps'] < base['mbps'] * (1 - threshold):
+            regressions.append(name)
+    return regressions
+
+
+def benchSuite(paths, size=SYNTHETIC_SIZE, repeat=3, output=None, baseline=None, threshold=THRESHOLD):
+    ''' regression suite: decodes the example files (checked against the results folder) and
+        the synthetic corpora, prints throughput, memory and time per phase, optionally saves
+        the results as JSON and compares them with a saved baseline.
+        Returns 1 if an output is wrong or the throughput regressed, 0 otherwise '''
+
+    results = {}
+    print('%-26s %12s %9s %10s %10s %9s %9s %9s %9s %4s' % ('file', 'bytes', 'time (s)', 'MB/s', 'peak KB',
+          'header', 'tables', 'decode', 'flush', 'ok'))
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = []
+        for path in paths:
+            expected = os.path.join(RESULTS_DIR, os.path.basename(path)[:-3])
+            corpus.append((os.path.basename(path), path, expected if os.path.exists(expected) else None))
+        if size > 0:
+            corpus += syntheticCorpus(tmp, size)
+
+        for name, path, expected in corpus:
+            result = results[name] = measure(path, expected, repeat)
+            phases = result['phases']
+            print('%-26s %12d %9.3f %10.2f %10d %9.3f %9.3f %9.3f %9.3f %4s' % (name, result['bytes'], result['seconds'],
+                  result['mbps'], result['peak_traced'] // 1024, phases['headerTime'], phases['tableTime'],
+                  phases['decodeTime'], phases['flushTime'], {True: 'yes', False: 'NO', None: '-'}[result['ok']]))
+
+    status = 0
+    if any(result['ok'] is False for result in results.values()):
+        print('output differs from the expected result')
+        status = 1
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'time': time.time(), 'results': results}, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compareBaseline(results, json.load(f)['results'], threshold)
+        for name in regressions:
+            print('regression: %s is more than %d%% slower than the baseline' % (name, 100 * threshold))
+        if regressions:
+            status = 1
+
+    return status
+
+
+def literalCorpus(folder, size=SYNTHETIC_SIZE, seed=2024):
+    ''' writes gzip files of synthetic text and binary data made mostly of literals (Huffman
+        coding only, no matches) to folder. Returns a list of (name, gzip path) '''
+
+    if zlib is None:
+        return []
+    rng = random.Random(seed)
+    samples = {
+        'text': makeText(size, rng),
+        # bytes com uma distribuicao pouco enviesada, como em dados binarios comprimiveis
+        'binary': bytes(min(255, int(rng.expovariate(1 / 40))) for i in range(size)),
+    }
+    corpus = []
+    for name, data in samples.items():
+        packer = zlib.compressobj(6, zlib.DEFLATED, 31, 8, zlib.Z_HUFFMAN_ONLY)
+        path = os.path.join(folder, name + '-literals.gz')
+        with open(path, 'wb') as f:
+            f.write(packer.compress(data) + packer.flush())
+        corpus.append(('synthetic-%s-literals' % name, path))
+    return corpus
+
+
+def benchLiterals(paths, size=SYNTHETIC_SIZE, repeat=3):
+    ''' compares literal/length tables with pairs of literals (GZIP.literalPairs) against one
+        symbol per lookup, on the example files and on synthetic text and binary data (with
+        matches, and made only of literals). Every table is built again (no cache), so the
+        cost of the wider tables is included '''
+
+    single = type('SingleLiteralGZIP', (GZIP,), {'literalPairs': False, 'tableCache': None})
+    pairs = type('LiteralPairsGZIP', (GZIP,), {'literalPairs': True, 'tableCache': None})
+
+    print('%-30s %10s %9s %12s %12s %8s %4s' % ('file', 'bytes', 'literals', 'single (s)', 'pairs (s)', 'speedup', 'ok'))
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = [(os.path.basename(path), path) for path in paths]
+        if size > 0:
+            corpus += [(name, path) for name, path, expected in syntheticCorpus(tmp, size) if name != 'synthetic-runs']
+            corpus += literalCorpus(tmp, size)
+
+        for name, path in corpus:
+            singleTime, singleData = timeDecompress(single, path, repeat)
+            pairsTime, pairsData = timeDecompress(pairs, path, repeat)
+
+            gz = GZIP(path)
+            for view in gz.stream():
+                pass
+            gz.close()
+            literals = gz.totalStats.literals / max(gz.totalStats.bytes, 1)
+
+            print('%-30s %10d %8.1f%% %12.3f %12.3f %7.2fx %4s' % (name, len(pairsData), 100 * literals, singleTime,
+                  pairsTime, singleTime / pairsTime, 'yes' if pairsData == singleData else 'NO'))
+
+
+# size of the corpora of the speculative benchmark and compressed bytes per chunk (several per file)
+SPECULATIVE_SIZE = 1 << 22
+SPECULATIVE_CHUNK = 1 << 18
+
+
+def mixedData(size, rng):
+    ''' pieces of pseudo text and of random bytes alternating, as in an archive of text and
+        compressed files: the deflate stream mixes dynamic and stored blocks '''
+
+    pieces = []
+    length = 0
+    while length < size:
+        n = rng.randrange(1 << 17, 1 << 19)
+        pieces.append(makeText(n, rng) if len(pieces) % 2 == 0 else rng.randbytes(n))
+        length += n
+    return b''.join(pieces)[:size]
+
+
+def poolTime(jobs):
+    ''' seconds taken to start and stop a pool of jobs processes '''
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(jobs) as pool:
+        list(pool.map(abs, range(jobs)))
+    return time.perf_counter() - start
+
+
+def benchSpeculative(paths, size=SPECULATIVE_SIZE, repeat=3, jobs=0, threshold=THRESHOLD):
+    ''' compares the speculative parallel decoding of a member (parallel.decompressSpeculative on
+        jobs processes, 0: one per CPU) with sequential decoding, on the example files and on
+        stored (random), mixed and text data. Returns 1 if an output is wrong or the speculative
+        mode is more than threshold slower than the sequential one (besides starting its
+        processes), 0 otherwise '''
+
+    jobs = jobs or os.cpu_count() or 1
+    overhead = poolTime(jobs)
+    print('%d processes, %d CPUs, %.3f s to start them' % (jobs, os.cpu_count() or 1, overhead))
+    print('%-26s %12s %12s %16s %8s %4s' % ('file', 'bytes', 'sequential (s)', 'speculative (s)', 'ratio', 'ok'))
+
+    status = 0
+    rng = random.Random(2024)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = [(os.path.basename(path), path) for path in paths]
+        samples = (('stored', rng.randbytes(size)), ('mixed', mixedData(size, rng)), ('text', makeText(size, rng)))
+        for name, data in samples if size > 0 else ():
+            path = os.path.join(tmp, name + '.gz')
+            with open(path, 'wb') as f:
+                f.write(zlib.compress(data, 6, 31) if zlib is not None else compress(data, 1))
+            corpus.append(('synthetic-%s' % name, path))
+
+        for name, path in corpus:
+            sequential = speculative = None
+            for i in range(repeat):
+                start = time.perf_counter()
+                gz = GZIP(path)
+                gz.getHeader()
+                expected = HashSink()
+                gz.decompressTo(expected)
+                gz.close()
+                elapsed = time.perf_counter() - start
+                sequential = elapsed if sequential is None else min(sequential, elapsed)
+
+                start = time.perf_counter()
+                out = HashSink()
+                decompressSpeculative(path, out, jobs, SPECULATIVE_CHUNK)
+                elapsed = time.perf_counter() - start
+                speculative = elapsed if speculative is None else min(speculative, elapsed)
+
+            ok = out.hexdigest() == expected.hexdigest()
+            print('%-26s %12d %14.3f %16.3f %7.2fx %4s' % (name, expected.size, sequential, speculative,
+                  speculative / max(sequential, 1e-9), 'yes' if ok else 'NO'))
+            if not ok:
+                status = 1
+            elif speculative > sequential * (1 + threshold) + overhead:
+                print('slower: %s takes %.3f s speculatively, %.3f s sequentially' % (name, speculative, sequential))
+                status = 1
+
+    return status
+
+
+BENCHMARKS = {'huffman': benchHuffman, 'crc': benchCRC, 'compress': benchCompress, 'suite': benchSuite,
+              'literals': benchLiterals, 'speculative': benchSpeculative}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='benchmarks of the GZIP decoder')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help='benchmark to run')
+    parser.add_argument('files', nargs='*', help='.gz files to use (default: the examples folder)')
+    suite = parser.add_argument_group('suite, literals and speculative options')
+    suite.add_argument('--size', type=int, help='size of the synthetic corpora (0: none; default %d, %d for speculative)'
+                       % (SYNTHETIC_SIZE, SPECULATIVE_SIZE))
+    suite.add_argument('--repeat', type=int, default=3, help='timed runs per file (the best is kept)')
+    suite.add_argument('--json', help='save the results to this JSON file')
+    suite.add_argument('--baseline', help='JSON file of a previous run to compare against')
+    suite.add_argument('--threshold', type=float, default=THRESHOLD,
+                       help='fail if the throughput drops more than this fraction (default %(default)s)')
+    suite.add_argument('-j', '--jobs', type=int, default=0, help='processes of the speculative mode (default: one per CPU)')
+    args = parser.parse_intermixed_args()
+
+    paths = [os.path.abspath(p) for p in args.files] or exampleFiles()
+    size = args.size if args.size is not None else SPECULATIVE_SIZE if args.benchmark == 'speculative' else SYNTHETIC_SIZE
+    if args.benchmark == 'suite':
+        sys.exit(benchSuite(paths, size, args.repeat, args.json, args.baseline, args.threshold))
+    if args.benchmark == 'literals':
+        sys.exit(benchLiterals(paths, size, args.repeat))
+    if args.benchmark == 'speculative':
+        sys.exit(benchSpeculative(paths, size, args.repeat, args.jobs, args.threshold))
+    BENCHMARKS[args.benchmark](paths)
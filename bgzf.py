@@ -0,0 +1,374 @@
+# BGZF (blocked gzip): writer, detection, parallel decoding and random access by virtual offsets
+# Teoria da Informacao, LEI
+
+import io
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from compressor import DEFAULT_LEVEL, DeflateEncoder
+from crc32 import crc32
+from gzip import GZIP, GZIPHeader, GZIPError
+
+
+# BGZF files are a series of gzip members (blocks) of at most MAX_BLOCK bytes each, whose header
+# has an extra subfield 'BC' holding the size of the block minus one (BSIZE, 16 bits)
+BGZF_ID = b'BC'
+MAX_BLOCK = 1 << 16
+
+# uncompressed bytes per block (as htslib): even stored (incompressible) data fits in a block
+BLOCK_DATA = 0xff00
+
+# header of a block: 10 fixed bytes, XLEN and the 'BC' subfield; followed by the deflate data
+# and the 8 byte trailer
+BLOCK_HEADER_SIZE = 18
+TRAILER_SIZE = 8
+
+# empty block that ends a BGZF file (so that truncated files can be told apart)
+EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+# blocks decoded by each task of decompressParallel (about 4 MB of output)
+TASK_BLOCKS = 64
+
+
+def makeVirtualOffset(blockOffset, offset):
+    ''' virtual offset of byte offset of the output of the block that starts at blockOffset of
+        the file: blockOffset << 16 | offset '''
+
+    if not 0 <= offset < MAX_BLOCK:
+        raise ValueError('offset %d is outside a BGZF block' % offset)
+    return blockOffset << 16 | offset
+
+
+def splitVirtualOffset(virtualOffset):
+    ''' (block offset in the file, offset in the output of that block) of a virtual offset '''
+
+    return virtualOffset >> 16, virtualOffset & 0xffff
+
+
+def blockSize(gzh):
+    ''' size of the BGZF block of the header gzh (a GZIPHeader), or None if it is not BGZF '''
+
+    bsize = gzh.subfield(BGZF_ID)
+    if bsize is None or len(bsize) != 2:
+        return None
+    return (bsize[0] | bsize[1] << 8) + 1
+
+
+def isBGZF(path):
+    ''' True if the gzip file path starts with a BGZF block '''
+
+    gz = GZIP(path)
+    try:
+        return gz.getHeader() == 0 and blockSize(gz.gzh) is not None
+    except EOFError:
+        return False
+    finally:
+        gz.close()
+
+
+def compressBlock(data, level=DEFAULT_LEVEL):
+    ''' data (at most BLOCK_DATA bytes) compressed as one BGZF block. Data that does not compress
+        into MAX_BLOCK bytes is stored '''
+
+    if len(data) > BLOCK_DATA:
+        raise ValueError('%d bytes do not fit in a BGZF block' % len(data))
+    encoder = DeflateEncoder(level)
+    body = encoder.compress(data) + encoder.flush()
+    if BLOCK_HEADER_SIZE + len(body) + TRAILER_SIZE > MAX_BLOCK:
+        encoder = DeflateEncoder(0)
+        body = encoder.compress(data) + encoder.flush()
+    size = BLOCK_HEADER_SIZE + len(body) + TRAILER_SIZE
+
+    gzh = GZIPHeader()
+    gzh.extraField = BGZF_ID + (2).to_bytes(2, 'little') + (size - 1).to_bytes(2, 'little')
+    gzh.fName = gzh.fComment = ''
+    gzh.mTime = 0
+    gzh.XFL = 2 if level == 9 else 4 if level == 1 else 0
+    gzh.OS = 255
+    block = io.BytesIO()
+    gzh.write(block)
+    block.write(body)
+    block.write(crc32(data).to_bytes(4, 'little'))
+    block.write(len(data).to_bytes(4, 'little'))
+    return block.getvalue()
+
+
+class BGZFWriter(io.RawIOBase):
+    ''' write-only file object that compresses what is written to it into BGZF blocks of
+        BLOCK_DATA bytes, ended by EOF_BLOCK on close. target is a file name or a binary file
+        object (not closed by close). tell() gives the virtual offset of the next byte written '''
+
+    def __init__(self, target, level=DEFAULT_LEVEL):
+        if isinstance(target, (str, bytes, os.PathLike)):
+            self.f = open(target, 'wb')
+            self.ownsFile = True
+        else:
+            self.f = target
+            self.ownsFile = False
+        self.level = level
+        self.pending = bytearray()
+        self.blockOffset = 0      # offset in the file of the next block
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to a closed BGZFWriter')
+        self.pending += data
+        while len(self.pending) >= BLOCK_DATA:
+            self.writeBlock(self.pending[:BLOCK_DATA])
+            del self.pending[:BLOCK_DATA]
+        return len(data)
+
+    def writeBlock(self, data):
+        block = compressBlock(bytes(data), self.level)
+        self.f.write(block)
+        self.blockOffset += len(block)
+
+    def endBlock(self):
+        ''' writes what is pending as a block of its own, so that the next byte written starts
+            a block (e.g. to start each record of a file at a virtual offset with offset 0) '''
+
+        if self.pending:
+            self.writeBlock(self.pending)
+            self.pending.clear()
+
+    def tell(self):
+        return makeVirtualOffset(self.blockOffset, len(self.pending))
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.endBlock()
+                self.f.write(EOF_BLOCK)
+            finally:
+                if self.ownsFile:
+                    self.f.close()
+        super().close()
+
+
+def compressFile(path, outPath=None, level=DEFAULT_LEVEL, jobs=1):
+    ''' compresses the file path into the BGZF file outPath (default: path + '.gz'). The blocks are
+        independent, so with jobs > 1 (0: one per CPU) they are compressed on a pool of processes.
+        Returns outPath '''
+
+    if outPath is None:
+        outPath = path + '.gz'
+    with open(path, 'rb') as f, open(outPath, 'wb') as out:
+        pieces = iter(lambda: f.read(BLOCK_DATA), b'')
+        if jobs == 1:
+            for data in pieces:
+                out.write(compressBlock(data, level))
+        else:
+            with ProcessPoolExecutor(jobs or None) as pool:
+                ahead = 4 * (jobs or os.cpu_count() or 1)
+                futures = deque()
+                for data in pieces:
+                    futures.append(pool.submit(compressBlock, data, level))
+                    # poucos blocos em memoria de cada vez
+                    if len(futures) >= ahead:
+                        out.write(futures.popleft().result())
+                while futures:
+                    out.write(futures.popleft().result())
+        out.write(EOF_BLOCK)
+    return outPath
+
+
+def scanBlocks(data):
+    ''' offsets of the BGZF blocks of data (a whole file, e.g. memory mapped), found by following
+        the block sizes of their headers without decoding them. Stops at the end of the data or
+        at the first member that is not a BGZF block; returns (offsets, offset where it stopped) '''
+
+    offsets = []
+    offset = 0
+    gzh = GZIPHeader()
+    while offset < len(data):
+        if gzh.parse(data, offset) < 0:
+            break
+        size = blockSize(gzh)
+        if size is None or offset + size > len(data):
+            break
+        offsets.append(offset)
+        offset += size
+    return offsets, offset
+
+
+def decodeBlocks(path, start, stop):
+    ''' worker: decodes the BGZF blocks of the file path from offset start up to offset stop,
+        checking their trailers. Returns the output '''
+
+    gz = GZIP(path)
+    out = bytearray()
+    try:
+        gz.reader.seekBit(start * 8)
+        while gz.reader.tell() < stop * 8:
+            if gz.getHeader() != 0:
+                raise GZIPError('invalid gzip header at offset %d' % (gz.reader.tell() // 8))
+            for view in gz.inflate():
+                out += view
+    except GZIPError:
+        raise
+    except (ValueError, EOFError) as e:
+        raise GZIPError(str(e)) from e
+    finally:
+        gz.close()
+    return bytes(out)
+
+
+def decompressParallel(path, out, jobs=None, taskBlocks=TASK_BLOCKS):
+    ''' decompresses the BGZF file path into out (a binary file or a Sink), decoding groups of
+        taskBlocks blocks on a pool of jobs processes (default: one per CPU). The blocks are found
+        from their headers, with no index. Whatever follows the last BGZF block (e.g. ordinary
+        gzip members) is decoded sequentially. Returns the number of bytes written.
+        Raises GZIPError if the file is not valid '''
+
+    gz = GZIP(path)
+    data = None
+    try:
+        data = gz.mm if gz.mm is not None else b''
+        offsets, end = scanBlocks(data)
+        size = gz.fileSize
+    finally:
+        # sem referencias ao mmap, o close pode liberta-lo
+        data = None
+        gz.close()
+    if not offsets:
+        raise GZIPError('%s is not a BGZF file' % path)
+
+    bounds = offsets[::taskBlocks] + [end]
+    total = 0
+    with ProcessPoolExecutor(jobs) as pool:
+        ahead = 2 * (jobs or os.cpu_count() or 1)
+        futures = deque(pool.submit(decodeBlocks, path, bounds[i], bounds[i + 1])
+                        for i in range(min(ahead, len(bounds) - 1)))
+        try:
+            for i in range(len(bounds) - 1):
+                output = futures.popleft().result()
+                if i + ahead < len(bounds) - 1:
+                    futures.append(pool.submit(decodeBlocks, path, bounds[i + ahead], bounds[i + ahead + 1]))
+                out.write(output)
+                total += len(output)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    if end < size:
+        # o resto nao e BGZF: membros normais, descodificados em sequencia
+        gz = GZIP(path)
+        try:
+            gz.reader.seekBit(end * 8)
+            gz.numMembers = len(offsets)
+            while gz.nextMember():
+                for view in gz.inflate():
+                    out.write(view)
+                    total += len(view)
+        except GZIPError:
+            raise
+        except (ValueError, EOFError) as e:
+            raise GZIPError(str(e)) from e
+        finally:
+            gz.close()
+    return total
+
+
+class BGZFReader(io.RawIOBase):
+    ''' read-only file object with the decompressed contents of the BGZF file path, seekable by
+        virtual offsets (see makeVirtualOffset): seek decodes only the block it lands in, so it
+        costs the same anywhere in the file, with no index. tell() returns the virtual offset
+        of the next byte to read '''
+
+    def __init__(self, path):
+        self.path = path
+        self.gz = GZIP(path)
+        self.blockOffset = 0      # offset in the file of the current block
+        self.nextOffset = 0       # offset of the block after it
+        self.block = b''          # output of the current block
+        self.pos = 0              # next byte to read in block
+        self.loadBlock(0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def loadBlock(self, offset):
+        ''' decodes the block at offset of the file (nothing at its end) '''
+
+        self.blockOffset = self.nextOffset = offset
+        self.block = b''
+        self.pos = 0
+        if offset >= self.gz.fileSize:
+            return
+        try:
+            self.gz.reader.seekBit(offset * 8)
+            if self.gz.getHeader() != 0:
+                raise GZIPError('invalid gzip header at offset %d' % offset)
+            size = blockSize(self.gz.gzh)
+            if size is None:
+                raise GZIPError('the member at offset %d is not a BGZF block' % offset)
+            self.block = b''.join(bytes(view) for view in self.gz.inflate())
+        except GZIPError:
+            raise
+        except (ValueError, EOFError) as e:
+            raise GZIPError(str(e)) from e
+        self.nextOffset = offset + size
+
+    def tell(self):
+        # no fim de um bloco, o proximo byte e o inicio do bloco seguinte (como no htslib)
+        if self.pos == len(self.block) and self.block:
+            return makeVirtualOffset(self.nextOffset, 0)
+        return makeVirtualOffset(self.blockOffset, self.pos)
+
+    def seek(self, virtualOffset, whence=io.SEEK_SET):
+        ''' moves to virtualOffset (a virtual offset from tell() or from an index built on them) '''
+
+        if whence != io.SEEK_SET:
+            raise ValueError('BGZF files can only be seeked to virtual offsets')
+        blockOffset, offset = splitVirtualOffset(virtualOffset)
+        if blockOffset != self.blockOffset:
+            self.loadBlock(blockOffset)
+        if offset > len(self.block):
+            raise ValueError('virtual offset %d is outside its block' % virtualOffset)
+        self.pos = offset
+        return virtualOffset
+
+    def readinto(self, b):
+        # os blocos vazios (como o do fim) sao saltados
+        while self.pos >= len(self.block):
+            if self.nextOffset >= self.gz.fileSize or self.nextOffset == self.blockOffset:
+                return 0
+            self.loadBlock(self.nextOffset)
+
+        with memoryview(b) as out:
+            out = out.cast('B')
+            n = min(len(out), len(self.block) - self.pos)
+            out[:n] = self.block[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.gz.close()
+        super().close()
+
+
+if __name__ == '__main__':
+
+    # uso: python bgzf.py [-0 .. -9] [-j N] ficheiro
+    level = DEFAULT_LEVEL
+    jobs = 1
+    args = sys.argv[1:]
+    if args and len(args[0]) == 2 and args[0][0] == '-' and args[0][1].isdigit():
+        level = int(args.pop(0)[1])
+    if len(args) >= 2 and args[0] == '-j':
+        args.pop(0)
+        jobs = int(args.pop(0))
+    if len(args) != 1:
+        print('usage: python bgzf.py [-0 .. -9] [-j N] file')
+        sys.exit(1)
+
+    compressFile(args[0], level=level, jobs=jobs)
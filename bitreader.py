@@ -0,0 +1,177 @@
+# Buffered bit reader for deflate streams
+# Teoria da Informacao, LEI
+
+import mmap
+
+
+# size of the chunks read from file sources
+CHUNK_SIZE = 1 << 16
+
+# MASKS[n] keeps the n least significant bits
+MASKS = [(1 << n) - 1 for n in range(65)]
+
+# number of zero bytes that may be supplied after the end of the input, so that the
+# decoder can peek a full code length near the end of the stream
+MAX_PADDING = 8
+
+
+def mapFile(f):
+    ''' maps the binary file f into memory, read only. Returns (mmap, memoryview of the mapping
+        from the current position of f) or None if f cannot be mapped (pipes, sockets, empty
+        files, in-memory files...), in which case it must be read in chunks '''
+
+    try:
+        start = f.tell()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return mm, memoryview(mm)[start:]
+
+
+class BitReader:
+    ''' reads bits, least significant first, from a bytes-like object (bytes, bytearray,
+        memoryview) or from a binary file, which is consumed in chunks of chunkSize bytes.
+        Bits are kept in an integer buffer refilled up to 8 bytes at a time. '''
+
+    def __init__(self, source, chunkSize=CHUNK_SIZE):
+        self.chunkSize = chunkSize
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.f = None
+            self.data = memoryview(source).cast('B')
+        else:
+            self.f = source
+            self.data = memoryview(b'')
+
+        # position of the file where the input starts (offsets are relative to it)
+        self.origin = self.f.tell() if self.f is not None and self.f.seekable() else 0
+
+        self.base = 0       # offset in the input of data[0]
+        self.pos = 0        # next byte of data to load into the bit buffer
+        self.padding = 0    # zero bytes supplied after the end of the input
+        self.buffer = 0     # bits not consumed yet, the next one in the least significant position
+        self.available = 0  # number of bits in buffer
+
+    def nextChunk(self):
+        ''' replaces data with the next chunk of the file. Returns False at the end of the input '''
+
+        if self.f is None:
+            return False
+        chunk = self.f.read(self.chunkSize)
+        if not chunk:
+            return False
+        self.base += len(self.data)
+        self.data = memoryview(chunk).cast('B')
+        self.pos = 0
+        return True
+
+    def refill(self, n):
+        ''' loads bytes into the bit buffer until at least n bits are available '''
+
+        while self.available < n:
+            if self.pos >= len(self.data) and not self.nextChunk():
+                if self.padding >= MAX_PADDING:
+                    raise EOFError('unexpected end of compressed stream')
+                self.padding += 1
+                self.available += 8
+                continue
+
+            # le ate 8 bytes de uma vez
+            end = min(self.pos + 8, len(self.data))
+            self.buffer |= int.from_bytes(self.data[self.pos:end], 'little') << self.available
+            self.available += (end - self.pos) * 8
+            self.pos = end
+
+    def peekBits(self, n):
+        ''' returns the next n bits without consuming them '''
+
+        if n > self.available:
+            self.refill(n)
+        return self.buffer & MASKS[n]
+
+    def consumeBits(self, n):
+        ''' drops n bits, which must have been peeked before '''
+
+        self.buffer >>= n
+        self.available -= n
+
+    def readBits(self, n):
+        ''' reads and consumes the next n bits '''
+
+        if n > self.available:
+            self.refill(n)
+        value = self.buffer & MASKS[n]
+        self.buffer >>= n
+        self.available -= n
+        return value
+
+    def alignToByte(self):
+        ''' drops the bits left until the next byte boundary '''
+
+        self.consumeBits(self.available & 7)
+
+    def readBytes(self, n):
+        ''' reads n bytes from the next byte boundary. The result is a memoryview of the
+            input when the bytes are in the current chunk, so no copy is made '''
+
+        self.alignToByte()
+        if n == 0:
+            return b''
+
+        # depois do fim do input so restam os bytes reais que estao no buffer de bits
+        if self.padding and n > (self.available >> 3) - self.padding:
+            raise EOFError('unexpected end of compressed stream')
+
+        # bytes que ja estao no buffer de bits
+        head = b''
+        if self.available:
+            k = min(n, self.available >> 3)
+            head = (self.buffer & MASKS[k * 8]).to_bytes(k, 'little')
+            self.consumeBits(k * 8)
+            n -= k
+            if n == 0:
+                return head
+
+        if not head and self.pos + n <= len(self.data):
+            view = self.data[self.pos:self.pos + n]
+            self.pos += n
+            return view
+
+        parts = [head]
+        while n > 0:
+            if self.pos >= len(self.data) and not self.nextChunk():
+                raise EOFError('unexpected end of compressed stream')
+            end = min(self.pos + n, len(self.data))
+            parts.append(self.data[self.pos:end])
+            n -= end - self.pos
+            self.pos = end
+        return b''.join(parts)
+
+    def tell(self):
+        ''' returns the position of the next bit in the input, in bits '''
+
+        return (self.base + self.pos + self.padding) * 8 - self.available
+
+    def atEnd(self):
+        ''' True if every byte of the input was consumed (ignoring the bits left before the
+            next byte boundary) '''
+
+        if (self.available >> 3) > self.padding or self.pos < len(self.data):
+            return False
+        return not self.nextChunk()
+
+    def seekBit(self, bitpos):
+        ''' moves to position bitpos of the input (in bits). Only for bytes-like sources and
+            seekable files '''
+
+        byte, bit = divmod(bitpos, 8)
+        if self.f is None:
+            self.base = 0
+            self.pos = byte
+        else:
+            self.f.seek(self.origin + byte)
+            self.base = byte
+            self.data = memoryview(b'')
+            self.pos = 0
+        self.padding = self.buffer = self.available = 0
+        if bit:
+            self.readBits(bit)
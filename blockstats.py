@@ -0,0 +1,57 @@
+# Per-block decoding statistics
+# Teoria da Informacao, LEI
+
+
+# names of the block types (BTYPE)
+BLOCK_TYPES = {0: 'stored', 1: 'fixed', 2: 'dynamic'}
+
+
+class BlockStats:
+    ''' counters and timings (in seconds) of one deflate block, or the sum of several:
+        headerTime  - reading the block header and code lengths
+        tableTime   - building the decode tables
+        decodeTime  - decoding symbols / copying stored bytes into the output window
+        flushTime   - handing the output to the consumer (writing it, for decompress)
+        For dynamic blocks HLIT, HDIST and HCLEN are the values read from the block header (-1
+        otherwise). lengthCounts and distanceCounts, only kept when GZIP.histograms is True, count
+        the back-references by length (3 to 258) and by distance code (0 to 29) '''
+
+    __slots__ = ('index', 'btype', 'final', 'headerTime', 'tableTime', 'decodeTime', 'flushTime',
+                 'literals', 'matches', 'matchBytes', 'bytes', 'startBit', 'bits', 'HLIT', 'HDIST', 'HCLEN',
+                 'lengthCounts', 'distanceCounts')
+
+    def __init__(self, index=-1, btype=-1, final=0):
+        self.index = index
+        self.btype = btype
+        self.final = final
+        self.startBit = -1   # position of the block header in the input, in bits
+        self.bits = 0        # compressed size, in bits
+        self.HLIT = self.HDIST = self.HCLEN = -1
+        self.lengthCounts = self.distanceCounts = None
+        self.headerTime = self.tableTime = self.decodeTime = self.flushTime = 0.0
+        self.literals = 0    # literal bytes (or stored bytes)
+        self.matches = 0     # number of LZ77 back-references
+        self.matchBytes = 0  # bytes produced by back-references
+        self.bytes = 0       # total bytes produced
+
+    def add(self, other):
+        ''' adds the counters and timings of other to these '''
+
+        for name in ('headerTime', 'tableTime', 'decodeTime', 'flushTime', 'literals', 'matches', 'matchBytes', 'bytes', 'bits'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in ('lengthCounts', 'distanceCounts'):
+            counts = getattr(other, name)
+            if counts is not None:
+                if getattr(self, name) is None:
+                    setattr(self, name, [0] * len(counts))
+                mine = getattr(self, name)
+                for i, n in enumerate(counts):
+                    mine[i] += n
+
+    def asDict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __str__(self):
+        return ('block %d (%s%s): %d bits -> %d bytes, %d literals, %d matches | header %.6fs, tables %.6fs, decode %.6fs, flush %.6fs'
+                % (self.index, BLOCK_TYPES.get(self.btype, '?'), ', final' if self.final else '', self.bits, self.bytes,
+                   self.literals, self.matches, self.headerTime, self.tableTime, self.decodeTime, self.flushTime))
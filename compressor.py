@@ -0,0 +1,598 @@
+# DEFLATE compressor (LZ77 with hash chains + Huffman coding) and gzip writer
+# Teoria da Informacao, LEI
+
+import io
+import os
+import sys
+import time
+
+from crc32 import crc32
+from gzip import GZIPHeader
+from huffmantable import canonicalCodes, reverseBits
+from outputwindow import WINDOW_SIZE, MAX_MATCH
+
+
+MIN_MATCH = 3
+
+# positions needed after the current one to always find the longest match (as zlib)
+MIN_LOOKAHEAD = MAX_MATCH + MIN_MATCH + 1
+
+# number of literals/matches collected before a block is emitted
+BLOCK_TOKENS = 1 << 14
+
+# input kept in memory: once the buffer is larger, the bytes before the window are discarded
+BUFFER_SIZE = 1 << 20
+
+# hash table of the 3 byte strings, as zlib: HASH_SIZE heads, each byte shifted HASH_SHIFT bits
+HASH_BITS = 15
+HASH_SIZE = 1 << HASH_BITS
+HASH_MASK = HASH_SIZE - 1
+HASH_SHIFT = 5
+
+# largest stored block
+MAX_STORED = 65535
+
+# maximum code lengths of the literal/length and distance codes and of the code lengths code
+MAX_BITS = 15
+MAX_CLEN_BITS = 7
+
+DEFAULT_LEVEL = 6
+
+# per level, as zlib: (good_length, max_lazy, nice_length, max_chain, lazy matching)
+#   good_length - reduce the chain search to a quarter when the previous match is this long
+#   max_lazy    - lazy: do not look for a better match after one this long
+#                 greedy: only insert the positions inside matches up to this length
+#   nice_length - stop searching when a match this long is found
+#   max_chain   - maximum number of hash chain entries examined
+LEVELS = {
+    1: (4, 4, 8, 4, False),
+    2: (4, 5, 16, 8, False),
+    3: (4, 6, 32, 32, False),
+    4: (4, 4, 16, 16, True),
+    5: (8, 16, 32, 32, True),
+    6: (8, 16, 128, 128, True),
+    7: (8, 32, 128, 256, True),
+    8: (32, 128, 258, 1024, True),
+    9: (32, 258, 258, 4096, True),
+}
+
+# first length and extra bits of the length codes 257..285
+LENGTH_BASE = [3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258]
+LENGTH_EXTRA = [0]*8 + [1]*4 + [2]*4 + [3]*4 + [4]*4 + [5]*4 + [0]
+
+# first distance and extra bits of the distance codes 0..29
+DIST_BASE = [1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193, 257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145, 8193, 12289, 16385, 24577]
+DIST_EXTRA = [0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13]
+
+# order of the code length code lengths in a dynamic block header
+CLEN_ORDER = [16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15]
+
+FIXED_LITLEN_LENS = [8]*144 + [9]*112 + [7]*24 + [8]*8
+FIXED_DIST_LENS = [5]*30
+
+
+def makeSymbolTable(base, extra, maxValue):
+    ''' table indexed by length (or distance) with (symbol index, extra bits, extra value) '''
+
+    table = [None] * (maxValue + 1)
+    for i in range(len(base)):
+        end = base[i + 1] if i + 1 < len(base) else maxValue + 1
+        for value in range(base[i], min(end, maxValue + 1)):
+            table[value] = (i, extra[i], value - base[i])
+    return table
+
+
+# (symbol 257 + i, extra bits, extra value) of each match length
+LENGTH_INFO = [None if info is None else (257 + info[0], info[1], info[2])
+               for info in makeSymbolTable(LENGTH_BASE, LENGTH_EXTRA, MAX_MATCH)]
+# length 258 has its own code (285) and no extra bits
+LENGTH_INFO[MAX_MATCH] = (285, 0, 0)
+
+# (symbol, extra bits, extra value) of each distance
+DIST_INFO = makeSymbolTable(DIST_BASE, DIST_EXTRA, WINDOW_SIZE)
+
+
+def codeLengths(freqs, maxBits):
+    ''' optimal code lengths for the symbol frequencies freqs, limited to maxBits bits
+        (package-merge). Symbols with frequency 0 get no code; a single used symbol gets
+        length 1. The code is complete whenever two or more symbols are used '''
+
+    lens = [0] * len(freqs)
+    leaves = sorted((f, (s,)) for s, f in enumerate(freqs) if f)
+    if len(leaves) == 1:
+        lens[leaves[0][1][0]] = 1
+    if len(leaves) < 2:
+        return lens
+
+    # cada nivel junta os pares de itens do nivel anterior em pacotes
+    items = leaves
+    for level in range(maxBits - 1):
+        packages = [(items[i][0] + items[i + 1][0], items[i][1] + items[i + 1][1])
+                    for i in range(0, len(items) - 1, 2)]
+        items = sorted(leaves + packages, key=lambda item: item[0])
+
+    # o comprimento de cada simbolo e o numero de vezes que aparece nos 2n-2 primeiros itens
+    for weight, symbols in items[:2 * len(leaves) - 2]:
+        for s in symbols:
+            lens[s] += 1
+    return lens
+
+
+def encodingCodes(lens):
+    ''' canonical codes for lens, bit reversed to be written least significant bit first '''
+
+    return [reverseBits(code, length) for code, length in zip(canonicalCodes(lens), lens)]
+
+
+def encodeCodeLengths(lens):
+    ''' run-length encodes a sequence of code lengths with the symbols 16 (repeat previous),
+        17 and 18 (repeat zero). Returns a list of (symbol, extra bits, extra value) '''
+
+    out = []
+    i = 0
+    n = len(lens)
+    while i < n:
+        length = lens[i]
+        run = 1
+        while i + run < n and lens[i + run] == length:
+            run += 1
+        i += run
+
+        if length == 0:
+            while run >= 11:
+                r = min(run, 138)
+                out.append((18, 7, r - 11))
+                run -= r
+            if run >= 3:
+                out.append((17, 3, run - 3))
+                run = 0
+        else:
+            out.append((length, 0, 0))
+            run -= 1
+            while run >= 3:
+                r = min(run, 6)
+                out.append((16, 2, r - 3))
+                run -= r
+        out.extend([(length, 0, 0)] * run)
+    return out
+
+
+class BitWriter:
+    ''' packs bit fields into bytes, least significant bit first (the inverse of BitReader).
+        Complete bytes accumulate in out until taken '''
+
+    def __init__(self):
+        self.out = bytearray()
+        self.buffer = 0     # bits not yet in out
+        self.count = 0      # number of bits in buffer
+
+    def writeBits(self, value, n):
+        ''' appends the n least significant bits of value '''
+
+        self.buffer |= value << self.count
+        self.count += n
+        if self.count >= 32:
+            self.flushBits()
+
+    def flushBits(self):
+        ''' moves the complete bytes of the bit buffer to out '''
+
+        n = self.count >> 3
+        if n:
+            self.out += (self.buffer & ((1 << (8 * n)) - 1)).to_bytes(n, 'little')
+            self.buffer >>= 8 * n
+            self.count &= 7
+
+    def alignToByte(self):
+        ''' pads with zero bits up to the next byte boundary '''
+
+        self.count = (self.count + 7) & ~7
+        self.flushBits()
+
+    def writeBytes(self, data):
+        ''' aligns to a byte boundary and appends data '''
+
+        self.alignToByte()
+        self.out += data
+
+    def take(self):
+        ''' returns and removes the complete bytes written so far '''
+
+        data = bytes(self.out)
+        self.out.clear()
+        return data
+
+
+class DeflateEncoder:
+    ''' compresses a stream into raw deflate data (RFC 1951).
+
+        Matches are searched with hash chains over 3 byte strings in a window of the last
+        WINDOW_SIZE bytes; levels 1 to 3 take the first (greedy) match, levels 4 to 9 defer
+        each match by one byte to check if the next one is longer (lazy matching) and search
+        longer chains. Every BLOCK_TOKENS literals/matches a block is emitted with whichever
+        of stored, fixed or dynamic Huffman coding is smaller. Level 0 only emits stored blocks.
+
+        Use compress(data) for each piece of input and flush() at the end; both return the
+        compressed bytes completed so far. '''
+
+    def __init__(self, level=DEFAULT_LEVEL):
+        if not 0 <= level <= 9:
+            raise ValueError('invalid compression level %d' % level)
+        self.level = level
+        self.config = LEVELS.get(level)
+        self.writer = BitWriter()
+        self.data = bytearray()   # input from absolute position base onwards
+        self.base = 0
+        self.pos = 0              # next position to process (absolute)
+        self.blockStart = 0       # first input position of the pending block
+        self.tokens = []          # literals (< 256) and matches (length << 16 | distance)
+        self.head = [-1] * HASH_SIZE  # hash of a 3 byte string -> last position where it occurred
+        self.prev = []            # prev[p - base] -> previous position with the same hash
+        self.prevLength = MIN_MATCH - 1   # lazy matching: match found at pos - 1, if pending
+        self.prevDist = 0
+        self.matchAvailable = False
+        self.numBlocks = 0
+        self.finished = False
+
+    def compress(self, data):
+        ''' adds data to the input and returns the compressed bytes produced so far '''
+
+        if self.finished:
+            raise ValueError('compress called after flush')
+        self.data += data
+        self.prev.extend([-1] * len(data))
+        end = self.base + len(self.data) - MIN_LOOKAHEAD
+        if end > self.pos:
+            self.process(end)
+            self.trim()
+        return self.writer.take()
+
+    def flush(self):
+        ''' compresses the remaining input, ends the stream with a final block and returns
+            the last compressed bytes '''
+
+        if not self.finished:
+            self.process(self.base + len(self.data))
+            if self.matchAvailable:
+                self.tokens.append(self.data[self.pos - 1 - self.base])
+                self.matchAvailable = False
+            self.emitBlock(True)
+            self.writer.alignToByte()
+            self.finished = True
+        return self.writer.take()
+
+    def trim(self):
+        ''' discards the input no longer needed: before the window and the pending block '''
+
+        if len(self.data) > BUFFER_SIZE:
+            cut = min(self.pos - WINDOW_SIZE - 1, self.blockStart) - self.base
+            if cut > 0:
+                del self.data[:cut]
+                del self.prev[:cut]
+                self.base += cut
+
+    def covered(self):
+        ''' input position up to which the input is represented by tokens '''
+
+        return self.pos - 1 if self.matchAvailable else self.pos
+
+    def process(self, end):
+        ''' finds the literals and matches from pos up to end, emitting blocks as needed '''
+
+        if self.config is None:
+            # nivel 0: so blocos stored
+            while end - self.blockStart >= MAX_STORED:
+                self.pos = self.blockStart + MAX_STORED
+                self.emitBlock(False)
+            self.pos = end
+            return
+
+        data = self.data
+        base = self.base
+        head = self.head
+        prev = self.prev
+        tokens = self.tokens
+        good, maxLazy, nice, maxChain, lazy = self.config
+        available = base + len(data)    # fim (absoluto) do input disponivel
+        lastHash = available - MIN_MATCH
+        pos = self.pos
+
+        def insert(p):
+            ''' inserts the string at p in its hash chain and returns the previous head '''
+            i = p - base
+            # strings diferentes podem partilhar uma cadeia: longestMatch compara os bytes
+            key = ((data[i] << 2 * HASH_SHIFT) ^ (data[i + 1] << HASH_SHIFT) ^ data[i + 2]) & HASH_MASK
+            h = head[key]
+            prev[i] = h
+            head[key] = p
+            return h
+
+        def longestMatch(p, h, best, chain):
+            ''' longest match for p in the chain starting at h (longer than best) '''
+            i = p - base
+            maxLen = min(MAX_MATCH, available - p)
+            if best >= maxLen:
+                return 0, 0
+            limit = p - WINDOW_SIZE
+            bestDist = 0
+            while h >= limit and h >= base and chain > 0:
+                j = h - base
+                # o byte best (que tem de ser diferente) e verificado primeiro, como no zlib
+                if data[j + best] == data[i + best] and data[j] == data[i]:
+                    n = 1
+                    while n + 16 <= maxLen and data[j + n:j + n + 16] == data[i + n:i + n + 16]:
+                        n += 16
+                    while n < maxLen and data[j + n] == data[i + n]:
+                        n += 1
+                    if n > best:
+                        best, bestDist = n, p - h
+                        if n >= nice or n >= maxLen:
+                            break
+                h = prev[j]
+                chain -= 1
+            return best, bestDist
+
+        if not lazy:
+            while pos < end:
+                h = insert(pos) if pos <= lastHash else -1
+                length = dist = 0
+                if h >= 0 and pos - h <= WINDOW_SIZE:
+                    length, dist = longestMatch(pos, h, MIN_MATCH - 1, maxChain)
+                if length >= MIN_MATCH:
+                    tokens.append(length << 16 | dist)
+                    if length <= maxLazy:
+                        for q in range(pos + 1, min(pos + length, lastHash + 1)):
+                            insert(q)
+                    pos += length
+                else:
+                    tokens.append(data[pos - base])
+                    pos += 1
+                if len(tokens) >= BLOCK_TOKENS:
+                    self.pos = pos
+                    self.emitBlock(False)
+        else:
+            prevLength, prevDist, matchAvailable = self.prevLength, self.prevDist, self.matchAvailable
+            while pos < end:
+                h = insert(pos) if pos <= lastHash else -1
+                length, dist = MIN_MATCH - 1, 0
+                if h >= 0 and prevLength < maxLazy and pos - h <= WINDOW_SIZE:
+                    chain = maxChain >> 2 if prevLength >= good else maxChain
+                    length, dist = longestMatch(pos, h, prevLength, chain)
+                    # uma match de 3 bytes muito distante custa mais do que 3 literais
+                    if length == MIN_MATCH and dist > 4096:
+                        length = MIN_MATCH - 1
+                if prevLength >= MIN_MATCH and length <= prevLength:
+                    # a match anterior (em pos - 1) e melhor
+                    tokens.append(prevLength << 16 | prevDist)
+                    stop = min(pos - 1 + prevLength, lastHash + 1)
+                    for q in range(pos + 1, stop):
+                        insert(q)
+                    pos += prevLength - 1
+                    matchAvailable = False
+                    prevLength, prevDist = MIN_MATCH - 1, 0
+                else:
+                    if matchAvailable:
+                        tokens.append(data[pos - 1 - base])
+                    matchAvailable = True
+                    prevLength, prevDist = length, dist
+                    pos += 1
+                if len(tokens) >= BLOCK_TOKENS:
+                    self.pos, self.matchAvailable = pos, matchAvailable
+                    self.emitBlock(False)
+            self.prevLength, self.prevDist, self.matchAvailable = prevLength, prevDist, matchAvailable
+
+        self.pos = pos
+
+    def emitBlock(self, final):
+        ''' writes the pending tokens (the input from blockStart to covered()) as one block,
+            stored, fixed or dynamic, whichever is smaller '''
+
+        start = self.blockStart
+        end = self.covered()
+        tokens = self.tokens
+        self.numBlocks += 1
+
+        if self.config is None:
+            self.writeStored(start, end, final)
+            self.blockStart = end
+            return
+
+        # frequencias dos simbolos e total de bits extra
+        litFreq = [0] * 286
+        distFreq = [0] * 30
+        extraBits = 0
+        for t in tokens:
+            if t < 256:
+                litFreq[t] += 1
+            else:
+                sym, eb, ev = LENGTH_INFO[t >> 16]
+                litFreq[sym] += 1
+                dsym, deb, dev = DIST_INFO[t & 0xffff]
+                distFreq[dsym] += 1
+                extraBits += eb + deb
+        litFreq[256] = 1
+
+        litLens = codeLengths(litFreq, MAX_BITS)
+        distLens = codeLengths(distFreq, MAX_BITS)
+        if not any(distLens):
+            # sem matches: um unico codigo de distancia (nao usado)
+            distLens[0] = 1
+
+        # cabecalho do bloco dinamico
+        HLIT = max(257, max(i for i in range(286) if litLens[i]) + 1)
+        HDIST = max(1, max(i for i in range(30) if distLens[i]) + 1)
+        clenSymbols = encodeCodeLengths(litLens[:HLIT] + distLens[:HDIST])
+        clenFreq = [0] * 19
+        for sym, eb, ev in clenSymbols:
+            clenFreq[sym] += 1
+        clenLens = codeLengths(clenFreq, MAX_CLEN_BITS)
+        HCLEN = 19
+        while HCLEN > 4 and clenLens[CLEN_ORDER[HCLEN - 1]] == 0:
+            HCLEN -= 1
+
+        dynamicBits = 3 + 5 + 5 + 4 + 3 * HCLEN + extraBits
+        dynamicBits += sum(clenLens[sym] + eb for sym, eb, ev in clenSymbols)
+        dynamicBits += sum(f * l for f, l in zip(litFreq, litLens))
+        dynamicBits += sum(f * l for f, l in zip(distFreq, distLens))
+        fixedBits = 3 + extraBits
+        fixedBits += sum(f * l for f, l in zip(litFreq, FIXED_LITLEN_LENS))
+        fixedBits += sum(f * l for f, l in zip(distFreq, FIXED_DIST_LENS))
+        storedBits = 8 * (end - start) + 40 * max(1, -(-(end - start) // MAX_STORED)) + 7
+
+        writer = self.writer
+        if storedBits < min(fixedBits, dynamicBits):
+            self.writeStored(start, end, final)
+        elif fixedBits <= dynamicBits:
+            writer.writeBits(final | 1 << 1, 3)
+            self.writeTokens(encodingCodes(FIXED_LITLEN_LENS), FIXED_LITLEN_LENS,
+                             encodingCodes(FIXED_DIST_LENS), FIXED_DIST_LENS)
+        else:
+            writer.writeBits(final | 2 << 1, 3)
+            writer.writeBits(HLIT - 257, 5)
+            writer.writeBits(HDIST - 1, 5)
+            writer.writeBits(HCLEN - 4, 4)
+            for i in range(HCLEN):
+                writer.writeBits(clenLens[CLEN_ORDER[i]], 3)
+            clenCodes = encodingCodes(clenLens)
+            for sym, eb, ev in clenSymbols:
+                writer.writeBits(clenCodes[sym], clenLens[sym])
+                if eb:
+                    writer.writeBits(ev, eb)
+            self.writeTokens(encodingCodes(litLens), litLens, encodingCodes(distLens), distLens)
+
+        tokens.clear()
+        self.blockStart = end
+
+    def writeStored(self, start, end, final):
+        ''' writes the input from start to end as stored blocks of at most MAX_STORED bytes '''
+
+        writer = self.writer
+        data = self.data
+        while True:
+            n = min(end - start, MAX_STORED)
+            last = final and start + n == end
+            writer.writeBits(1 if last else 0, 3)
+            writer.alignToByte()
+            writer.writeBits(n | (n ^ 0xffff) << 16, 32)
+            writer.writeBytes(data[start - self.base:start - self.base + n])
+            start += n
+            if start >= end:
+                break
+
+    def writeTokens(self, litCodes, litLens, distCodes, distLens):
+        ''' writes the pending tokens and the end of block symbol with the given codes '''
+
+        writer = self.writer
+        out = writer.out
+        buffer, count = writer.buffer, writer.count
+        LENGTH, DIST = LENGTH_INFO, DIST_INFO
+
+        for t in self.tokens:
+            if t < 256:
+                buffer |= litCodes[t] << count
+                count += litLens[t]
+            else:
+                sym, eb, ev = LENGTH[t >> 16]
+                buffer |= litCodes[sym] << count
+                count += litLens[sym]
+                if eb:
+                    buffer |= ev << count
+                    count += eb
+                sym, eb, ev = DIST[t & 0xffff]
+                buffer |= distCodes[sym] << count
+                count += distLens[sym]
+                if eb:
+                    buffer |= ev << count
+                    count += eb
+            if count >= 64:
+                n = count >> 3
+                out += (buffer & ((1 << (8 * n)) - 1)).to_bytes(n, 'little')
+                buffer >>= 8 * n
+                count &= 7
+
+        writer.buffer, writer.count = buffer, count
+        writer.writeBits(litCodes[256], litLens[256])
+
+
+class GZIPWriter(io.RawIOBase):
+    ''' write-only file object that compresses what is written to it into a gzip member.
+        target is a file name or a binary file object (not closed by close) '''
+
+    def __init__(self, target, level=DEFAULT_LEVEL, fName='', mTime=None):
+        if isinstance(target, (str, bytes, os.PathLike)):
+            self.f = open(target, 'wb')
+            self.ownsFile = True
+        else:
+            self.f = target
+            self.ownsFile = False
+        self.encoder = DeflateEncoder(level)
+        self.crc = 0
+        self.size = 0
+
+        gzh = GZIPHeader()
+        gzh.fName = fName
+        gzh.mTime = int(time.time()) if mTime is None else mTime
+        # XFL: 2 - compressao maxima, 4 - mais rapida
+        gzh.XFL = 2 if level == 9 else 4 if level == 1 else 0
+        gzh.OS = 255
+        gzh.write(self.f)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to a closed GZIPWriter')
+        self.crc = crc32(data, self.crc)
+        self.size += len(data)
+        self.f.write(self.encoder.compress(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.f.write(self.encoder.flush())
+                self.f.write(self.crc.to_bytes(4, 'little'))
+                self.f.write((self.size & 0xffffffff).to_bytes(4, 'little'))
+            finally:
+                if self.ownsFile:
+                    self.f.close()
+        super().close()
+
+
+def compress(data, level=DEFAULT_LEVEL, fName='', mTime=0):
+    ''' returns data compressed as a gzip member '''
+
+    out = io.BytesIO()
+    with GZIPWriter(out, level, fName, mTime) as w:
+        w.write(data)
+    return out.getvalue()
+
+
+def compressFile(path, outPath=None, level=DEFAULT_LEVEL, chunkSize=1 << 16):
+    ''' compresses the file path into outPath (default: path + '.gz'), storing the file
+        name and modification time in the header. Returns outPath '''
+
+    if outPath is None:
+        outPath = path + '.gz'
+    with open(path, 'rb') as f, GZIPWriter(outPath, level, os.path.basename(path), int(os.stat(path).st_mtime)) as w:
+        while True:
+            data = f.read(chunkSize)
+            if not data:
+                break
+            w.write(data)
+    return outPath
+
+
+if __name__ == '__main__':
+
+    # uso: python compressor.py [-0 .. -9] ficheiro
+    level = DEFAULT_LEVEL
+    args = sys.argv[1:]
+    if args and len(args[0]) == 2 and args[0][0] == '-' and args[0][1].isdigit():
+        level = int(args.pop(0)[1])
+    if len(args) != 1:
+        print('usage: python compressor.py [-0 .. -9] file')
+        sys.exit(1)
+
+    compressFile(args[0], level=level)
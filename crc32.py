@@ -0,0 +1,64 @@
+# CRC-32 (ISO 3309 / ITU-T V.42), as used in the gzip trailer
+# Teoria da Informacao, LEI
+
+try:
+    from zlib import crc32 as nativeCRC32
+except ImportError:
+    try:
+        from binascii import crc32 as nativeCRC32
+    except ImportError:
+        nativeCRC32 = None
+
+
+# reversed polynomial of CRC-32
+POLY = 0xEDB88320
+
+
+def makeTables(slices=8):
+    ''' builds the tables for slicing-by-N: TABLES[0] is the classic byte table and
+        TABLES[k][n] is the CRC of byte n followed by k zero bytes '''
+
+    t0 = []
+    for n in range(256):
+        c = n
+        for k in range(8):
+            c = (c >> 1) ^ POLY if c & 1 else c >> 1
+        t0.append(c)
+
+    tables = [t0]
+    for k in range(1, slices):
+        prev = tables[-1]
+        tables.append([(prev[n] >> 8) ^ t0[prev[n] & 0xff] for n in range(256)])
+    return tables
+
+
+TABLES = makeTables()
+
+
+def crc32Slicing8(data, crc=0):
+    ''' updates crc with data using slicing-by-8 (8 table lookups per 8 bytes) '''
+
+    T0, T1, T2, T3, T4, T5, T6, T7 = TABLES
+    data = memoryview(data).cast('B')
+    n = len(data)
+    end8 = n - n % 8
+    crc ^= 0xffffffff
+
+    for i in range(0, end8, 8):
+        lo = int.from_bytes(data[i:i + 4], 'little') ^ crc
+        hi = int.from_bytes(data[i + 4:i + 8], 'little')
+        crc = (T7[lo & 0xff] ^ T6[(lo >> 8) & 0xff] ^ T5[(lo >> 16) & 0xff] ^ T4[lo >> 24] ^
+               T3[hi & 0xff] ^ T2[(hi >> 8) & 0xff] ^ T1[(hi >> 16) & 0xff] ^ T0[hi >> 24])
+
+    for i in range(end8, n):
+        crc = (crc >> 8) ^ T0[(crc ^ data[i]) & 0xff]
+
+    return crc ^ 0xffffffff
+
+
+def crc32(data, crc=0):
+    ''' updates crc with data: uses zlib/binascii when available, slicing-by-8 otherwise '''
+
+    if nativeCRC32 is not None:
+        return nativeCRC32(data, crc)
+    return crc32Slicing8(data, crc)
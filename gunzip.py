@@ -0,0 +1,230 @@
+# Command line interface: decompresses many gzip files, optionally on a pool of processes
+# Teoria da Informacao, LEI
+
+import argparse
+import glob
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from time import perf_counter
+
+from bgzf import blockSize, decompressParallel
+from gzip import GZIP, GZIPError
+from gzlist import listFiles, printListing
+from outputwindow import FLUSH_SIZE
+from parallel import decompressMembers
+from pipeline import decompressPipelined, openPipelined
+from sinks import FileSink, HashSink, NullSink, StdoutSink
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileResult:
+    ''' outcome of decompressing one file: output path, sizes, time, digest of the output (with
+        --hash) and error message (None if it succeeded) '''
+
+    __slots__ = ('path', 'outPath', 'inBytes', 'outBytes', 'seconds', 'digest', 'error')
+
+    def __init__(self, path):
+        self.path = path
+        self.outPath = None
+        self.inBytes = self.outBytes = 0
+        self.seconds = 0.0
+        self.digest = None
+        self.error = None
+
+
+def expandInputs(patterns):
+    ''' expands the glob patterns (the shell may not have done it, e.g. on Windows or when
+        quoted). Patterns without matches are kept, so that the error is reported. '''
+
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        paths.extend(matches or [pattern])
+    # sem repetidos, pela ordem dada
+    return list(dict.fromkeys(paths))
+
+
+def openInput(path, flushSize=FLUSH_SIZE, pipelined=False):
+    ''' GZIP over the file path; if pipelined, read ahead and written on other threads '''
+
+    if pipelined:
+        return openPipelined(path, flushSize)
+    return GZIP(path, flushSize=flushSize)
+
+
+def writeOutput(gz, out, pipelined=False, jobs=1):
+    ''' writes the output of gz (from openInput) to out. If jobs is not 1, it is decoded on a
+        pool of jobs processes (0: one per CPU): by blocks if it is a BGZF file, by members if it
+        has several, by speculative chunks otherwise (see parallel.decompressMembers).
+        Returns the number of bytes written '''
+
+    if jobs != 1:
+        if blockSize(gz.gzh) is not None:
+            return decompressParallel(gz.gzFile, out, jobs or None)
+        return decompressMembers(gz.gzFile, out, jobs or None)
+    if pipelined:
+        return decompressPipelined(gz, out)
+    return gz.decompressTo(out)
+
+
+def decompressFile(path, outputDir='.', force=False, keep=False, flushSize=FLUSH_SIZE, pipelined=False, jobs=1):
+    ''' decompresses the gzip file path into outputDir, naming the output after the FNAME of
+        the header (or the input name without .gz). An existing output is only replaced if
+        force is True; the input is removed after success unless keep is True. If pipelined,
+        reading, decoding and writing overlap (see pipeline.py). The file is decoded on jobs
+        processes if jobs is not 1 (see writeOutput).
+        Returns a FileResult (errors are returned, not raised, so it can run in a worker) '''
+
+    result = FileResult(path)
+    start = perf_counter()
+    gz = None
+    created = False
+    try:
+        result.inBytes = os.path.getsize(path)
+        gz = openInput(path, flushSize, pipelined)
+        if gz.getHeader() != 0:
+            raise GZIPError('invalid gzip header')
+
+        outPath = result.outPath = os.path.join(outputDir, gz.outputName())
+        if os.path.exists(outPath):
+            if os.path.samefile(outPath, path):
+                raise GZIPError('the output %s would replace the input' % outPath)
+            if not force:
+                raise GZIPError('%s already exists (use --force to overwrite it)' % outPath)
+
+        with FileSink(outPath) as out:
+            created = True
+            result.outBytes = writeOutput(gz, out, pipelined, jobs)
+    except (ValueError, EOFError, OSError) as e:
+        result.error = str(e)
+        if created:
+            os.remove(result.outPath)
+    finally:
+        if gz is not None:
+            gz.close()
+
+    if result.error is None and not keep:
+        os.remove(path)
+    result.seconds = perf_counter() - start
+    return result
+
+
+def decompressToStream(path, out, flushSize=FLUSH_SIZE, pipelined=False, jobs=1):
+    ''' decompresses the gzip file path to out, a binary file or a Sink. Returns a FileResult '''
+
+    result = FileResult(path)
+    start = perf_counter()
+    gz = None
+    try:
+        result.inBytes = os.path.getsize(path)
+        gz = openInput(path, flushSize, pipelined)
+        if gz.getHeader() != 0:
+            raise GZIPError('invalid gzip header')
+        result.outBytes = writeOutput(gz, out, pipelined, jobs)
+    except (ValueError, EOFError, OSError) as e:
+        result.error = str(e)
+    finally:
+        if gz is not None:
+            gz.close()
+    result.seconds = perf_counter() - start
+    return result
+
+
+def checkFile(path, algorithm=None, flushSize=FLUSH_SIZE, pipelined=False, jobs=1):
+    ''' decompresses the gzip file path without storing the output, checking its trailers and, if
+        algorithm is given, computing the hashlib digest of the output. Returns a FileResult '''
+
+    sink = HashSink(algorithm) if algorithm else NullSink()
+    result = decompressToStream(path, sink, flushSize, pipelined, jobs)
+    if algorithm and result.error is None:
+        result.digest = sink.hexdigest()
+    return result
+
+
+def main(argv=None):
+    ''' entry point of the command line. Returns the exit status: 0 if every file was
+        decompressed, 1 otherwise '''
+
+    parser = argparse.ArgumentParser(description='decompresses gzip files')
+    parser.add_argument('inputs', nargs='+', help='gzip files or glob patterns')
+    parser.add_argument('-o', '--output-dir', default='.', help='folder for the decompressed files (default: current folder)')
+    parser.add_argument('-c', '--stdout', action='store_true', help='write to the standard output and keep the inputs')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes decompressing files at once or, with a single file, parts of it (0: one per CPU)')
+    parser.add_argument('-l', '--list', action='store_true', help='list the compressed and uncompressed sizes, without decompressing')
+    parser.add_argument('--exact', action='store_true', help='with -l, decode the members to find their boundaries')
+    parser.add_argument('-t', '--test', action='store_true', help='check the files, without writing the output')
+    parser.add_argument('--hash', metavar='ALGORITHM', help='print a hashlib digest (e.g. sha256) of the output instead of writing it')
+    parser.add_argument('--flush-size', type=int, default=FLUSH_SIZE,
+                        help='bytes decoded between writes; memory use is 32 KB plus this (default %(default)s)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='read ahead and write on separate threads, overlapping them with decoding')
+    parser.add_argument('-k', '--keep', action='store_true', help='keep the input files')
+    parser.add_argument('-f', '--force', action='store_true', help='overwrite existing output files')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report errors')
+    parser.add_argument('-v', '--verbose', action='store_true', help='report every file')
+    args = parser.parse_args(argv)
+    if args.flush_size <= 0:
+        parser.error('--flush-size must be positive')
+    if args.hash:
+        try:
+            HashSink(args.hash)
+        except ValueError:
+            parser.error('unknown hash algorithm %s' % args.hash)
+
+    level = logging.ERROR if args.quiet else logging.DEBUG if args.verbose else logging.INFO
+    logging.basicConfig(level=level, format='%(message)s')
+
+    paths = expandInputs(args.inputs)
+    if args.list:
+        return 1 if printListing(listFiles(paths, args.jobs, args.exact), verbose=args.verbose) else 0
+
+    start = perf_counter()
+    # com um so ficheiro, os processos descodificam partes dele
+    blockJobs = args.jobs if len(paths) == 1 else 1
+
+    if args.stdout and not (args.test or args.hash):
+        # a saida tem de ficar pela ordem dos ficheiros: sem processos
+        with StdoutSink() as out:
+            results = [decompressToStream(path, out, args.flush_size, args.pipeline, blockJobs) for path in paths]
+    else:
+        if args.test or args.hash:
+            work = partial(checkFile, algorithm=args.hash, flushSize=args.flush_size, pipelined=args.pipeline, jobs=blockJobs)
+        else:
+            os.makedirs(args.output_dir, exist_ok=True)
+            work = partial(decompressFile, outputDir=args.output_dir, force=args.force, keep=args.keep,
+                           flushSize=args.flush_size, pipelined=args.pipeline, jobs=blockJobs)
+        jobs = args.jobs or os.cpu_count() or 1
+        if jobs > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(jobs) as pool:
+                results = list(pool.map(work, paths, chunksize=max(1, len(paths) // (4 * jobs))))
+        else:
+            results = [work(path) for path in paths]
+
+    elapsed = perf_counter() - start
+    failed = 0
+    inBytes = outBytes = 0
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            logger.error('%s: %s', result.path, result.error)
+            continue
+        inBytes += result.inBytes
+        outBytes += result.outBytes
+        if result.digest is not None:
+            # como sha256sum
+            print('%s  %s' % (result.digest, result.path))
+        logger.debug('%s -> %s: %d bytes in %.3fs', result.path, result.outPath or '<stdout>', result.outBytes, result.seconds)
+
+    logger.info('%d file(s) %s, %d failed: %d -> %d bytes in %.3fs (%.2f MB/s)', len(results) - failed,
+                'checked' if args.test or args.hash else 'decompressed', failed, inBytes, outBytes, elapsed,
+                outBytes / 1e6 / max(elapsed, 1e-9))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
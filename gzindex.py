@@ -0,0 +1,273 @@
+# Random access to gzip files through an index of checkpoints (as zlib's zran.c)
+# Teoria da Informacao, LEI
+
+import io
+import logging
+import os
+import struct
+from bisect import bisect_right
+
+from gzip import GZIP
+
+try:
+    import zlib
+except ImportError:
+    zlib = None
+
+
+logger = logging.getLogger(__name__)
+
+# default distance between checkpoints, in uncompressed bytes
+SPAN = 1 << 20
+
+# sidecar file: magic, flags, span, compressed size, uncompressed size, mtime of the gzip file (ns),
+# end offset, CRC32 and ISIZE of its last member, number of checkpoints
+INDEX_MAGIC = b'GZIDX\x02'
+INDEX_HEADER = struct.Struct('<6sBQQQQQIII')
+# CRC32 and ISIZE of a member trailer
+TRAILER = struct.Struct('<II')
+# per checkpoint: bit offset in the gzip file, uncompressed offset, length of the stored window
+CHECKPOINT = struct.Struct('<QQI')
+
+# flag: windows are stored compressed with zlib
+FLAG_ZLIB = 1
+
+
+def indexPath(path):
+    ''' default name of the index file of path '''
+
+    return os.fspath(path) + '.gzidx'
+
+
+class Checkpoint:
+    ''' point where decoding can resume: a block starting at bit bitOffset of the gzip file,
+        whose output starts at outOffset, preceded by window (the last 32 KB of output) '''
+
+    __slots__ = ('bitOffset', 'outOffset', 'window')
+
+    def __init__(self, bitOffset, outOffset, window):
+        self.bitOffset = bitOffset
+        self.outOffset = outOffset
+        self.window = window
+
+
+class GZIPIndex:
+    ''' list of checkpoints of a gzip file, taken about every span bytes of output, with what
+        identifies the file it was built from: its size and mtime and where its last member ends,
+        with that member's trailer (CRC32, ISIZE) '''
+
+    def __init__(self, span=SPAN, compressedSize=0, size=0, checkpoints=None, mTime=0, end=0, trailer=(0, 0)):
+        self.span = span
+        self.compressedSize = compressedSize
+        self.size = size
+        self.checkpoints = checkpoints if checkpoints is not None else []
+        self.mTime = mTime
+        self.end = end
+        self.trailer = trailer
+
+    @classmethod
+    def build(cls, path, span=SPAN):
+        ''' decodes the whole file once and records a checkpoint at the first block of
+            each span bytes of output '''
+
+        index = cls(span)
+        # a primeira checkpoint e no primeiro bloco
+        nextOffset = [0]
+
+        def onBlockStart(gz):
+            # bytes produzidos por todos os blocos (e membros) anteriores
+            outOffset = gz.totalStats.bytes
+            if outOffset >= nextOffset[0]:
+                index.checkpoints.append(Checkpoint(gz.reader.tell(), outOffset, gz.window.history()))
+                nextOffset[0] = outOffset + span
+
+        index.mTime = os.stat(path).st_mtime_ns
+        gz = GZIP(path, onBlockStart=onBlockStart)
+        try:
+            for view in gz.stream():
+                pass
+            index.size = gz.totalStats.bytes
+            index.compressedSize = gz.fileSize
+            # o ultimo membro pode ser seguido de lixo, que o stream ignora
+            index.end = gz.reader.tell() // 8
+            index.trailer = gz.trailer
+        finally:
+            gz.close()
+        return index
+
+    def find(self, offset):
+        ''' returns the last checkpoint at or before the uncompressed offset '''
+
+        i = bisect_right([c.outOffset for c in self.checkpoints], offset)
+        return self.checkpoints[max(i - 1, 0)]
+
+    def matches(self, path):
+        ''' True if path is still the file the index was built from: same size and mtime, and the
+            same trailer where its last member ended '''
+
+        st = os.stat(path)
+        if st.st_size != self.compressedSize or st.st_mtime_ns != self.mTime:
+            return False
+        if self.end < TRAILER.size or self.end > st.st_size:
+            return False
+        with open(path, 'rb') as f:
+            f.seek(self.end - TRAILER.size)
+            return TRAILER.unpack(f.read(TRAILER.size)) == self.trailer
+
+    def save(self, filename):
+        ''' writes the index to filename (windows compressed with zlib, when available) '''
+
+        flags = FLAG_ZLIB if zlib is not None else 0
+        with open(filename, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, flags, self.span, self.compressedSize, self.size, self.mTime,
+                                      self.end, *self.trailer, len(self.checkpoints)))
+            for c in self.checkpoints:
+                window = zlib.compress(c.window) if flags & FLAG_ZLIB else c.window
+                f.write(CHECKPOINT.pack(c.bitOffset, c.outOffset, len(window)))
+                f.write(window)
+
+    @classmethod
+    def load(cls, filename):
+        ''' reads an index written by save. Raises ValueError if it is not a valid index '''
+
+        with open(filename, 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+            if len(header) != INDEX_HEADER.size or header[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                raise ValueError('%s is not a gzip index' % filename)
+            magic, flags, span, compressedSize, size, mTime, end, CRC32, ISIZE, count = INDEX_HEADER.unpack(header)
+            if flags & FLAG_ZLIB and zlib is None:
+                raise ValueError('%s needs zlib to be read' % filename)
+
+            checkpoints = []
+            for i in range(count):
+                bitOffset, outOffset, length = CHECKPOINT.unpack(f.read(CHECKPOINT.size))
+                window = f.read(length)
+                if flags & FLAG_ZLIB:
+                    window = zlib.decompress(window)
+                checkpoints.append(Checkpoint(bitOffset, outOffset, window))
+
+        return cls(span, compressedSize, size, checkpoints, mTime, end, (CRC32, ISIZE))
+
+
+class IndexedGZIP(io.RawIOBase):
+    ''' seekable read-only file object with the decompressed contents of a gzip file.
+        Reading after a seek resumes inflation at the nearest checkpoint of the index, so
+        it costs at most one span of decoding. The index is loaded from the sidecar file
+        if it exists and matches the gzip file, otherwise it is built (and saved if save is True) '''
+
+    def __init__(self, path, index=None, span=SPAN, save=True):
+        self.path = path
+        if index is None:
+            index = self.loadIndex(path, span, save)
+        self.index = index
+        self.pos = 0          # position seen by the user
+        self.gz = None        # decoder and its output stream, positioned at streamPos
+        self.views = None
+        self.view = memoryview(b'')
+        self.streamPos = -1
+
+    @staticmethod
+    def loadIndex(path, span=SPAN, save=True):
+        ''' loads the sidecar index of path, or builds it if it is missing or outdated '''
+
+        sidecar = indexPath(path)
+        if os.path.exists(sidecar):
+            try:
+                index = GZIPIndex.load(sidecar)
+                if index.matches(path):
+                    return index
+            except (ValueError, struct.error):
+                pass
+        index = GZIPIndex.build(path, span)
+        if save:
+            try:
+                index.save(sidecar)
+            except OSError as e:
+                logger.warning('could not save the index of %s: %s', path, e)
+        return index
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.index.size
+        if offset < 0:
+            raise ValueError('negative seek position %d' % offset)
+        self.pos = offset
+        return self.pos
+
+    def restart(self):
+        ''' restarts decoding at the checkpoint before pos and skips to pos '''
+
+        self.closeStream()
+        checkpoint = self.index.find(self.pos)
+        self.gz = GZIP(self.path)
+        self.views = self.gz.streamFrom(checkpoint.bitOffset, checkpoint.window)
+        self.view = memoryview(b'')
+        self.streamPos = checkpoint.outOffset
+
+        # descarta a saida entre a checkpoint e a posicao pedida
+        while self.streamPos < self.pos:
+            view = next(self.views, None)
+            if view is None:
+                return
+            if self.streamPos + len(view) > self.pos:
+                self.view = view[self.pos - self.streamPos:]
+                self.streamPos = self.pos
+            else:
+                self.streamPos += len(view)
+
+    def readinto(self, b):
+        if self.pos >= self.index.size:
+            return 0
+        if self.gz is None or self.streamPos != self.pos:
+            self.restart()
+
+        while not self.view:
+            view = next(self.views, None)
+            if view is None:
+                return 0
+            self.view = view
+
+        with memoryview(b) as out:
+            out = out.cast('B')
+            n = min(len(out), len(self.view))
+            out[:n] = self.view[:n]
+        self.view = self.view[n:]
+        self.pos += n
+        self.streamPos += n
+        return n
+
+    def read_range(self, start, length):
+        ''' returns length bytes of the decompressed data from offset start (fewer at the end) '''
+
+        self.seek(start)
+        parts = []
+        while length > 0:
+            data = self.read(length)
+            if not data:
+                break
+            parts.append(data)
+            length -= len(data)
+        return b''.join(parts)
+
+    def closeStream(self):
+        if self.gz is not None:
+            self.view = memoryview(b'')
+            self.views.close()
+            self.gz.close()
+            self.gz = None
+
+    def close(self):
+        if not self.closed:
+            self.closeStream()
+        super().close()
@@ -0,0 +1,156 @@
+# Inspection of the deflate blocks of gzip files, reported as JSON
+# Teoria da Informacao, LEI
+
+import argparse
+import json
+import logging
+import sys
+from time import perf_counter
+
+from blockstats import BLOCK_TYPES, BlockStats
+from gzip import GZIP, GZIPError
+
+
+logger = logging.getLogger(__name__)
+
+# first distance of each distance code (RFC 1951, 3.2.5)
+DISTANCE_BASES = [1, 2, 3, 4] + GZIP.ExtraDISTLens + [32769]
+
+
+def distanceRange(code):
+    ''' distances of a distance code, as text: "5-6" '''
+
+    first, last = DISTANCE_BASES[code], DISTANCE_BASES[code + 1] - 1
+    return str(first) if first == last else '%d-%d' % (first, last)
+
+
+def histograms(stats):
+    ''' the match length and distance histograms of stats, as dicts with the non zero counts:
+        {length: count} and {distance range: count} '''
+
+    if stats.lengthCounts is None:
+        return {}, {}
+    lengths = {str(length): n for length, n in enumerate(stats.lengthCounts) if n}
+    distances = {distanceRange(code): n for code, n in enumerate(stats.distanceCounts) if n}
+    return lengths, distances
+
+
+def blockReport(stats, member):
+    ''' dict with the description of a block of member (counted from 0), from its BlockStats '''
+
+    report = {
+        'member': member,
+        'index': stats.index,
+        'type': BLOCK_TYPES.get(stats.btype, '?'),
+        'final': bool(stats.final),
+        'startBit': stats.startBit,
+        'compressedBits': stats.bits,
+        'compressedBytes': stats.bits / 8,
+        'uncompressedBytes': stats.bytes,
+        'literals': stats.literals,
+        'matches': stats.matches,
+        'matchBytes': stats.matchBytes,
+        'literalRatio': stats.literals / stats.bytes if stats.bytes else 0.0,
+        'bitsPerByte': stats.bits / stats.bytes if stats.bytes else 0.0,
+        'decodeTime': stats.headerTime + stats.tableTime + stats.decodeTime,
+        'phases': {name: getattr(stats, name) for name in ('headerTime', 'tableTime', 'decodeTime')},
+    }
+    if stats.btype == 2:
+        report['HLIT'], report['HDIST'], report['HCLEN'] = stats.HLIT, stats.HDIST, stats.HCLEN
+    if stats.lengthCounts is not None:
+        report['lengths'], report['distances'] = histograms(stats)
+    return report
+
+
+def inspectFile(path, blocks=True, counts=True):
+    ''' decodes the gzip file path (discarding the output) and returns a dict with one report per
+        block (if blocks is True) and the totals of the file. If counts is True the reports include
+        the match length and distance histograms, which makes decoding somewhat slower.
+        Raises GZIPError if the file is not valid '''
+
+    reports = []
+    total = BlockStats()
+    members = 0
+
+    def onBlock(stats):
+        total.add(stats)
+        if blocks:
+            reports.append(blockReport(stats, members))
+
+    gz = GZIP(path, onBlock=onBlock)
+    gz.histograms = counts
+    start = perf_counter()
+    try:
+        if gz.getHeader() != 0:
+            raise GZIPError('invalid gzip header')
+        header = {'name': gz.gzh.fName, 'comment': gz.gzh.fComment, 'mTime': gz.gzh.mTime,
+                  'XFL': gz.gzh.XFL, 'OS': gz.gzh.OS}
+        while True:
+            for _ in gz.inflate():
+                pass
+            members += 1
+            if not gz.nextMember():
+                break
+        compressedSize = gz.fileSize
+    except (ValueError, EOFError) as e:
+        raise GZIPError(str(e)) from e
+    finally:
+        gz.close()
+    elapsed = perf_counter() - start
+
+    types = {}
+    for report in reports:
+        types[report['type']] = types.get(report['type'], 0) + 1
+
+    totals = blockReport(total, members)
+    for name in ('member', 'index', 'type', 'final', 'startBit'):
+        del totals[name]
+    totals.update(members=members, blocks=gz.numBlocks, compressedSize=compressedSize, seconds=elapsed)
+    if blocks:
+        totals['blockTypes'] = types
+
+    report = {'file': str(path), 'header': header, 'totals': totals}
+    if blocks:
+        report['blocks'] = reports
+    return report
+
+
+def main(argv=None):
+    ''' entry point of the command line: prints a JSON list with the report of each file.
+        Returns 0 if every file could be inspected, 1 otherwise '''
+
+    parser = argparse.ArgumentParser(description='reports the deflate blocks of gzip files as JSON')
+    parser.add_argument('inputs', nargs='+', help='gzip files')
+    parser.add_argument('--totals', action='store_true', help='only report the totals of each file')
+    parser.add_argument('--no-histograms', action='store_true', help='do not count matches by length and distance (faster)')
+    parser.add_argument('--indent', type=int, default=None, help='indentation of the JSON output (default: one line per file)')
+    parser.add_argument('-o', '--output', default='-', help='output file (default: standard output)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    failed = 0
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        # sem --indent, cada ficheiro fica numa linha da lista
+        out.write('[\n')
+        first = True
+        for path in args.inputs:
+            try:
+                report = inspectFile(path, blocks=not args.totals, counts=not args.no_histograms)
+            except (GZIPError, OSError) as e:
+                failed += 1
+                logger.error('%s: %s', path, e)
+                report = {'file': path, 'error': str(e)}
+            if not first:
+                out.write(',\n')
+            out.write(json.dumps(report, indent=args.indent))
+            first = False
+        out.write('\n]\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
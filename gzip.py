@@ -2,8 +2,43 @@
 # Adapted from Java's implementation of Rui Pedro Paiva
 # Teoria da Informacao, LEI, 2022
 
+import io
+import logging
+import mmap
+import os
+import struct
 import sys
+from time import perf_counter
 from huffmantree import HuffmanTree
+from huffmantable import HuffmanTable, TABLE_CACHE, PAIR_BITS, PAIR, MIN_PAIR_SHARE, pairShare
+from bitreader import BitReader, mapFile
+from outputwindow import OutputWindow, FLUSH_SIZE
+from blockstats import BlockStats
+from crc32 import crc32
+
+
+logger = logging.getLogger(__name__)
+
+
+# default size of the chunks produced by GZIP.iter_chunks
+CHUNK_SIZE = 1 << 16
+
+# bytes of a mapped input already decoded that are dropped from memory at once (see releaseInput)
+RELEASE_SIZE = 1 << 22
+
+
+class GZIPError(ValueError):
+    ''' raised when the input is not a valid gzip file or its deflate stream is corrupted '''
+
+
+def findZero(data, start, step=4096):
+    ''' offset of the first zero byte of data (bytes-like, memoryviews included) from start, -1 if none '''
+
+    for i in range(start, len(data), step):
+        j = bytes(data[i:i + step]).find(0)
+        if j >= 0:
+            return i + j
+    return -1
 
 
 class GZIPHeader:
@@ -30,79 +65,138 @@ class GZIPHeader:
         
     # if FLG_HCRC == 1
     HCRC = []
+
+    # ID1, ID2, CM, FLG, MTIME, XFL and OS (little endian)
+    FIXED = struct.Struct('<BBBBIBB')
+    XLEN_FIELD = struct.Struct('<H')
         
         
     
-    def read(self, f):
-        ''' reads and processes the Huffman header from file. Returns 0 if no error, -1 otherwise '''
+    def read(self, reader):
+        ''' reads and processes the Huffman header from a BitReader. Returns 0 if no error, -1 otherwise '''
+
+        # ID1, ID2, CM, FLG, MTIME, XFL and OS, read at once
+        if self.setFixed(reader.readBytes(self.FIXED.size)) != 0:
+            return -1
 
-        # ID 1 and 2: fixed values
-        self.ID1 = f.read(1)[0]  
-        if self.ID1 != 0x1f: return -1 # error in the header
-            
-        self.ID2 = f.read(1)[0]
-        if self.ID2 != 0x8b: return -1 # error in the header
-        
-        # CM - Compression Method: must be the value 8 for deflate
-        self.CM = f.read(1)[0]
-        if self.CM != 0x08: return -1 # error in the header
-                    
-        # Flags
-        self.FLG = f.read(1)[0]
-        
-        # MTIME
-        self.MTIME = [0]*self.lenMTIME
-        self.mTime = 0
-        for i in range(self.lenMTIME):
-            self.MTIME[i] = f.read(1)[0]
-            self.mTime += self.MTIME[i] << (8 * i)                 
-                        
-        # XFL (not processed...)
-        self.XFL = f.read(1)[0]
-        
-        # OS (not processed...)
-        self.OS = f.read(1)[0]
-  
-        # --- Check Flags
-        self.FLG_FTEXT = self.FLG & 0x01
-        self.FLG_FHCRC = (self.FLG & 0x02) >> 1
-        self.FLG_FEXTRA = (self.FLG & 0x04) >> 2
-        self.FLG_FNAME = (self.FLG & 0x08) >> 3
-        self.FLG_FCOMMENT = (self.FLG & 0x10) >> 4
-                    
         # FLG_EXTRA
         if self.FLG_FEXTRA == 1:
-            # read 2 bytes XLEN + XLEN bytes de extra field
-            # 1st byte: LSB, 2nd: MSB
-            self.XLEN = [0]*self.lenXLEN
-            self.XLEN[0] = f.read(1)[0]
-            self.XLEN[1] = f.read(1)[0]
-            self.xlen = self.XLEN[1] << 8 + self.XLEN[0]
-            
-            # read extraField and ignore its values
-            self.extraField = f.read(self.xlen)
-        
-        def read_str_until_0(f):
-            s = ''
+            # read 2 bytes XLEN (LSB first) + XLEN bytes de extra field
+            self.XLEN = list(reader.readBytes(self.lenXLEN))
+            self.xlen = self.XLEN[0] | self.XLEN[1] << 8
+            self.extraField = bytes(reader.readBytes(self.xlen))
+
+        def read_str_until_0():
+            s = bytearray()
             while True:
-                c = f.read(1)[0]
-                if c == 0: 
-                    return s
-                s += chr(c)
-        
+                c = reader.readBits(8)
+                if c == 0:
+                    return s.decode('latin-1')
+                s.append(c)
+
         # FLG_FNAME
         if self.FLG_FNAME == 1:
-            self.fName = read_str_until_0(f)
-        
+            self.fName = read_str_until_0()
+
         # FLG_FCOMMENT
         if self.FLG_FCOMMENT == 1:
-            self.fComment = read_str_until_0(f)
-        
+            self.fComment = read_str_until_0()
+
         # FLG_FHCRC (not processed...)
         if self.FLG_FHCRC == 1:
-            self.HCRC = f.read(2)
-            
+            self.HCRC = bytes(reader.readBytes(2))
+
+        return 0
+
+    def parse(self, data, offset=0):
+        ''' reads the header starting at offset of data (bytes-like, e.g. a memory mapped file).
+            Returns the offset after the header, or -1 if it is not a valid (complete) header '''
+
+        end = offset + self.FIXED.size
+        if end > len(data) or self.setFixed(data[offset:end]) != 0:
+            return -1
+
+        if self.FLG_FEXTRA == 1:
+            if end + self.lenXLEN > len(data):
+                return -1
+            self.xlen, = self.XLEN_FIELD.unpack_from(data, end)
+            self.XLEN = [self.xlen & 0xff, self.xlen >> 8]
+            end += self.lenXLEN
+            self.extraField = bytes(data[end:end + self.xlen])
+            end += self.xlen
+
+        # FNAME e FCOMMENT terminam com um byte 0
+        for flag, field in ((self.FLG_FNAME, 'fName'), (self.FLG_FCOMMENT, 'fComment')):
+            if flag == 1:
+                zero = findZero(data, end)
+                if zero < 0:
+                    return -1
+                setattr(self, field, bytes(data[end:zero]).decode('latin-1'))
+                end = zero + 1
+
+        if self.FLG_FHCRC == 1:
+            self.HCRC = bytes(data[end:end + 2])
+            end += 2
+        return end if end <= len(data) else -1
+
+    def subfield(self, sid):
+        ''' data of the subfield with the two byte identifier sid (SI1 SI2, e.g. b'BC') of the
+            extra field (RFC 1952, 2.3.1.1), or None if the header has no such subfield '''
+
+        if self.FLG_FEXTRA != 1:
+            return None
+        extra = self.extraField
+        pos = 0
+        # cada subcampo: SI1, SI2, LEN (2 bytes) e LEN bytes de dados
+        while pos + 4 <= len(extra):
+            length = extra[pos + 2] | extra[pos + 3] << 8
+            if extra[pos:pos + 2] == sid:
+                return extra[pos + 4:pos + 4 + length]
+            pos += 4 + length
+        return None
+
+    def setFixed(self, fields):
+        ''' sets the fields of the first 10 bytes of the header. Returns 0 if they are valid, -1 otherwise '''
+
+        if len(fields) < self.FIXED.size:
+            return -1
+        self.ID1, self.ID2, self.CM, self.FLG, self.mTime, self.XFL, self.OS = self.FIXED.unpack(fields)
+        # ID 1 and 2: fixed values; CM - Compression Method: must be the value 8 for deflate
+        if self.ID1 != 0x1f or self.ID2 != 0x8b or self.CM != 0x08:
+            return -1 # error in the header
+        self.MTIME = list(self.mTime.to_bytes(self.lenMTIME, 'little'))
+
+        # --- Check Flags
+        self.FLG_FTEXT = self.FLG & 0x01
+        self.FLG_FHCRC = (self.FLG & 0x02) >> 1
+        self.FLG_FEXTRA = (self.FLG & 0x04) >> 2
+        self.FLG_FNAME = (self.FLG & 0x08) >> 3
+        self.FLG_FCOMMENT = (self.FLG & 0x10) >> 4
         return 0
+
+    def write(self, f):
+        ''' writes the header to the binary file f. FLG is set from the optional fields that are
+            present (extraField, fName, fComment) and MTIME from mTime. Returns the header size '''
+
+        self.FLG_FEXTRA = 1 if self.extraField else 0
+        self.FLG_FNAME = 1 if self.fName else 0
+        self.FLG_FCOMMENT = 1 if self.fComment else 0
+        self.FLG_FHCRC = 0
+        self.FLG = self.FLG_FTEXT | self.FLG_FEXTRA << 2 | self.FLG_FNAME << 3 | self.FLG_FCOMMENT << 4
+
+        header = bytearray([0x1f, 0x8b, 0x08, self.FLG])
+        header += (self.mTime & 0xffffffff).to_bytes(self.lenMTIME, 'little')
+        header.append(self.XFL)
+        header.append(self.OS)
+        if self.FLG_FEXTRA:
+            header += len(self.extraField).to_bytes(self.lenXLEN, 'little')
+            header += bytes(self.extraField)
+        if self.FLG_FNAME:
+            header += self.fName.encode('latin-1') + b'\x00'
+        if self.FLG_FCOMMENT:
+            header += self.fComment.encode('latin-1') + b'\x00'
+        f.write(header)
+        return len(header)
             
 
 
@@ -113,20 +207,92 @@ class GZIP:
     gzh = None
     gzFile = ''
     fileSize = origFileSize = -1
-    numBlocks = 0
+    numBlocks = numMembers = 0
     f = None
+    ownsFile = False
+    reader = None
+    window = None
+    mm = data = None
+    released = 0
+    onBlock = onBlockStart = None
+    blockStats = totalStats = None
+    verify = True
+    crc = 0
+    trailer = None
+    flushSize = FLUSH_SIZE
+
+    #Quantos bits são necessários ler se o comprimento da leitura do código for maior que 265
+    ExtraLITLENBits = [1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5,0]
     
+    #Comprimento necessário adicionar se o código de comprimento lido for maior que 265
+    ExtraLITLENLens = [11, 13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227,258]
+    
+    #Quantos bits necessários ler se o código de distância lido for maior que 4
+    ExtraDISTBits = [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13]        
+    
+    #Distância necessária adicionar se o caractere especial lido for maior que 4
+    ExtraDISTLens = [5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193, 257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145, 8193, 12289, 16385, 24577]
+
+
+    # Comprimentos dos códigos de Huffman fixos (RFC 1951, 3.2.6)
+    FixedLITLENLens = [8]*144 + [9]*112 + [7]*24 + [8]*8
+    FixedDISTLens = [5]*32
+
+    # tabelas dos códigos fixos, partilhadas por todos os blocos BTYPE 01
+    fixedTables = None
+
+    # LRU cache of the decode tables of dynamic blocks (a TableCache; None builds every table)
+    tableCache = TABLE_CACHE
+
+    # if True, the BlockStats of each block count its back-references by length and distance code
+    histograms = False
+
+    # if True, the literal/length tables of dynamic blocks decode pairs of short literal codes at once
+    literalPairs = True
+
+
+    def __init__(self, filename, onBlock=None, verify=True, onBlockStart=None, useMmap=True, flushSize=FLUSH_SIZE):
+        ''' filename is the path of the gzip file or a binary file object to read from
+            (an open file, a pipe, a socket file...), which is read lazily and not closed by close().
+            If useMmap is True, regular files are memory mapped from their current position;
+            other inputs (and all of them if it is False) are read in chunks.
+            onBlock, if given, is called with the BlockStats of each block once it is decoded.
+            If verify is True, the CRC32 and ISIZE of the trailer are checked against the output.
+            onBlockStart, if given, is called with this object before the header of each block is read.
+            flushSize is the number of bytes decoded between two flushes of the output: memory use
+            is the 32 KB window plus this buffer, whatever the size of the blocks or of the file '''
+
+        self.onBlock = onBlock
+        self.flushSize = flushSize
+        self.onBlockStart = onBlockStart
+        self.verify = verify
+        self.totalStats = BlockStats()
+
+        if isinstance(filename, (str, bytes, os.PathLike)):
+            self.gzFile = filename
+            self.f = open(filename, 'rb')
+            self.ownsFile = True
+        else:
+            self.gzFile = getattr(filename, 'name', '')
+            self.f = filename
+            self.ownsFile = False
+
+        # regular files are mapped in memory and read through a memoryview, without copies
+        mapped = mapFile(self.f) if useMmap else None
+        if mapped is not None:
+            self.mm, self.data = mapped
+            self.fileSize = len(self.mm)
+            self.reader = BitReader(self.data)
+            return
 
-    bits_buffer = 0
-    available_bits = 0        
-
-
-    def __init__(self, filename):
-        self.gzFile = filename
-        self.f = open(filename, 'rb')
-        self.f.seek(0,2)
-        self.fileSize = self.f.tell()
-        self.f.seek(0)
+        # the size is only known for seekable inputs
+        if self.f.seekable():
+            start = self.f.tell()
+            self.f.seek(0,2)
+            self.fileSize = self.f.tell()
+            self.f.seek(start)
+        # all the reading of the compressed stream goes through a buffered BitReader
+        self.reader = BitReader(self.f)
 
     def readDynamicBlock (self):
         '''Interprets Dinamic Huffman compressed blocks'''
@@ -185,41 +351,83 @@ class GZIP:
             length = lenArray[n]
             #se nao for zero
             if(length != 0):
-                #[2:] remove o prefixo "0b"
-                code = bin(next_code[length])[2:]
-                # No caso de haver 0 no inicio do codigo bin,temos de os adicionar manualmente
-                # length-len(code) 0s têm se ser adicionados (int nao os adiciona)
-                #Calcula o número de zeros a serem adicionados ao início da representação binária para torná-la o comprimento correto
-                extension = "0"*(length-len(code)) 
-                huffman_code = extension + code
-                codes_list.append((n, huffman_code))
-                #Adiciona um nó à árvore Huffman com o código Huffman gerado, o índice de símbolos e imprime o código se verbose for True.
-                htr.addNode(extension+code, n, verbose=True)                #incrementa o próximo código para o comprimento atual, preparando-o para a próxima iteração.
+                if verbose:
+                    # so e preciso o codigo como string para o mostrar: length bits, com os 0s iniciais
+                    huffman_code = bin(next_code[length])[2:].zfill(length)
+                    codes_list.append((n, huffman_code))
+                    htr.addNode(huffman_code, n, verbose=verbose)
+                else:
+                    #Adiciona um nó à árvore Huffman com o código Huffman (inteiro) gerado e o índice de símbolos
+                    htr.addCode(next_code[length], length, n)
+                #incrementa o próximo código para o comprimento atual, preparando-o para a próxima iteração.
                 next_code[length] += 1
 
-        print(f"lista de (símbolos, codigos): {codes_list}")
+        if verbose:
+            print(f"lista de (símbolos, codigos): {codes_list}")
         return htr;
 
-    def storeTreeCodeLens(self, size, CLENTree):
-        '''Takes the code lengths huffmantree and stores the code lengths accordingly'''
+    def readStoredBlock(self):
+        '''Copies the bytes of a stored (BTYPE 00) block to the output window. Generator that
+        yields each time the window is full, so the pending output can be flushed'''
+
+        # LEN e NLEN começam no byte seguinte e NLEN é o complemento de LEN
+        header = self.reader.readBytes(4)
+        LEN = header[0] | header[1] << 8
+        NLEN = header[2] | header[3] << 8
+        if LEN != NLEN ^ 0xffff:
+            raise ValueError('stored block LEN does not match NLEN')
+
+        # cópia em bloco a partir do buffer de entrada, sem passar pelo buffer de bits
+        while LEN > 0:
+            n = min(LEN, self.window.space())
+            self.window.write(self.reader.readBytes(n))
+            LEN -= n
+            if self.window.isFull():
+                yield
+
+    def getFixedTables(self):
+        '''Returns the literal/length and distance decode tables of the fixed Huffman codes (BTYPE 01).
+        They are built on first use and shared by every fixed block afterwards'''
+
+        if GZIP.fixedTables is None:
+            GZIP.fixedTables = (self.createDecodeTable(self.FixedLITLENLens), self.createDecodeTable(self.FixedDISTLens))
+        return GZIP.fixedTables
+
+    def createDecodeTable(self, lenArray):
+        '''Takes an array with symbols' Huffman codes' lengths and returns
+        a lookup table (HuffmanTable) for decoding them, from tableCache if it was built recently'''
+
+        if self.tableCache is None:
+            return HuffmanTable(lenArray)
+        return self.tableCache.get(lenArray)
+
+    def createLiteralTable(self, lenArray):
+        '''Returns the literal/length decode table of a dynamic block: with literalPairs, and if
+        enough of its literal codes are short, a wider HuffmanTable whose entries may hold
+        two literals (see HuffmanTable.buildPairs)'''
+
+        if not self.literalPairs or pairShare(lenArray) < MIN_PAIR_SHARE:
+            return self.createDecodeTable(lenArray)
+        if self.tableCache is None:
+            return HuffmanTable(lenArray, PAIR_BITS, True)
+        return self.tableCache.get(lenArray, PAIR_BITS, True)
+
+    def decodeSymbol(self, table):
+        '''Decodes the next symbol of the stream with a HuffmanTable: peeks the longest
+        code of the table, finds symbol and code length in one lookup and consumes the code'''
+
+        entry = table.lookup(self.reader.peekBits(table.maxLen))
+        self.reader.consumeBits(entry & 15)
+        return entry >> 4
+
+    def storeTreeCodeLens(self, size, CLENTable):
+        '''Takes the code lengths decode table and stores the code lengths accordingly'''
 
         # Array onde o comprimento dos codigos ira ser guaradado 
         treeCodeLens = [] 
-        prevCode=-1
   
         while (len(treeCodeLens) < size):
-            # mete o nó atual na raiz da arvore de huffman
-            CLENTree.resetCurNode()
-            found = False
-   
-            # Durante a leitura, se uma folha não foi encontrada, continue procurando bit a bit
-            while(not found):
-                curBit = self.readBits(1)
-                # atualiza o nó atual de acordo com o bit lido
-                code = CLENTree.nextNode(str(curBit))
-                if(code != -1 and code != -2):
-                    # se foi encontrada uma foha, dar break do loop
-                    found = True
+            code = self.decodeSymbol(CLENTable)
 
             # SPECIAL CHARACTERS
             # 18 - lê 7 bits extra
@@ -229,148 +437,179 @@ class GZIP:
                 ammount = self.readBits(7)
                 # De acordo com os 7 bits que acabamos de ler, define os valores 11-139 seguintes no array de comprimento como 0
                 treeCodeLens += [0]*(11 + ammount)
-            if(code == 17):
+            elif(code == 17):
                 ammount = self.readBits(3)
                 # De acordo com os 3 bits que acabamos de ler, define os valores 3-11 seguintes no array de comprimento como 0 
                 treeCodeLens += [0]*(3 + ammount)
-            if(code == 16):
+            elif(code == 16):
                 ammount = self.readBits(2)
                 # De acordo com os 2 bits que acabamos de ler, define os valores 3-6 seguintes no array de comprimento como o comprimento lido anteriormente
-                treeCodeLens += [prevCode]*(3 + ammount)
-            elif(code >= 0 and code <= 15):
+                if not treeCodeLens:
+                    raise ValueError('code length repeat (16) with no previous length')
+                treeCodeLens += [treeCodeLens[-1]]*(3 + ammount)
+            else:
                 # Se um caractere especial não for encontrado, basta definir o próximo comprimento do código para o valor encontrado
                 treeCodeLens += [code]
-                # defenir o prevCode para o código atual caso o caractere especial 16 seja encontrado na próxima iteração
-                prevCode = code
 
+        # uma repetição não pode ultrapassar o número de comprimentos anunciado
+        if len(treeCodeLens) > size:
+            raise ValueError('too many code lengths')
         return treeCodeLens
 
-    def decompressLZ77(self, HuffmanTreeLITLEN, HuffmanTreeDIST, output):
+    def decompressLZ77(self, LITLENTable, DISTTable):
+        '''Decodes the literal/length and distance symbols of a block into the output window.
+        Returns True at the end of the block (256) and False if it stopped because the window
+        is full: the pending output must be flushed before calling it again'''
      
-        #Quantos bits são necessários ler se o comprimento da leitura do código for maior que 265
-        ExtraLITLENBits = [1, 1, 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5,0]
-        
-        #Comprimento necessário adicionar se o código de comprimento lido for maior que 265
-        ExtraLITLENLens = [11, 13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227,258]
-        
-        #Quantos bits necessários ler se o código de distância lido for maior que 4
-        ExtraDISTBits = [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13]        
-        
-        #Distância necessária adicionar se o caractere especial lido for maior que 4
-        ExtraDISTLens = [5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193, 257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145, 8193, 12289, 16385, 24577]
-
-
-        codeLITLEN = -1
-
-
-        # le da stream do input ate 256 ser encontrado
-        while(codeLITLEN != 256):
-            # Dá reset ao nó atual para a base da arvore
-            HuffmanTreeLITLEN.resetCurNode()
-
-            foundLITLEN = False
-            distFound = True
-
-            # enquanto um literal ou comprimento não seja encontrado na árvore LITLEN, continua a pesquisar bit a bit
-
-            while(not foundLITLEN):
-                curBit = str(self.readBits(1))
-                #Dá update ao nó atual de acordo ao bit lido
-                codeLITLEN = HuffmanTreeLITLEN.nextNode(curBit)
-    
-                #Caso seja atingida uma folha na árvore LITLEN, segue as instruções de acordo com o valor encontrado
-                if (codeLITLEN != -1 and codeLITLEN != -2):
-                    foundLITLEN = True
-     
-                    # Se o código atingido estiver no intervalo [0, 256[, apenas adiciona o valor lido correspondente a um literal ao array de saída
-                    if(codeLITLEN < 256):
-                        output += [codeLITLEN]
-
-                    # Se o código estiver no intervalo [257, 285], refere-se ao comprimento da string a ser copiada
-                    if(codeLITLEN > 256):
-         
-                        distFound = False
-      
-                        # Se o código estiver no intervalo [257, 265[, define o comprimento da string a ser copiada como o código lido - 257 + 3
-                        if(codeLITLEN < 265):
-                            length = codeLITLEN - 257 + 3
-                           
-                        # Os códigos no intervalo [265, 285] são especiais e requerem mais bits para serem lidos
-                        else:
-                            # dif define os índices nos "Arrays Extras" a serem usados 
-                            dif = codeLITLEN - 265
-                            # Quantos bits extras precisarão ser lidos
-                            readExtra = ExtraLITLENBits[dif]
-                            # Quanto comprimento extra adicionar
-                            lenExtra = ExtraLITLENLens[dif]
-                            length = lenExtra + self.readBits(readExtra)
-
-                        # Reseta o nó atual na árvore de distâncias para sua raiz
-                        HuffmanTreeDIST.resetCurNode()
-                        #Enquanto uma distância não for encontrada na árvore DIST, continue procurando bit a bit
-                        while(not distFound):
-                            distBit = str(self.readBits(1))
-                            # Atualiza o nó atual de acordo com o bit acabado de ler
-                            codeDIST = HuffmanTreeDIST.nextNode(distBit)
-
-                            # Se uma folha for atingida na árvore LITLEN, siga as instruções de acordo com o valor encontrado
-                            if(codeDIST != -1 and codeDIST != -2):
-                                distFound = True
-
-                                # Se o código lido estiver no intervalo [0, 4[, define a distância para retroceder como o código lido + 1
-                                if(codeDIST < 4):
-                                    distance = codeDIST + 1
-
-                                # dif define os índices nos "Arrays Extras" a serem usados
-                                else:
-                                    # dif define os índices nos "Arrays Extras" a serem usados
-                                    dif = codeDIST - 4
-                                    readExtra = ExtraDISTBits[dif]
-                                    # Quantos bits extras precisam ser lidos
-                                    distExtra = ExtraDISTLens[dif]
-                                    # Quanto distância extra adicionar
-                                    distance = distExtra + self.readBits(readExtra)
-                                
-                                # Para cada uma das iterações no intervalo(length), copie o caractere no índice len(output)-distance para o final do array de saída
-                                for i in range(length):
-                                    output.append(output[-distance])
-                                    
-                                    
-        return output
+        ExtraLITLENBits, ExtraLITLENLens = self.ExtraLITLENBits, self.ExtraLITLENLens
+        ExtraDISTBits, ExtraDISTLens = self.ExtraDISTBits, self.ExtraDISTLens
+        peekBits, consumeBits, readBits = self.reader.peekBits, self.reader.consumeBits, self.reader.readBits
+        litTable, litMask, litMax, litLookup = LITLENTable.table, LITLENTable.rootMask, LITLENTable.maxLen, LITLENTable.lookup
+        # uma tabela com pares pode ter mais bits no primeiro nivel do que o maior codigo
+        litMax = max(litMax, LITLENTable.rootBits)
+        distTable, distMask, distMax, distLookup = DISTTable.table, DISTTable.rootMask, DISTTable.maxLen, DISTTable.lookup
+
+        # o buffer e a posição de escrita da janela são usados como variáveis locais
+        window = self.window
+        buf, pos, limit = window.buf, window.pos, window.limit
+        matches = matchBytes = 0
+        stats = self.blockStats
+        lengthCounts = stats.lengthCounts if stats is not None else None
+        distanceCounts = stats.distanceCounts if stats is not None else None
+
+        try:
+            # le da stream do input ate 256 ser encontrado ou a janela encher
+            while pos < limit:
+                # um único acesso à tabela dá o símbolo e o número de bits do seu código
+                bits = peekBits(litMax)
+                entry = litTable[bits & litMask]
+                if entry < 0:
+                    # código mais longo que a tabela principal (ou inválido)
+                    entry = litLookup(bits)
+                consumeBits(entry & 15)
+                codeLITLEN = entry >> 4
+
+                # Se o código atingido estiver no intervalo [0, 256[, apenas escreve o literal na janela
+                if codeLITLEN < 256:
+                    buf[pos] = codeLITLEN
+                    pos += 1
+                    continue
+
+                # dois literais numa só entrada (há sempre espaço para mais MAX_MATCH bytes depois de limit)
+                if codeLITLEN >= PAIR:
+                    buf[pos] = (codeLITLEN >> 8) & 255
+                    buf[pos + 1] = codeLITLEN & 255
+                    pos += 2
+                    continue
+
+                if codeLITLEN == 256:
+                    window.pos = pos
+                    self.countMatches(matches, matchBytes)
+                    return True
+
+                # Se o código estiver no intervalo [257, 265[, define o comprimento da string a ser copiada como o código lido - 257 + 3
+                if codeLITLEN < 265:
+                    length = codeLITLEN - 257 + 3
+                # Os códigos no intervalo [265, 285] são especiais e requerem mais bits para serem lidos
+                else:
+                    dif = codeLITLEN - 265
+                    length = ExtraLITLENLens[dif] + readBits(ExtraLITLENBits[dif])
+
+                bits = peekBits(distMax)
+                entry = distTable[bits & distMask]
+                if entry < 0:
+                    entry = distLookup(bits)
+                consumeBits(entry & 15)
+                codeDIST = entry >> 4
+
+                # Se o código lido estiver no intervalo [0, 4[, define a distância para retroceder como o código lido + 1
+                if codeDIST < 4:
+                    distance = codeDIST + 1
+                else:
+                    dif = codeDIST - 4
+                    distance = ExtraDISTLens[dif] + readBits(ExtraDISTBits[dif])
+
+                # Copia length bytes a partir de distance bytes atrás (ver OutputWindow.copyMatch)
+                start = pos - distance
+                if start < 0:
+                    raise ValueError('invalid distance %d: only %d bytes of output available' % (distance, pos))
+                if distance >= length:
+                    # sem sobreposição: uma única cópia de fatia
+                    buf[pos:pos + length] = buf[start:start + length]
+                else:
+                    # sobreposição (distância 1, 2, 4, ...): replica o padrão de distance bytes
+                    buf[pos:pos + length] = (buf[start:pos] * (length // distance + 1))[:length]
+                pos += length
+                matches += 1
+                matchBytes += length
+                if lengthCounts is not None:
+                    lengthCounts[length] += 1
+                    distanceCounts[codeDIST] += 1
+        except IndexError:
+            # códigos 286/287 (literal/comprimento) e 30/31 (distância) não são válidos
+            raise ValueError('invalid length or distance code')
+
+        window.pos = pos
+        self.countMatches(matches, matchBytes)
+        return False
+
+    def countMatches(self, matches, matchBytes):
+        '''Adds the back-references decoded by decompressLZ77 to the statistics of the current block'''
+
+        if self.blockStats is not None:
+            self.blockStats.matches += matches
+            self.blockStats.matchBytes += matchBytes
  
-    def decompress(self):
-        ''' main function for decompressing the gzip file with deflate algorithm '''
-        
-        numBlocks = 0
+    def inflate(self, window=None, crc=0):
+        '''Generator that decodes the deflate blocks after the header. Yields memoryviews of the
+        decoded bytes whenever the output window is full and once more at the end; each view
+        is only valid until the next one is requested.
+        window is an OutputWindow already holding the previous output when decoding resumes
+        in the middle of a member; by default a new one is created. crc is then the CRC32 of
+        the output of the member already taken from the window'''
+
+        # cada membro tem a sua própria janela (as distâncias não atravessam membros)
+        self.window = window if window is not None else OutputWindow(self.flushSize)
+        window = self.window
+        self.crc = crc
 
-        # get original file size: size of file before compression
-        origFileSize = self.getOrigFileSize()
-        print(origFileSize)
-        
-        # read GZIP header
-        error = self.getHeader()
-        if error != 0:
-            print('Formato invalido!')
-            return
-        
-        # show filename read from GZIP header
-        print(self.gzh.fName)
-        
-        
         # MAIN LOOP - decode block by block
         BFINAL = 0    
-        # Opens the output file in "write binary mode"
-        f = open(self.gzh.fName, 'wb')
-        output = []
+        numBlocks = self.numBlocks
         while not BFINAL == 1:    
       
+            if self.onBlockStart is not None:
+                self.onBlockStart(self)
+
+            start = perf_counter()
+            produced = window.produced()
+            startBit = self.reader.tell()
+
             BFINAL = self.readBits(1)
             
             BTYPE = self.readBits(2)                    
-            if BTYPE != 2:
-                print('Error: Block %d not coded with Huffman Dynamic coding' % (numBlocks+1))
-                return
+            if BTYPE == 3:
+                raise ValueError('Block %d has an invalid type (BTYPE 11)' % (numBlocks+1))
+
+            stats = self.blockStats = BlockStats(numBlocks, BTYPE, BFINAL)
+            stats.startBit = startBit
+            if self.histograms and BTYPE != 0:
+                stats.lengthCounts = [0] * 259
+                stats.distanceCounts = [0] * 30
             
+            # if BTYPE == 00 in base 2 -> stored block, copied as is
+            if BTYPE == 0:
+                stats.headerTime = perf_counter() - start
+                for _ in self.readStoredBlock():
+                    yield from self.flushWindow()
+
+            # if BTYPE == 01 in base 2 -> fixed Huffman codes, with tables built only once
+            if BTYPE == 1:
+                stats.headerTime = perf_counter() - start
+                start = perf_counter()
+                LITLENTable, DISTTable = self.getFixedTables()
+                stats.tableTime = perf_counter() - start
+
             # if BTYPE == 10 in base 2 -> read the dinamic Huffman compression format 
             if BTYPE == int('10', 2):        
                 # HLIT: # of literal/length  codes
@@ -378,62 +617,294 @@ class GZIP:
                 # HCLEN: # of code length codes
                 
                 #ex1 (semana1)
-                HLIT, HDIST, HCLEN = self.readDynamicBlock()
-                print("exercício 1 :", HLIT + 257, "Códigos Literais/Comprimento", HDIST + 1, "Códigos de Distância", HCLEN + 4, "Códigos de Comprimentos de Código")
+                HLIT, HDIST, HCLEN = stats.HLIT, stats.HDIST, stats.HCLEN = self.readDynamicBlock()
+                logger.debug("block %d: %d literal/length codes, %d distance codes, %d code length codes", numBlocks, HLIT + 257, HDIST + 1, HCLEN + 4)
                 #ex2 (semana1)
                 # Armazena os comprimentos de código da árvore CLEN em uma ordem predefinida
                 CLENcodeLens = self.storeCLENLengths(HCLEN)
-                print("exercício 2 - Os comprimentos do CLEN são:", CLENcodeLens)
-                #print("Comprimentos de códigos dos índices i da árvore de comprimentos de código:", CLENcodeLens)
+                logger.debug("block %d: code length code lengths %s", numBlocks, CLENcodeLens)
                 #ex3 (semana2)
-                # Com base nos comprimentos de código da árvore CLEN, define uma árvore Huffman para CLEN
-                print("exercício 3 : HuffmanTreeCLENs")      
-                HuffmanTreeCLENs = self.createHuffmanFromLens(CLENcodeLens, verbose=False)
-                #ex4 (semana3)
-                # Armazena os comprimentos de código da árvore literal e de comprimento com base nos códigos da árvore CLEN
-                LITLENcodeLens = self.storeTreeCodeLens(HLIT + 257, HuffmanTreeCLENs)
-                print("exercício 4 LEN:", LITLENcodeLens)                
-                #ex5 (semana 4)
-                # Armazena os comprimentos de código da árvore de distância com base nos códigos da árvore CLEN
-                DISTcodeLens = self.storeTreeCodeLens(HDIST + 1, HuffmanTreeCLENs)
-                print("exercício 5 LEN:", DISTcodeLens)            
+                # Com base nos comprimentos de código da árvore CLEN, define uma tabela de descodificação para CLEN
+                tableStart = perf_counter()
+                CLENTable = self.createDecodeTable(CLENcodeLens)
+                stats.tableTime = perf_counter() - tableStart
+                #ex4/ex5 (semana3/semana4)
+                # Os comprimentos dos códigos literais/comprimento e de distância formam uma única sequência
+                # (um código de repetição pode atravessar a fronteira entre os dois alfabetos)
+                codeLens = self.storeTreeCodeLens(HLIT + 257 + HDIST + 1, CLENTable)
+                LITLENcodeLens = codeLens[:HLIT + 257]
+                DISTcodeLens = codeLens[HLIT + 257:HLIT + 257 + HDIST + 1]
+                logger.debug("block %d: literal/length code lengths %s", numBlocks, LITLENcodeLens)
+                logger.debug("block %d: distance code lengths %s", numBlocks, DISTcodeLens)
+                stats.headerTime = perf_counter() - start - stats.tableTime
                 #ex6 (semana5)
-                # Define a árvore Huffman literal e de comprimento com base nos comprimentos de seus códigos
-                print("exercício 6 : HuffmanTreeLITLEN")                
-                HuffmanTreeLITLEN = self.createHuffmanFromLens(LITLENcodeLens, verbose=False)
-                # Define a árvore Huffman de distância com base nos comprimentos de seus códigos
-                print("exercício 6 : HuffmanTreeDIST")    
-                HuffmanTreeDIST = self.createHuffmanFromLens(DISTcodeLens, verbose=False)
-                #ex7 (semana 5)
-                # Com base nas árvores definidas até agora, descomprime os dados de acordo com o algoritmo Lempel-Ziv77 
-                output = self.decompressLZ77(HuffmanTreeLITLEN, HuffmanTreeDIST, output)
-                print("exercício 7 :", output)
-                
-            
-            if(len(output) > 32768):
-                # Escreve cada caractere que excede a faixa de 32768 no arquivo
-                f.write(bytes(output[0 : len(output) - 32768]))
-                # Mantém o restante no array de saída
-                output = output[len(output) - 32768 :]
+                # Define as tabelas literal/comprimento e de distância com base nos comprimentos dos seus códigos
+                tableStart = perf_counter()
+                LITLENTable = self.createLiteralTable(LITLENcodeLens)
+                DISTTable = self.createDecodeTable(DISTcodeLens)
+                stats.tableTime += perf_counter() - tableStart
+
+            #ex7 (semana 5)
+            # Com base nas tabelas definidas até agora, descomprime os dados de acordo com o algoritmo Lempel-Ziv77 
+            if BTYPE != 0:
+                while True:
+                    start = perf_counter()
+                    done = self.decompressLZ77(LITLENTable, DISTTable)
+                    stats.decodeTime += perf_counter() - start
+                    if done:
+                        break
+                    yield from self.flushWindow()
+            else:
+                stats.decodeTime = perf_counter() - start - stats.headerTime - stats.flushTime
+
+            stats.bytes = window.produced() - produced
+            stats.bits = self.reader.tell() - startBit
+            stats.literals = stats.bytes - stats.matchBytes
+            self.reportBlock(stats)
                 
             # Atualiza o número de blocos lidos
             numBlocks += 1
+            self.numBlocks = numBlocks
             
         #ex8 (semana5)
-        
-        # Escreve os bytes correspondentes aos elementos do array de saída
-        f.write(bytes(output))
-        # Fecha o arquivo
-        f.close        
-
+        # Devolve os bytes que ainda faltam escrever
+        yield from self.flushWindow()
+
+        self.checkTrailer()
+        self.numMembers += 1
+
+    def nextMember(self):
+        '''Called after the trailer of a member: reads the header of the next member of a
+        multi-member file (as produced by concatenating gzip files). Returns True if there is
+        another member, False at the end of the input or if what follows is not a gzip member'''
+
+        if self.reader.atEnd():
+            return False
+        try:
+            error = self.getHeader()
+        except EOFError:
+            error = -1
+        if error != 0:
+            logger.warning('%s: trailing garbage after member %d ignored', self.gzFile, self.numMembers)
+            return False
+        return True
+
+    def flushWindow(self):
+        '''Yields the pending bytes of the output window and slides it, measuring the time the consumer
+        takes. The CRC32 of the output is updated here, as it is flushed'''
+
+        start = perf_counter()
+        view = self.window.take()
+        if self.verify:
+            self.crc = crc32(view, self.crc)
+        yield view
+        self.window.slide()
+        if self.mm is not None:
+            self.releaseInput()
+        if self.blockStats is not None:
+            self.blockStats.flushTime += perf_counter() - start
+
+    def releaseInput(self):
+        '''Drops from memory the pages of the mapped input before the current position, every
+        RELEASE_SIZE bytes, so that the resident memory does not grow with the compressed size.
+        They are read again from the file if decoding goes back to them'''
+
+        if not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        # o memoryview comeca na posicao do ficheiro onde estava o gzip
+        end = len(self.mm) - len(self.data) + self.reader.tell() // 8
+        end -= end % mmap.PAGESIZE
+        if end < self.released:
+            # voltou atras (streamFrom, seekBit): as paginas sao lidas de novo
+            self.released = 0
+        if end - self.released >= RELEASE_SIZE:
+            self.mm.madvise(mmap.MADV_DONTNEED, self.released, end - self.released)
+            self.released = end
+
+    def reportBlock(self, stats):
+        '''Adds the statistics of a decoded block to the totals, logs them and passes them to onBlock'''
+
+        self.totalStats.add(stats)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s', stats)
+        if self.onBlock is not None:
+            self.onBlock(stats)
+
+    def checkTrailer(self):
+        '''Reads the gzip trailer (CRC32 and ISIZE, after the last block), kept in self.trailer, and,
+        if verify is True, raises GZIPError if they do not match the decompressed output'''
+
+        trailer = self.reader.readBytes(8)
+        CRC32 = int.from_bytes(trailer[0:4], 'little')
+        ISIZE = int.from_bytes(trailer[4:8], 'little')
+        self.trailer = (CRC32, ISIZE)
+        if not self.verify:
+            return
 
-        self.f.close()    
-        print("End: %d block(s) analyzed." % numBlocks)
+        if CRC32 != self.crc:
+            raise GZIPError('CRC32 mismatch: trailer has %08x, output has %08x' % (CRC32, self.crc))
+        # ISIZE guarda o tamanho original modulo 2^32
+        size = self.window.produced()
+        if ISIZE != size & 0xffffffff:
+            raise GZIPError('ISIZE mismatch: trailer has %d, output has %d bytes' % (ISIZE, size))
+
+    def outputName(self):
+        ''' name for the decompressed file: FNAME from the header without any directories or, if
+            the header has none, the name of the gzip file without its .gz suffix '''
+
+        name = os.path.basename(self.gzh.fName.replace('\\', '/')) if self.gzh is not None else ''
+        if name in ('', '.', '..'):
+            name = os.path.basename(os.fsdecode(self.gzFile)) if isinstance(self.gzFile, (str, bytes)) else ''
+            root, ext = os.path.splitext(name)
+            if ext.lower() in ('.gz', '.z') and root:
+                name = root
+            elif ext.lower() == '.tgz' and root:
+                name = root + '.tar'
+            else:
+                name = (name or 'gzip') + '.out'
+        return name
+
+    def decompressTo(self, out):
+        ''' writes the decompressed data of every member to out, a binary file or a Sink (see
+            sinks.py). The header of the first member must have been read. Returns the number
+            of bytes written '''
+
+        size = 0
+        # todos os membros (ficheiros gzip concatenados) vão para o mesmo ficheiro
+        while True:
+            for chunk in self.inflate():
+                out.write(chunk)
+                size += len(chunk)
+            if not self.nextMember():
+                return size
+
+    def decompress(self, outPath=None):
+        ''' main function for decompressing the gzip file with deflate algorithm.
+            The output goes to outPath (default: outputName() in the current folder).
+            Returns the path written or None if there was an error '''
+        
+        # get original file size: size of file before compression
+        origFileSize = self.getOrigFileSize()
+        logger.info('original size: %d bytes', origFileSize)
+        
+        # read GZIP header
+        error = self.getHeader()
+        if error != 0:
+            logger.error('Formato invalido!')
+            self.close()
+            return None
+        
+        # show filename read from GZIP header
+        logger.info('file name: %s', self.gzh.fName)
+        if outPath is None:
+            outPath = self.outputName()
+        
+        # Opens the output file in "write binary mode" and writes the output as it is decoded
+        f = open(outPath, 'wb')
+        try:
+            self.decompressTo(f)
+        except (ValueError, EOFError) as e:
+            logger.error('Error: %s', e)
+            return None
+        finally:
+            # Fecha o arquivo
+            f.close()
+            self.close()
+
+        logger.info("End: %d block(s) in %d member(s) analyzed.", self.numBlocks, self.numMembers)
+        if self.tableCache is not None:
+            logger.debug('table cache: %s', self.tableCache.stats())
+        return outPath
     
     
+    def stream(self):
+        ''' generator that reads the header and yields memoryviews of the decompressed data
+            of every member as it is decoded (each one valid until the next is requested).
+            Raises GZIPError if the file is not valid '''
+
+        try:
+            if self.getHeader() != 0:
+                raise GZIPError('invalid gzip header')
+            while True:
+                yield from self.inflate()
+                if not self.nextMember():
+                    break
+        except GZIPError:
+            raise
+        except (ValueError, EOFError) as e:
+            raise GZIPError(str(e)) from e
+
+    def streamFrom(self, bitOffset, history=b''):
+        ''' generator like stream, but resuming at the block that starts at bitOffset of the input,
+            with history as the output that precedes it (at least the last 32 KB of its member).
+            The CRC32 of that member cannot be checked; the following members are verified '''
+
+        verify = self.verify
+        try:
+            self.reader.seekBit(bitOffset)
+            window = OutputWindow(self.flushSize)
+            window.prime(history)
+            self.verify = False
+            yield from self.inflate(window)
+            self.verify = verify
+            while self.nextMember():
+                yield from self.inflate()
+        except GZIPError:
+            raise
+        except (ValueError, EOFError) as e:
+            raise GZIPError(str(e)) from e
+        finally:
+            self.verify = verify
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        ''' generator of the decompressed data in bytes objects of chunk_size bytes (the last
+            one may be shorter). Input is read and decoded only as chunks are requested '''
+
+        pending = bytearray()
+        for view in self.stream():
+            start = 0
+            # completa o chunk que ficou a meio com o inicio da nova saida
+            if pending:
+                start = chunk_size - len(pending)
+                pending += view[:start]
+                if len(pending) < chunk_size:
+                    continue
+                yield bytes(pending)
+                pending = bytearray()
+
+            while len(view) - start >= chunk_size:
+                yield bytes(view[start:start + chunk_size])
+                start += chunk_size
+            pending += view[start:]
+
+        if pending:
+            yield bytes(pending)
+
+    def close(self):
+        ''' closes the input file, if it was opened by this object, and its memory mapping '''
+
+        if self.mm is not None:
+            self.reader.data = memoryview(b'')
+            self.data = None
+            try:
+                self.mm.close()
+            except BufferError:
+                # ainda ha memoryviews do input em uso: o mapeamento e libertado com elas
+                pass
+            self.mm = None
+        if self.ownsFile:
+            self.f.close()
+
     def getOrigFileSize(self):
-        ''' reads file size of original file (before compression) - ISIZE '''
+        ''' reads file size of original file (before compression) - ISIZE. Returns -1 if the
+            input is not seekable '''
         
+        if self.fileSize < 0:
+            return -1
+
+        if self.mm is not None:
+            return int.from_bytes(self.mm[self.fileSize-4:self.fileSize], 'little')
+
         # saves current position of file pointer
         fp = self.f.tell()
         
@@ -441,9 +912,7 @@ class GZIP:
         self.f.seek(self.fileSize-4)
         
         # reads the last 4 bytes (LITTLE ENDIAN)
-        sz = 0
-        for i in range(4): 
-            sz += self.f.read(1)[0] << (8*i)
+        sz = int.from_bytes(self.f.read(4), 'little')
         
         # restores file pointer to its original position
         self.f.seek(fp)
@@ -456,35 +925,59 @@ class GZIP:
         ''' reads GZIP header'''
 
         self.gzh = GZIPHeader()
-        header_error = self.gzh.read(self.f)
+        header_error = self.gzh.read(self.reader)
         return header_error
         
 
     def readBits(self, n, keep=False):
-        ''' reads n bits from bits_buffer. if keep = True, leaves bits in the buffer for future accesses '''
+        ''' reads n bits from the BitReader. if keep = True, leaves bits in the buffer for future accesses '''
 
-        while n > self.available_bits:
-            self.bits_buffer = self.f.read(1)[0] << self.available_bits | self.bits_buffer
-            self.available_bits += 8
-        
-        mask = (2**n)-1
-        value = self.bits_buffer & mask
+        if keep:
+            return self.reader.peekBits(n)
+        return self.reader.readBits(n)
 
-        if not keep:
-            self.bits_buffer >>= n
-            self.available_bits -= n
+    
 
-        return value
+class GZIPReader(io.RawIOBase):
+    ''' read-only file object with the decompressed contents of a gzip file, given by its path
+        or as a binary file object. Data is decoded as it is read, so memory use does not
+        depend on the size of the file '''
 
-    
+    def __init__(self, source):
+        self.gz = GZIP(source)
+        self.views = self.gz.stream()
+        self.view = memoryview(b'')
 
-if __name__ == '__main__':
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        ''' fills b with the next decompressed bytes. Returns the number of bytes read, 0 at the end '''
+
+        # a vista anterior so e substituida depois de totalmente consumida
+        while not self.view:
+            try:
+                self.view = next(self.views)
+            except StopIteration:
+                return 0
+
+        with memoryview(b) as out:
+            out = out.cast('B')
+            n = min(len(out), len(self.view))
+            out[:n] = self.view[:n]
+        self.view = self.view[n:]
+        return n
 
-    # gets filename from command line if provided
-    fileName = "FAQ.txt.gz"
-    if len(sys.argv) > 1:
-        fileName = sys.argv[1]            
+    def close(self):
+        if not self.closed:
+            self.view = memoryview(b'')
+            self.views.close()
+            self.gz.close()
+        super().close()
+
+
+if __name__ == '__main__':
 
-    # decompress file
-    gz = GZIP(fileName)
-    gz.decompress()
\ No newline at end of file
+    # the command line interface is in gunzip.py
+    from gunzip import main
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# Listing of gzip files (as "gzip -l"), reading only headers and trailers
+# Teoria da Informacao, LEI
+
+import argparse
+import logging
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from gzip import GZIP, GZIPError
+from parallel import MAX_RATIO, MIN_MEMBER, findMemberCandidates, plausibleMember
+
+
+logger = logging.getLogger(__name__)
+
+# CRC32 and ISIZE of a member trailer
+TRAILER = struct.Struct('<II')
+
+# smallest deflate stream (an empty fixed block) plus a trailer
+MIN_BODY = 2 + TRAILER.size
+
+# suffixes of the files listed when scanning folders
+SUFFIXES = ('.gz', '.tgz', '.z')
+
+
+class ListEntry:
+    ''' what is listed for one gzip file: sizes, number of members, MTIME and name of the first
+        header, bytes of the first header and trailer, and the error message (None if the file
+        could be read) '''
+
+    __slots__ = ('path', 'name', 'mTime', 'compressedSize', 'headerSize', 'size', 'members', 'error')
+
+    def __init__(self, path):
+        self.path = path
+        self.name = ''
+        self.mTime = 0
+        self.compressedSize = self.headerSize = self.size = 0
+        self.members = 0
+        self.error = None
+
+    @property
+    def ratio(self):
+        ''' space saved, as gzip -l: 1 - deflate data / uncompressed, where the deflate data
+            excludes the header and trailer of the first member '''
+
+        return spaceSaved(self.compressedSize - self.headerSize, self.size)
+
+
+def spaceSaved(compressed, size):
+    ''' 1 - compressed / size (0 if size is 0) '''
+
+    if size == 0:
+        return 0.0
+    return 1 - compressed / size
+
+
+def memberStarts(data, headerEnd):
+    ''' offsets of the members of data (a whole gzip file) after the first, whose header ends at
+        headerEnd, found without decoding: magic bytes followed by a plausible header, far enough
+        from the previous member to leave room for its blocks and trailer '''
+
+    starts = []
+    nextStart = headerEnd + MIN_BODY
+    for offset in findMemberCandidates(data):
+        if offset >= nextStart and plausibleMember(data, offset):
+            starts.append(offset)
+            nextStart = offset + MIN_MEMBER
+    return starts
+
+
+def memberEnds(data, headerEnd):
+    ''' offsets where each member of data ends, from the members found by memberStarts, or None
+        if they do not form a plausible chain up to the end of data: the trailer of each member
+        (the last one at the end of data) must have an ISIZE that its compressed size could have
+        produced (as in parallel.plausibleStarts) '''
+
+    starts = memberStarts(data, headerEnd)
+    ends = starts + [len(data)]
+    for start, end in zip([0] + starts, ends):
+        # ISIZE e o tamanho modulo 2^32, nunca maior que o tamanho real
+        if int.from_bytes(data[end - 4:end], 'little') > MAX_RATIO * (end - start):
+            return None
+    return ends
+
+
+def exactMemberEnds(gz):
+    ''' offsets where each member of gz ends, found by decoding it without checking the output
+        (slow: used when the headers found by memberStarts cannot be trusted) '''
+
+    ends = []
+    gz.verify = False
+    while True:
+        for _ in gz.inflate():
+            pass
+        ends.append(gz.reader.tell() // 8)
+        if not gz.nextMember():
+            return ends
+
+
+def listFile(path, exact=False):
+    ''' lists the gzip file path without decompressing it: the uncompressed size is the sum of the
+        ISIZE of the trailers of its members (modulo 2^32 each, as gzip). Member boundaries are
+        found from their headers and checked against the trailers before them (see memberEnds);
+        if they are not plausible, or exact is True, the members are decoded instead.
+        Returns a ListEntry (errors are returned, not raised, so it can run in a worker) '''
+
+    entry = ListEntry(path)
+    gz = None
+    try:
+        gz = GZIP(path)
+        if gz.getHeader() != 0:
+            raise GZIPError('invalid gzip header')
+        # onde o gunzip escreveria o ficheiro
+        entry.name = os.path.join(os.path.dirname(path), gz.outputName())
+        entry.mTime = gz.gzh.mTime
+        headerEnd = gz.reader.tell() // 8
+
+        # o mmap (como bytes) tem find, usado para procurar os membros; ficheiros vazios nao sao mapeados
+        data = gz.mm
+        if data is None:
+            gz.f.seek(0)
+            data = gz.f.read()
+        entry.compressedSize = size = len(data)
+        entry.headerSize = headerEnd + TRAILER.size
+        if size < headerEnd + MIN_BODY:
+            raise GZIPError('unexpected end of compressed stream')
+
+        ends = None if exact else memberEnds(data, headerEnd)
+        if ends is None:
+            ends = exactMemberEnds(gz)
+
+        # cada membro termina com o seu trailer
+        for end in ends:
+            crc, isize = TRAILER.unpack_from(data, end - TRAILER.size)
+            entry.size += isize
+        entry.members = len(ends)
+        del data
+    except (ValueError, EOFError, OSError) as e:
+        entry.error = str(e)
+    finally:
+        if gz is not None:
+            gz.close()
+    return entry
+
+
+def expandTree(paths):
+    ''' the files of paths, with folders replaced by the gzip files found in them (recursively) '''
+
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for folder, dirs, names in os.walk(path):
+            dirs.sort()
+            files.extend(os.path.join(folder, name) for name in sorted(names) if name.lower().endswith(SUFFIXES))
+    return files
+
+
+def listFiles(paths, jobs=1, exact=False):
+    ''' lists the gzip files of paths (folders are scanned recursively), on a pool of jobs processes
+        if jobs > 1 (0: one per CPU). Returns the ListEntry of each file, in order '''
+
+    files = expandTree(paths)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            return list(pool.map(listFile, files, [exact] * len(files), chunksize=max(1, len(files) // (4 * jobs))))
+    return [listFile(path, exact) for path in files]
+
+
+def printListing(entries, out=sys.stdout, verbose=False):
+    ''' prints entries as a table, as gzip -l (-v adds the members and MTIME), with a line of totals
+        if there is more than one file. Returns the number of files that could not be read '''
+
+    def row(compressed, size, ratio, name, members='', mTime=''):
+        line = '%19s %19s %6s ' % (compressed, size, ratio)
+        if verbose:
+            line += '%7s %19s ' % (members, mTime)
+        out.write(line + name + '\n')
+
+    row('compressed', 'uncompressed', 'ratio', 'uncompressed_name', 'members', 'mtime')
+    failed = compressed = size = headerSize = 0
+    for entry in entries:
+        if entry.error is not None:
+            failed += 1
+            logger.error('%s: %s', entry.path, entry.error)
+            continue
+        compressed += entry.compressedSize
+        size += entry.size
+        headerSize = entry.headerSize
+        mTime = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.mTime)) if entry.mTime else '-'
+        row(entry.compressedSize, entry.size, '%.1f%%' % (100 * entry.ratio), entry.name, entry.members, mTime)
+
+    if len(entries) - failed > 1:
+        # como o gzip: so se desconta o cabecalho e o trailer do ultimo ficheiro
+        ratio = spaceSaved(compressed - headerSize, size)
+        row(compressed, size, '%.1f%%' % (100 * ratio), '(totals)')
+    return failed
+
+
+def main(argv=None):
+    ''' entry point of the command line. Returns the exit status: 0 if every file was listed, 1 otherwise '''
+
+    parser = argparse.ArgumentParser(description='lists gzip files without decompressing them')
+    parser.add_argument('inputs', nargs='+', help='gzip files or folders (scanned recursively)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes reading files at once (0: one per CPU)')
+    parser.add_argument('--exact', action='store_true', help='decode the members to find their boundaries')
+    parser.add_argument('-v', '--verbose', action='store_true', help='also show the number of members and MTIME')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    entries = listFiles(args.inputs, args.jobs, args.exact)
+    return 1 if printListing(entries, verbose=args.verbose) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,503 @@
+# Listing and selective extraction of .tar.gz archives, parsing the tar headers as they are decoded
+# Teoria da Informacao, LEI
+
+import argparse
+import fnmatch
+import logging
+import os
+import stat
+import struct
+import sys
+import time
+
+from gzip import GZIP
+
+
+logger = logging.getLogger(__name__)
+
+# tar archives are made of 512 byte blocks: a header per member, followed by its data
+BLOCK = 512
+
+# ustar header (POSIX.1-1988), with the checksum at CHECKSUM
+HEADER = struct.Struct('100s8s8s8s12s12s8sc100s6s2s32s32s8s8s155s12x')
+CHECKSUM = slice(148, 156)
+
+# member types (typeflag)
+REGULAR, HARDLINK, SYMLINK, CHARDEV, BLOCKDEV, DIRECTORY, FIFO, CONTIGUOUS = b'0', b'1', b'2', b'3', b'4', b'5', b'6', b'7'
+# headers that describe the next member: pax extended (per member, global) and GNU long names
+PAX, PAX_GLOBAL, GNU_LONGNAME, GNU_LONGLINK = b'x', b'g', b'L', b'K'
+
+TYPE_CHARS = {REGULAR: '-', CONTIGUOUS: '-', HARDLINK: 'h', SYMLINK: 'l', CHARDEV: 'c',
+              BLOCKDEV: 'b', DIRECTORY: 'd', FIFO: 'p'}
+
+
+class TarError(ValueError):
+    ''' the decompressed data is not a valid tar archive '''
+
+
+class TarMember:
+    ''' a member of a tar archive, as described by its header (and the pax or GNU headers before it).
+        offset is where its data starts in the decompressed archive '''
+
+    __slots__ = ('name', 'size', 'mode', 'mtime', 'type', 'linkname', 'uname', 'gname', 'offset')
+
+    def __init__(self):
+        self.name = self.linkname = self.uname = self.gname = ''
+        self.size = self.mode = self.mtime = self.offset = 0
+        self.type = REGULAR
+
+    def isfile(self):
+        return self.type in (REGULAR, CONTIGUOUS)
+
+    def isdir(self):
+        return self.type == DIRECTORY
+
+    def issym(self):
+        return self.type == SYMLINK
+
+    def islnk(self):
+        return self.type == HARDLINK
+
+    def listing(self, verbose=False):
+        ''' line of "tar -t" (or "tar -tv") for the member '''
+
+        if not verbose:
+            return self.name
+        mode = TYPE_CHARS.get(self.type, '?') + stat.filemode(self.mode)[1:]
+        owner = '%s/%s' % (self.uname or '-', self.gname or '-')
+        line = '%s %-17s %10d %s %s' % (mode, owner, self.size, time.strftime('%Y-%m-%d %H:%M', time.localtime(self.mtime)), self.name)
+        if self.issym():
+            line += ' -> ' + self.linkname
+        elif self.islnk():
+            line += ' link to ' + self.linkname
+        return line
+
+
+class OutputReader:
+    ''' reads the decompressed data given as memoryviews by views (e.g. GZIP.stream()) as a stream
+        of bytes. Data can be copied to a file or skipped piece by piece, without keeping it '''
+
+    def __init__(self, views):
+        self.views = views
+        self.view = memoryview(b'')
+        self.offset = 0           # bytes read or skipped
+
+    def next(self):
+        ''' the unread part of the current view, or the next view. Empty at the end of the data '''
+
+        if not self.view:
+            self.view = next(self.views, memoryview(b''))
+        return self.view
+
+    def copy(self, n, out=None):
+        ''' writes the next n bytes to out (or skips them, if out is None).
+            Returns the number of bytes copied, less than n only at the end of the data '''
+
+        left = n
+        while left:
+            view = self.next()
+            if not view:
+                break
+            piece = view[:left]
+            if out is not None:
+                out.write(piece)
+            self.view = view[len(piece):]
+            self.offset += len(piece)
+            left -= len(piece)
+        return n - left
+
+    def read(self, n):
+        ''' the next n bytes (fewer only at the end of the data) '''
+
+        data = bytearray()
+        while len(data) < n:
+            view = self.next()
+            if not view:
+                break
+            piece = view[:n - len(data)]
+            data += piece
+            self.view = view[len(piece):]
+        self.offset += len(data)
+        return bytes(data)
+
+
+def decodeText(field):
+    ''' text of a NUL terminated header field '''
+
+    return field.split(b'\0', 1)[0].decode('utf-8', 'surrogateescape')
+
+
+def decodeNumber(field):
+    ''' value of a numeric header field: octal digits (ended by a space or NUL) or, as GNU tar
+        writes large values, a base-256 big-endian number with the high bit of the first byte set '''
+
+    if field[0] & 0x80:
+        value = int.from_bytes(field[1:], 'big')
+        # 0xff: numero negativo
+        return value - (1 << (8 * len(field) - 8)) if field[0] == 0xff else value
+    digits = field.split(b'\0', 1)[0].strip()
+    try:
+        return int(digits, 8) if digits else 0
+    except ValueError:
+        raise TarError('invalid number in tar header: %r' % field) from None
+
+
+def parsePax(data):
+    ''' dict of the records of a pax extended header: "<length> <key>=<value>\\n" '''
+
+    records = {}
+    pos = 0
+    while pos < len(data) and data[pos] != 0:
+        space = data.find(b' ', pos)
+        try:
+            length = int(data[pos:space])
+        except ValueError:
+            raise TarError('invalid pax header record') from None
+        record = data[space + 1:pos + length]
+        if length <= 0 or not record.endswith(b'\n') or b'=' not in record:
+            raise TarError('invalid pax header record')
+        key, value = record[:-1].split(b'=', 1)
+        records[key.decode('utf-8', 'surrogateescape')] = value.decode('utf-8', 'surrogateescape')
+        pos += length
+    return records
+
+
+class TarStream:
+    ''' iterator of the members of the tar archive compressed in gz (a GZIP), parsed as its data
+        is decoded:
+
+            tar = TarStream(GZIP(path))
+            for member in tar:
+                if member.name == wanted:
+                    tar.copyData(out)
+
+        The data of a member can be copied by copyData before asking for the next member;
+        otherwise it is skipped (decoded, but not kept). Supports ustar, pax (including global
+        headers) and the GNU long names. Raises TarError if the archive is not valid '''
+
+    def __init__(self, gz):
+        self.gz = gz
+        self.reader = OutputReader(gz.stream())
+        self.member = None
+        self.dataEnd = 0          # offset after the data of the current member (and its padding)
+        self.globals = {}         # pax records of the global headers so far
+
+    def __iter__(self):
+        while True:
+            member = self.next()
+            if member is None:
+                return
+            yield member
+
+    def skip(self):
+        ''' skips what is left of the current member '''
+
+        left = self.dataEnd - self.reader.offset
+        if left > 0 and self.reader.copy(left) != left:
+            raise TarError('unexpected end of tar archive')
+
+    def copyData(self, out):
+        ''' writes the data of the current member to out (a binary file). Returns its size '''
+
+        member = self.member
+        if self.reader.offset != member.offset:
+            raise TarError('the data of %s was already read' % member.name)
+        if self.reader.copy(member.size, out) != member.size:
+            raise TarError('unexpected end of tar archive')
+        self.skip()
+        return member.size
+
+    def readBlock(self):
+        block = self.reader.read(BLOCK)
+        if len(block) != BLOCK:
+            raise TarError('unexpected end of tar archive')
+        return block
+
+    def next(self):
+        ''' the next member (skipping the data of the current one), or None at the end '''
+
+        self.skip()
+        pax = {}
+        longName = longLink = None
+        while True:
+            if not self.reader.next():
+                # sem os dois blocos de zeros: aceite, como o tar do GNU
+                return self.end()
+            block = self.readBlock()
+            if block == bytes(BLOCK):
+                return self.end()
+            checkHeader(block, self.reader.offset - BLOCK)
+            fields = HEADER.unpack(block)
+            typeflag, size = fields[7], decodeNumber(fields[4])
+
+            # cabecalhos que descrevem o membro seguinte
+            if typeflag in (PAX, PAX_GLOBAL, GNU_LONGNAME, GNU_LONGLINK):
+                data = self.reader.read(padded(size))
+                if len(data) != padded(size):
+                    raise TarError('unexpected end of tar archive')
+                data = data[:size]
+                if typeflag == PAX:
+                    pax.update(parsePax(data))
+                elif typeflag == PAX_GLOBAL:
+                    self.globals.update(parsePax(data))
+                elif typeflag == GNU_LONGNAME:
+                    longName = decodeText(data)
+                else:
+                    longLink = decodeText(data)
+                continue
+
+            member = TarMember()
+            member.name = decodeText(fields[0])
+            # ustar (e o formato do GNU) guardam o inicio de nomes longos em prefix
+            if fields[9].startswith(b'ustar') and fields[15][0]:
+                member.name = decodeText(fields[15]) + '/' + member.name
+            member.mode = decodeNumber(fields[1]) & 0o7777
+            member.size = size
+            member.mtime = decodeNumber(fields[5])
+            member.type = REGULAR if typeflag == b'\0' else typeflag
+            member.linkname = decodeText(fields[8])
+            member.uname, member.gname = decodeText(fields[11]), decodeText(fields[12])
+            if longName is not None:
+                member.name = longName
+            if longLink is not None:
+                member.linkname = longLink
+            self.applyPax(member, {**self.globals, **pax})
+            if member.type in (DIRECTORY, SYMLINK, HARDLINK, CHARDEV, BLOCKDEV, FIFO):
+                # estes tipos nao tem dados, mesmo que size diga o contrario (como o tarfile)
+                member.size = 0
+            member.offset = self.reader.offset
+            self.member = member
+            self.dataEnd = member.offset + padded(member.size)
+            return member
+
+    def applyPax(self, member, records):
+        ''' overrides the fields of member with those given in pax records '''
+
+        try:
+            if 'path' in records:
+                member.name = records['path']
+            if 'linkpath' in records:
+                member.linkname = records['linkpath']
+            if 'size' in records:
+                member.size = int(records['size'])
+            if 'mtime' in records:
+                member.mtime = float(records['mtime'])
+        except ValueError:
+            raise TarError('invalid pax header record') from None
+        if 'uname' in records:
+            member.uname = records['uname']
+        if 'gname' in records:
+            member.gname = records['gname']
+
+    def end(self):
+        ''' reads the rest of the decompressed data (the padding of the archive), so that the
+            trailers of the gzip file are checked '''
+
+        self.member = None
+        while self.reader.copy(1 << 20):
+            pass
+        return None
+
+
+def padded(size):
+    ''' size rounded up to whole blocks '''
+
+    return -(-size // BLOCK) * BLOCK
+
+
+def checkHeader(block, offset):
+    ''' raises TarError if the checksum of the header block (at offset of the archive) is wrong:
+        the sum of its bytes, counting the checksum field as spaces (some old tars summed them
+        as signed bytes) '''
+
+    stored = decodeNumber(block[CHECKSUM])
+    rest = block[:CHECKSUM.start] + block[CHECKSUM.stop:]
+    unsigned = sum(rest) + 8 * ord(' ')
+    if stored != unsigned and stored != unsigned - 256 * sum(b >= 128 for b in rest):
+        raise TarError('invalid tar header checksum at offset %d' % offset)
+
+
+def safePath(name):
+    ''' name as a relative path that stays inside the extraction folder: leading slashes (and
+        drive letters) are removed. Returns None for names with ".." components '''
+
+    name = os.path.splitdrive(name)[1].replace('\\', '/').lstrip('/')
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if '..' in parts:
+        return None
+    return os.path.join(*parts) if parts else os.curdir
+
+
+def selected(name, patterns):
+    ''' True if name is given by one of patterns (shell wildcards), or is inside a folder that is '''
+
+    name = name.rstrip('/')
+    for pattern in patterns:
+        pattern = pattern.rstrip('/')
+        if fnmatch.fnmatchcase(name, pattern) or name.startswith(pattern + '/'):
+            return True
+    return False
+
+
+def inside(path, folder):
+    ''' True if path, with its symbolic links resolved, is inside folder '''
+
+    folder = os.path.realpath(folder)
+    return os.path.commonpath([os.path.realpath(path), folder]) == folder
+
+
+def extractMember(tar, member, dest, keep=False):
+    ''' extracts the current member of tar (a TarStream) into the folder dest: folders, regular
+        files (with their mode and mtime), symbolic and hard links that stay inside dest.
+        Returns the path written, or None if the member was skipped. Raises TarError if its
+        name or link would lead outside dest '''
+
+    path = safePath(member.name)
+    if path is None:
+        raise TarError('%s: unsafe path, not extracted' % member.name)
+    target = os.path.join(dest, path)
+    # um link extraido antes nao pode levar a escrita para fora de dest
+    if not inside(os.path.dirname(target), dest):
+        raise TarError('%s: path leads outside %s, not extracted' % (member.name, dest))
+    if keep and not member.isdir() and os.path.lexists(target):
+        logger.warning('%s: already exists, not replaced', target)
+        return None
+
+    if member.isdir():
+        os.makedirs(target, exist_ok=True)
+        os.chmod(target, member.mode | 0o700)
+        return target
+    if not (member.isfile() or member.issym() or member.islnk()):
+        logger.warning('%s: type %s not supported, not extracted', member.name, member.type.decode())
+        return None
+
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    if os.path.lexists(target) and not os.path.isdir(target):
+        # nunca escrever atraves de um link que ja existe
+        os.unlink(target)
+
+    if member.issym():
+        if not inside(os.path.join(os.path.dirname(target), member.linkname), dest):
+            raise TarError('%s: link to %s leads outside %s, not extracted' % (member.name, member.linkname, dest))
+        os.symlink(member.linkname, target)
+        return target
+    if member.islnk():
+        source = safePath(member.linkname)
+        if source is None or not inside(os.path.join(dest, source), dest):
+            raise TarError('%s: link to %s leads outside %s, not extracted' % (member.name, member.linkname, dest))
+        os.link(os.path.join(dest, source), target)
+        return target
+
+    with open(target, 'wb') as f:
+        tar.copyData(f)
+    os.chmod(target, member.mode & 0o777)
+    os.utime(target, (member.mtime, member.mtime))
+    return target
+
+
+def iterArchive(path):
+    ''' generator of the members of the .tar.gz archive path, as they are decoded.
+        Raises GZIPError or TarError if it is not valid '''
+
+    gz = GZIP(path)
+    try:
+        yield from TarStream(gz)
+    finally:
+        gz.close()
+
+
+def extractArchive(path, dest='.', patterns=None, keep=False, occurrence=False, onMember=None):
+    ''' extracts the members of the .tar.gz archive path selected by patterns (shell wildcards,
+        a folder selecting its contents; None: every member) into dest. The data of the other
+        members is decoded but never stored. With occurrence, decoding stops once every pattern
+        selected a member (a folder, once a member after its contents is found; the gzip trailers
+        are then not checked). onMember, if given, is called with each member extracted. Members
+        that cannot be extracted safely are reported and skipped.
+        Returns (members extracted, members that could not be extracted, patterns that selected
+        no member); raises GZIPError or TarError if the archive is not valid '''
+
+    gz = GZIP(path)
+    tar = TarStream(gz)
+    pending = set(patterns or ())
+    found = set()
+    extracted = failed = 0
+    try:
+        for member in tar:
+            if occurrence and patterns is not None:
+                # o conteudo de uma pasta vem a seguir a ela: acaba no primeiro membro fora dela
+                pending -= {p for p in pending & found if not selected(member.name, [p])}
+                if not pending:
+                    break
+            if patterns is not None:
+                matches = [p for p in patterns if selected(member.name, [p])]
+                if not matches:
+                    continue
+                found.update(matches)
+                if not member.isdir():
+                    # um ficheiro dado pelo nome (ou wildcard) fica encontrado; uma pasta continua
+                    pending -= {p for p in matches if fnmatch.fnmatchcase(member.name, p.rstrip('/'))}
+            try:
+                target = extractMember(tar, member, dest, keep)
+            except (TarError, OSError) as e:
+                logger.error('%s', e)
+                failed += 1
+                continue
+            if target is not None:
+                extracted += 1
+                if onMember is not None:
+                    onMember(member)
+            if occurrence and patterns is not None and not pending:
+                break
+    finally:
+        gz.close()
+    return extracted, failed, [p for p in patterns or () if p not in found]
+
+
+def main(argv=None):
+    ''' entry point of the command line. Returns the exit status: 0 on success, 1 if the archive
+        could not be read, 2 (as tar) if members could not be extracted or were not found '''
+
+    parser = argparse.ArgumentParser(description='lists or extracts .tar.gz archives without decompressing them to disk')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('-t', '--list', action='store_true', help='list the members')
+    mode.add_argument('-x', '--extract', action='store_true', help='extract the members')
+    parser.add_argument('archive', help='.tar.gz archive')
+    parser.add_argument('members', nargs='*', help='members to extract (shell wildcards; a folder selects its contents)')
+    parser.add_argument('-C', '--directory', default='.', help='folder to extract to (default: current folder)')
+    parser.add_argument('-k', '--keep-old-files', action='store_true', help='do not replace existing files')
+    parser.add_argument('--occurrence', action='store_true', help='stop once each member given was found')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show details of the members (with -t) or the members extracted')
+    args = parser.parse_intermixed_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    patterns = args.members or None
+    try:
+        if args.list:
+            found = set()
+            for member in iterArchive(args.archive):
+                matches = [p for p in patterns or () if selected(member.name, [p])]
+                if patterns is None or matches:
+                    print(member.listing(args.verbose))
+                    found.update(matches)
+            missing = [p for p in patterns or () if p not in found]
+            for pattern in missing:
+                logger.error('%s: Not found in archive', pattern)
+            if missing:
+                return 2
+        else:
+            onMember = (lambda member: print(member.name)) if args.verbose else None
+            os.makedirs(args.directory, exist_ok=True)
+            extracted, failed, missing = extractArchive(args.archive, args.directory, patterns,
+                                                        args.keep_old_files, args.occurrence, onMember)
+            for pattern in missing:
+                logger.error('%s: Not found in archive', pattern)
+            if failed or missing:
+                return 2
+    except (ValueError, EOFError, OSError) as e:
+        logger.error('%s: %s', args.archive, e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,265 @@
+# Table-driven decoding of canonical Huffman codes (RFC 1951, 3.2.2)
+# Teoria da Informacao, LEI
+
+import threading
+from collections import OrderedDict
+
+
+# number of bits looked up at once in the first level of the table
+ROOT_BITS = 9
+
+# maximum code length allowed by deflate
+MAX_BITS = 15
+
+# table entry for bit patterns that do not correspond to any code
+INVALID = -1
+
+# default number of tables kept by a TableCache
+CACHE_SIZE = 64
+
+# first level width of literal/length tables with pairs of literals (wider, so that more fit)
+PAIR_BITS = 11
+
+# entries with symbol PAIR + (first << 8) + second stand for two literals
+PAIR = 1 << 16
+
+# minimum share of the lookups expected to start with two literals for pairs to be worth building
+MIN_PAIR_SHARE = 0.25
+
+
+def canonicalCodes(lenArray):
+    ''' returns the list of canonical Huffman codes for the given code lengths
+        (codes of symbols with length 0 are left as 0) '''
+
+    max_len = max(lenArray, default=0)
+
+    # numero de codigos com comprimento N
+    bl_count = [0]*(max_len+1)
+    for length in lenArray:
+        bl_count[length] += 1
+    bl_count[0] = 0
+
+    # primeiro codigo de cada comprimento
+    code = 0
+    next_code = [0]*(max_len+1)
+    for bits in range(1, max_len+1):
+        code = (code + bl_count[bits-1]) << 1
+        next_code[bits] = code
+
+    codes = [0]*len(lenArray)
+    for n, length in enumerate(lenArray):
+        if length != 0:
+            codes[n] = next_code[length]
+            next_code[length] += 1
+
+    return codes
+
+
+def pairShare(lenArray, rootBits=PAIR_BITS):
+    ''' share of the code space (the expected fraction of lookups, if the code lengths match
+        the symbol frequencies) taken by two literal codes that fit in rootBits together.
+        Blocks with few such pairs (mostly matches, or literals with long codes as in binary
+        data) do not pay for building a table with pairs '''
+
+    counts = [0] * (MAX_BITS + 1)
+    for length in lenArray[:256]:
+        counts[length] += 1
+    share = 0.0
+    for l1 in range(1, rootBits):
+        if counts[l1]:
+            for l2 in range(1, rootBits - l1 + 1):
+                share += counts[l1] * counts[l2] / (1 << (l1 + l2))
+    return share
+
+
+def reverseBits(code, length):
+    ''' reverses the first length bits of code (Huffman codes are packed starting
+        with their most significant bit, everything else with the least significant one) '''
+
+    rev = 0
+    for i in range(length):
+        rev = (rev << 1) | (code & 1)
+        code >>= 1
+    return rev
+
+
+class HuffmanTable:
+    ''' two-level lookup table for decoding a canonical Huffman code.
+
+        The first level is indexed by the next rootBits bits of the stream (in the
+        order they are read). Each entry holds (symbol << 4) | codeLength, so a single
+        lookup gives both the decoded symbol and the number of bits to consume.
+        Codes longer than rootBits get an entry ~((offset << 4) | subBits) pointing to
+        a second-level table, stored in the same list, indexed by the following subBits bits.
+
+        With literalPairs, a first level entry whose bits start with the codes of two literals
+        (symbols below 256) is ((PAIR + (first << 8) + second) << 4) | length instead, where
+        length is the sum of both code lengths, so that both are decoded with a single lookup. '''
+
+    __slots__ = ('lens', 'maxLen', 'rootBits', 'rootMask', 'table', 'pairs')
+
+    def __init__(self, lenArray, rootBits=ROOT_BITS, literalPairs=False):
+        self.lens = tuple(lenArray)
+        self.maxLen = max(self.lens, default=0)
+        if self.maxLen > MAX_BITS:
+            raise ValueError('code length %d exceeds the maximum of %d' % (self.maxLen, MAX_BITS))
+
+        # a smaller alphabet (e.g. the code lengths one) does not need the full root table,
+        # unless it holds pairs of codes
+        self.rootBits = max(1, min(rootBits, 2 * self.maxLen if literalPairs else self.maxLen))
+        self.rootMask = (1 << self.rootBits) - 1
+        self.table = self.build()
+        self.pairs = literalPairs
+        if literalPairs:
+            self.buildPairs()
+
+    def build(self):
+        ''' fills the lookup table. Raises ValueError if the code lengths are over-subscribed '''
+
+        lens = self.lens
+        root = self.rootBits
+        size = 1 << root
+
+        # soma de Kraft: um codigo valido nunca usa mais do que o espaco disponivel
+        kraft = 0
+        for length in lens:
+            if length:
+                kraft += 1 << (MAX_BITS - length)
+        if kraft > 1 << MAX_BITS:
+            raise ValueError('over-subscribed set of code lengths')
+
+        codes = canonicalCodes(lens)
+        rev = [reverseBits(codes[n], length) for n, length in enumerate(lens)]
+
+        # tamanho de cada tabela de segundo nivel (pelo maior codigo com esse prefixo)
+        subBits = {}
+        for n, length in enumerate(lens):
+            if length > root:
+                prefix = rev[n] & (size - 1)
+                if length - root > subBits.get(prefix, 0):
+                    subBits[prefix] = length - root
+
+        table = [INVALID]*size
+        for prefix in sorted(subBits):
+            bits = subBits[prefix]
+            table[prefix] = ~((len(table) << 4) | bits)
+            table.extend([INVALID]*(1 << bits))
+
+        for n, length in enumerate(lens):
+            if length == 0:
+                continue
+            entry = (n << 4) | length
+            if length <= root:
+                # todos os indices cujos primeiros length bits coincidem com o codigo
+                for i in range(rev[n], size, 1 << length):
+                    table[i] = entry
+            else:
+                sub = ~table[rev[n] & (size - 1)]
+                offset = sub >> 4
+                for i in range(rev[n] >> root, 1 << (sub & 15), 1 << (length - root)):
+                    table[offset + i] = entry
+
+        return table
+
+    def buildPairs(self):
+        ''' replaces the first level entries that start with two literal codes by pair entries
+            (see the class) '''
+
+        table = self.table
+        root = self.rootBits
+        size = 1 << root
+        # as entradas simples, que vao sendo substituidas na tabela
+        single = table[:size]
+        literal = 256 << 4
+
+        # segundos literais possiveis quando restam left bits: os indices com zeros a frente
+        # dao o codigo seguinte se ele couber nesses bits
+        tails = {}
+        for rev, entry in enumerate(single):
+            length = entry & 15
+            # so a primeira ocorrencia de cada literal (rev < 2^length e o proprio codigo)
+            if entry < 0 or entry >= literal or length >= root or rev >> length:
+                continue
+            left = root - length
+            tail = tails.get(left)
+            if tail is None:
+                tail = tails[left] = [e if 0 <= e < literal and e & 15 <= left else -1 for e in single[:1 << left]]
+            # ((PAIR + (first << 8) + second) << 4) | (length + secondLength) = base + entrada do segundo
+            base = ((PAIR + ((entry >> 4) << 8)) << 4) + length
+            table[rev:size:1 << length] = [base + e if e >= 0 else entry for e in tail]
+
+    def lookup(self, bits):
+        ''' returns the entry (symbol << 4) | length for the code at the start of bits
+            (at least maxLen bits of the stream, first bit read in the least significant position) '''
+
+        entry = self.table[bits & self.rootMask]
+        if entry < 0:
+            if entry == INVALID:
+                raise ValueError('invalid Huffman code')
+            entry = ~entry
+            entry = self.table[(entry >> 4) + ((bits >> self.rootBits) & ((1 << (entry & 15)) - 1))]
+            if entry == INVALID:
+                raise ValueError('invalid Huffman code')
+        return entry
+
+
+class TableCache:
+    ''' bounded LRU cache of HuffmanTables keyed by their code lengths, so that blocks that
+        repeat the code lengths of a recent block (frequent in long homogeneous inputs) reuse
+        its table instead of building it again. Tables are never modified after being built,
+        so they can be shared by any number of decoders (and threads) '''
+
+    def __init__(self, maxSize=CACHE_SIZE):
+        self.maxSize = maxSize
+        self.tables = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, lenArray, rootBits=ROOT_BITS, literalPairs=False):
+        ''' returns the HuffmanTable of the code lengths lenArray, building it on a miss.
+            Raises ValueError, as HuffmanTable, if the lengths are not valid '''
+
+        key = (rootBits, literalPairs, tuple(lenArray))
+        with self.lock:
+            table = self.tables.get(key)
+            if table is not None:
+                self.tables.move_to_end(key)
+                self.hits += 1
+                return table
+            self.misses += 1
+
+        table = HuffmanTable(key[2], rootBits, literalPairs)
+        if self.maxSize > 0:
+            with self.lock:
+                self.tables[key] = table
+                while len(self.tables) > self.maxSize:
+                    self.tables.popitem(last=False)
+                    self.evictions += 1
+        return table
+
+    def resize(self, maxSize):
+        ''' changes the maximum number of tables kept, evicting the least recently used '''
+
+        with self.lock:
+            self.maxSize = maxSize
+            while len(self.tables) > max(maxSize, 0):
+                self.tables.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        ''' removes every table and resets the statistics '''
+
+        with self.lock:
+            self.tables.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        ''' returns a dict with the size of the cache and its hit/miss counters '''
+
+        lookups = self.hits + self.misses
+        return {'size': len(self.tables), 'maxSize': self.maxSize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hitRate': self.hits / lookups if lookups else 0.0}
+
+
+# cache shared by every decoder that does not get its own
+TABLE_CACHE = TableCache()
@@ -2,19 +2,30 @@
 # Adapted from Java's implementation of Rui Pedro Paiva
 # Teoria da Informacao, LEI, 2022
 
+from array import array
+
+
+# index of the root node
+ROOT = 0
+
+# value of a missing child (the root is never a child) and index of a node that is not a leaf
+NONE = 0
+INTERNAL = -1
+
+# bit of each direction accepted by addNode/findNode/nextNode
+DIRECTIONS = {'0': 0, '1': 1, 0: 0, 1: 1}
+
 
 class HFNode:
-	'''class for representation of a Huffman node '''
+	'''class for representation of a Huffman node (kept for compatibility: HuffmanTree stores
+	its nodes in arrays and does not create HFNode objects)'''
+
+	__slots__ = ('index', 'level', 'left', 'right')
 
-	index = -1  # if leaf, saves the position in alphabet; otherwise, -1;
-	level = 0 # level of the node in the tree
-	left, right = None, None  # left and right child nodes. If leaf, both are None
-	
-	
 	def __init__(self, i, lv, l=None, r=None):
-		self.index = i
-		self.level = lv
-		self.left = l
+		self.index = i  # if leaf, saves the position in alphabet; otherwise, -1;
+		self.level = lv  # level of the node in the tree
+		self.left = l  # left and right child nodes. If leaf, both are None
 		self.right = r
 	
 	
@@ -24,92 +35,73 @@ class HFNode:
 			
 
 class HuffmanTree:
-	'''class for creating, managing and accessing Huffman trees'''
+	'''class for creating, managing and accessing Huffman trees.
+
+	Nodes are numbers (the root is ROOT): children[2*n + bit] is the child of node n in
+	direction bit (NONE if there is none) and index[n] the position in the alphabet of a leaf
+	(INTERNAL for other nodes). Codes are given as strings of '0's and '1's or, with addCode,
+	as integers with the first bit of the code in the most significant position'''
 	
-	root = curNode = None  
+	__slots__ = ('children', 'index', 'curNode')
 		
 
-	def __init__(self, root=None, curNode=None):
-		if not root:
-			root = HFNode(-1, 0)
-			curNode = root
-		self.root = root
-		self.curNode = curNode
+	def __init__(self):
+		self.children = array('h', [NONE, NONE])
+		self.index = array('h', [INTERNAL])
+		self.curNode = ROOT
 		
 	
+	@property
+	def root(self):
+		return ROOT
+
+	def isLeaf(self, node):
+		''' check if node is leaf '''
+		return self.children[2*node] == NONE and self.children[2*node + 1] == NONE
 
 	def resetCurNode(self):
 		''' position curNode pointer on the root of the tree '''
-		self.curNode = self.root
+		self.curNode = ROOT
 	
 	
 	
+	def addCode(self, code, length, ind):
+		''' Adds a new node to the tree for the code given by the length least significant bits of
+			the integer code (first bit the most significant) and the index ind of the alphabet.
+			returns: 
+				ind: success
+				-1: node already exists
+				-2: code is not longer prefix code'''
+
+		children, index = self.children, self.index
+		node = ROOT
+		# lv: bits que faltam depois do atual
+		for lv in range(length - 1, -1, -1):
+			# trying to create son of leaf --> error, not prefix code
+			if index[node] != INTERNAL:
+				return -2
+			slot = 2*node + ((code >> lv) & 1)
+			child = children[slot]
+			if child == NONE:  # create node: leaf at the last level
+				index.append(ind if lv == 0 else INTERNAL)
+				children.extend((NONE, NONE))
+				child = children[slot] = len(index) - 1
+			elif lv == 0:  # already inserted
+				return -1
+			node = child  # keep on going down
+		return index[node]
+
 	def addNode(self, s, ind, verbose=False):
 		''' Adds a new node to the tree. Gets the code as a string s of zeros and ones and the index of the alphabet.
 			returns: 
-				 0: success
+				 ind: success
 				-1: node already exists
 				-2: code is not longer prefix code'''
 	
-		tmp = self.root
-		lv = 0 
-		l = len(s)
-
-		found = False
-		pos = -3
-					
-		while lv < l and not found:
-			# trying to create son of leaf --> error, not prefix code
-			if tmp.index != -1:
-				pos = -2
-				found = True
-			else:
-				direction = s[lv]
-				
-				if direction == '0': # LEFT
-
-					if lv != l-1 and tmp.left != None:  # keep on going down
-						tmp = tmp.left
-
-					elif tmp.left != None: # already inserted
-						pos = -1
-						found = True
-					
-					
-					else: # create node in the left
-						if lv == l-1:  # leaf						
-							index = ind
-						else:
-							index = -1
-
-						hf = HFNode(index, lv+1)
-						tmp.left = hf
-						tmp = tmp.left
-				
-				
-				elif direction == '1': # RIGHT
-				
-					if lv != l -1 and tmp.right != None: # keep on going down
-						tmp = tmp.right
-
-					elif tmp.right != None: # already inserted
-						pos = -1
-						found = True
-					
-					else: # create node in the right
-						if lv == l-1:  # leaf
-							index = ind
-						else:
-							index = -1
-
-						hf = HFNode(index, lv+1)
-						tmp.right = hf
-						tmp = tmp.right
-							
-			lv += 1	
-				
-		if not found:
-			pos = tmp.index
+		code = 0
+		for direction in s:
+			code = (code << 1) | DIRECTIONS[direction]
+		pos = self.addCode(code, len(s), ind)
 			
 		if verbose:
 			if pos == -1:
@@ -122,6 +114,19 @@ class HuffmanTree:
 		return pos	
 		
 	
+	def findCode(self, code, length, cur=None):
+		''' finds node from cur node (the root if None) following the length least significant bits of
+			the integer code, first bit the most significant. Returns as findNode '''
+
+		children = self.children
+		node = ROOT if cur is None else cur
+		for lv in range(length - 1, -1, -1):
+			node = children[2*node + ((code >> lv) & 1)]
+			if node == NONE:
+				return -1
+		pos = self.index[node]
+		return -2 if pos == INTERNAL else pos
+
 	def findNode(self, s, cur=None, verbose=False):
 		''' finds node from cur node following a string of '0's and '1's for traversing left or right, respectfully.
 			returns:
@@ -129,41 +134,10 @@ class HuffmanTree:
 			-2 if it is prefix of an existing code
 			indice of the alphabet if found '''
 		
-		if cur == None:
-			cur = self.root
-			
-		tmp = cur
-		lv = 0
-		l = len(s)
-		found = True
-		
-		
-		while lv < l and found:
-		
-			direction = s[lv]
-			
-			if direction == '0':
-				if tmp.left != None:
-					tmp = tmp.left
-				else:
-					found = False
-			
-			elif direction == '1':
-				if tmp.right != None:
-					tmp = tmp.right
-				else:
-					found = False
-			
-			
-			lv += 1
-		
-				
-		if not found:
-			pos = -1
-		elif tmp.index == -1:
-			pos = -2
-		else:
-			pos = tmp.index
+		code = 0
+		for direction in s:
+			code = (code << 1) | DIRECTIONS[direction]
+		pos = self.findCode(code, len(s), cur)
 			
 		if verbose:
 			if pos == -1:
@@ -179,31 +153,21 @@ class HuffmanTree:
 
 	
 	def nextNode(self, dir):
-		''' updates curNode based on the direction dir to descend the tree '''
+		''' updates curNode based on the direction dir ('0'/'1' or 0/1) to descend the tree.
+			Returns the index of the alphabet when a leaf is reached, -2 on an internal node
+			and -1 if there is no node in that direction '''
 		
-		if self.curNode.isLeaf():
+		node = self.curNode
+		children = self.children
+		left = children[2*node]
+		right = children[2*node + 1]
+		if left == NONE and right == NONE:
 			return -1
-		
-		if dir == '0':
-			if self.curNode.left != None:
-				self.curNode = self.curNode.left
-				if self.curNode.isLeaf():
-					pos = self.curNode.index
-				else:
-					pos = -2
-			else:
-				pos = -1
-
-		elif dir == '1':
-			if self.curNode.right != None:
-				self.curNode = self.curNode.right
-				if self.curNode.isLeaf():
-					pos = self.curNode.index
-				else:
-					pos = -2
-			
-			else:
-				pos = -1								
-		
-		return pos
 
+		child = right if DIRECTIONS[dir] else left
+		if child == NONE:
+			return -1
+		self.curNode = child
+		if children[2*child] == NONE and children[2*child + 1] == NONE:
+			return self.index[child]
+		return -2
@@ -0,0 +1,96 @@
+# Sliding output window for LZ77 decoding
+# Teoria da Informacao, LEI
+
+
+# maximum distance of a deflate back-reference
+WINDOW_SIZE = 32768
+
+# maximum length of a deflate match
+MAX_MATCH = 258
+
+# default number of bytes decoded between two flushes
+FLUSH_SIZE = 1 << 18
+
+
+class OutputWindow:
+    ''' preallocated bytearray with the last WINDOW_SIZE bytes of output followed by the
+        bytes decoded since the last flush.
+
+        Bytes are written at pos. Once pos reaches limit the pending bytes (from flushed
+        to pos) must be taken and the window slid back, which keeps the memory used
+        constant. There is always room for one more match after limit. '''
+
+    def __init__(self, flushSize=FLUSH_SIZE):
+        self.buf = bytearray(WINDOW_SIZE + flushSize + MAX_MATCH)
+        self.limit = WINDOW_SIZE + flushSize
+        self.pos = 0        # next position to write
+        self.flushed = 0    # bytes before this position were already taken
+        self.total = 0      # bytes taken since the window was created
+
+    def isFull(self):
+        ''' True if the pending bytes must be flushed before decoding more '''
+
+        return self.pos >= self.limit
+
+    def space(self):
+        ''' number of bytes that can be written before the window is full '''
+
+        return max(0, self.limit - self.pos)
+
+    def write(self, data):
+        ''' copies data (at most space() bytes) to the window '''
+
+        n = len(data)
+        self.buf[self.pos:self.pos + n] = data
+        self.pos += n
+
+    def copyMatch(self, distance, length):
+        ''' appends length bytes copied from distance bytes back '''
+
+        buf = self.buf
+        pos = self.pos
+        start = pos - distance
+        if distance > pos:
+            raise ValueError('invalid distance %d: only %d bytes of output available' % (distance, pos))
+        if distance >= length:
+            # as zonas de origem e destino nao se sobrepoem: uma unica copia
+            buf[pos:pos + length] = buf[start:start + length]
+        else:
+            # sobreposicao (ex: distancia 1, 2 ou 4): o padrao de distance bytes repete-se
+            buf[pos:pos + length] = (buf[start:pos] * (length // distance + 1))[:length]
+        self.pos = pos + length
+
+    def prime(self, history):
+        ''' fills an empty window with the last WINDOW_SIZE bytes of history, the output that
+            precedes the point where decoding resumes. They are not returned by take '''
+
+        history = history[-WINDOW_SIZE:]
+        self.write(history)
+        self.flushed = self.pos
+
+    def history(self):
+        ''' returns a copy of the last WINDOW_SIZE bytes written '''
+
+        return bytes(self.buf[max(0, self.pos - WINDOW_SIZE):self.pos])
+
+    def produced(self):
+        ''' number of bytes written to the window since it was created '''
+
+        return self.total + self.pos - self.flushed
+
+    def take(self):
+        ''' returns a memoryview of the pending bytes and marks them as flushed.
+            The view is only valid until the next call to slide '''
+
+        view = memoryview(self.buf)[self.flushed:self.pos]
+        self.total += self.pos - self.flushed
+        self.flushed = self.pos
+        return view
+
+    def slide(self):
+        ''' moves the last WINDOW_SIZE bytes to the start of the buffer. Must be called
+            after take, when the window is full '''
+
+        if self.pos > WINDOW_SIZE:
+            self.buf[0:WINDOW_SIZE] = self.buf[self.pos - WINDOW_SIZE:self.pos]
+            self.pos = self.flushed = WINDOW_SIZE
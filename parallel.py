@@ -0,0 +1,531 @@
+# Parallel decoding of multi-member gzip files
+# Teoria da Informacao, LEI
+
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from crc32 import crc32
+from gzip import GZIP, GZIPHeader, GZIPError
+from huffmantable import HuffmanTable
+from outputwindow import OutputWindow, WINDOW_SIZE, MAX_MATCH
+
+
+logger = logging.getLogger(__name__)
+
+# ID1, ID2 and CM (deflate) of a gzip member header
+MAGIC = b'\x1f\x8b\x08'
+
+# size of the gzip header without optional fields
+HEADER_SIZE = 10
+
+# size of the trailer (CRC32 and ISIZE) and of the smallest member: a header, an empty fixed block and a trailer
+TRAILER_SIZE = 8
+MIN_MEMBER = HEADER_SIZE + 2 + TRAILER_SIZE
+
+# largest ratio between the output and the compressed size of a deflate stream: a match of 258
+# bytes takes at least 2 bits
+MAX_RATIO = 1032
+
+# XFL and OS values written by real compressors (RFC 1952, 2.3.1)
+VALID_XFL = (0, 2, 4)
+VALID_OS = tuple(range(14)) + (255,)
+
+
+def findMemberCandidates(data):
+    ''' returns the offsets in data (bytes-like) where a gzip member may start: ID1, ID2,
+        CM = 8 and the reserved flag bits set to zero. Every member starts at one of them,
+        but some may be false positives inside compressed data '''
+
+    offsets = []
+    i = data.find(MAGIC)
+    while i >= 0:
+        if i + HEADER_SIZE <= len(data) and data[i + 3] & 0xe0 == 0:
+            offsets.append(i)
+        i = data.find(MAGIC, i + 1)
+    return offsets
+
+
+def plausibleMember(data, offset):
+    ''' True if a member header that a real compressor could have written starts at offset of data,
+        followed by a valid block type. Used to tell member starts from magic bytes inside
+        compressed data '''
+
+    gzh = GZIPHeader()
+    end = gzh.parse(data, offset)
+    if end < 0 or end >= len(data) or gzh.FLG & 0xe0:
+        return False
+    if gzh.XFL not in VALID_XFL or gzh.OS not in VALID_OS:
+        return False
+    # BTYPE 11 e reservado
+    return (data[end] >> 1) & 3 != 3
+
+
+def plausibleStarts(data, candidates):
+    ''' the candidates (from findMemberCandidates, starting with 0) that are worth decoding ahead:
+        a plausible header (see plausibleMember) preceded by a trailer whose ISIZE the compressed
+        data since the previous plausible start could have produced. Real members may still be
+        rejected (e.g. after a false positive), so the others must be decoded on demand '''
+
+    starts = candidates[:1]
+    for offset in candidates[1:]:
+        size = offset - starts[-1]
+        if size < MIN_MEMBER or not plausibleMember(data, offset):
+            continue
+        # ISIZE e o tamanho modulo 2^32, nunca maior que o tamanho real
+        if int.from_bytes(data[offset - 4:offset], 'little') <= MAX_RATIO * size:
+            starts.append(offset)
+    return starts
+
+
+def decodeMemberToFile(path, offset, outPath):
+    ''' worker: decodes the single member starting at offset of file path into outPath.
+        Returns (offset, end offset of the member, decompressed size) or
+        (offset, None, error message) if there is no valid member at offset '''
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        gz = GZIP(f)
+        try:
+            if gz.getHeader() != 0:
+                raise GZIPError('invalid gzip header')
+            with open(outPath, 'wb') as out:
+                for view in gz.inflate():
+                    out.write(view)
+        except (ValueError, EOFError) as e:
+            # a saida parcial de um falso candidato nao serve para nada
+            if os.path.exists(outPath):
+                os.remove(outPath)
+            return offset, None, str(e)
+
+    # o BitReader conta as posicoes a partir de offset e o trailer termina num byte
+    return offset, offset + gz.reader.tell() // 8, gz.window.produced()
+
+
+def decompressMembers(path, out, jobs=None):
+    ''' decompresses every member of the gzip file path on a pool of jobs processes
+        (default: one per CPU) and writes their outputs, in order, to out (a binary file or a Sink).
+        Only plausible member starts are decoded ahead; a member found at the end of the previous
+        one is decoded when it is reached if it was not. A file with a single plausible member is
+        decoded by chunks instead (see decompressSpeculative). Returns the number of bytes written.
+        Raises GZIPError if a member is corrupted '''
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            raise GZIPError('invalid gzip header')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            candidates = findMemberCandidates(mm)
+            starts = plausibleStarts(mm, candidates)
+
+    if not candidates or candidates[0] != 0:
+        raise GZIPError('invalid gzip header')
+    if len(starts) == 1:
+        return decompressSpeculative(path, out, jobs)
+    candidates = set(candidates)
+
+    members = total = 0
+    with tempfile.TemporaryDirectory() as tmp, ProcessPoolExecutor(jobs) as pool:
+        def submit(offset):
+            return pool.submit(decodeMemberToFile, path, offset, os.path.join(tmp, str(offset)))
+
+        # os inicios plausiveis sao descodificados de antemao; so os que formam a cadeia de membros sao usados
+        futures = {offset: submit(offset) for offset in starts}
+
+        offset = 0
+        try:
+            while True:
+                if offset not in futures:
+                    # membro cujo inicio foi rejeitado por plausibleStarts
+                    futures[offset] = submit(offset)
+                start, end, info = futures[offset].result()
+                if end is None:
+                    raise GZIPError('member %d at offset %d: %s' % (members + 1, offset, info))
+
+                with open(os.path.join(tmp, str(offset)), 'rb') as part:
+                    shutil.copyfileobj(part, out)
+                os.remove(os.path.join(tmp, str(offset)))
+                members += 1
+                total += info
+
+                if end >= size:
+                    break
+                if end not in candidates:
+                    logger.warning('%s: trailing garbage after member %d ignored', path, members)
+                    break
+                offset = end
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+    return total
+
+
+# compressed bytes given to each task of the speculative mode
+SPECULATIVE_CHUNK = 1 << 22
+
+# compressed bytes at the start of a chunk where its first block is looked for; if it is not
+# found there, the chunk is decoded sequentially
+SEARCH_WINDOW = 1 << 18
+
+# compressed bytes scanned for block starts at a time
+SCAN_STEP = 1 << 12
+
+# largest LEN of a stored block
+MAX_STORED = 65535
+
+# the unknown window of a MarkerWindow: 256 + i stands for its byte i
+MARKERS = list(range(256, 256 + WINDOW_SIZE))
+
+# bytes decoded between two flushes of a MarkerWindow: kept small, it is created per task
+MARKER_FLUSH = 1 << 16
+
+# KRAFT[v]: Kraft sum, in units of 2^-7, of the four 3 bit code lengths packed in v
+KRAFT = [sum(128 >> (v >> 3 * i & 7) for i in range(4) if v >> 3 * i & 7) for v in range(1 << 12)]
+
+# FIELDS[HCLEN]: mask of the HCLEN + 4 code lengths of the code lengths alphabet
+FIELDS = [(1 << 3 * (HCLEN + 4)) - 1 for HCLEN in range(16)]
+
+
+class MarkerWindow(OutputWindow):
+    ''' OutputWindow over a list of ints, for decoding from a block whose preceding output is
+        not known yet: the 32 KB before it hold markers 256 + i standing for byte i of that
+        unknown window, and back-references into it copy the markers. Pending output is taken
+        as array('H') and resolved once the real window is known (see resolveMarkers) '''
+
+    def __init__(self, flushSize=MARKER_FLUSH):
+        self.buf = MARKERS + [0] * (flushSize + MAX_MATCH)
+        self.limit = WINDOW_SIZE + flushSize
+        self.reset()
+
+    def reset(self):
+        ''' forgets the output, to decode again from another block '''
+
+        self.buf[:WINDOW_SIZE] = MARKERS
+        self.pos = self.flushed = WINDOW_SIZE
+        self.total = 0
+
+    def take(self):
+        data = array('H', self.buf[self.flushed:self.pos])
+        self.total += self.pos - self.flushed
+        self.flushed = self.pos
+        return data
+
+    def hasMarkers(self):
+        ''' True while the last 32 KB still refer to the unknown window '''
+
+        if self.produced() < WINDOW_SIZE:
+            return True
+        return max(self.buf[max(0, self.pos - WINDOW_SIZE):self.pos]) >= 256
+
+
+class _ChunkEnd(Exception):
+    ''' raised at the first block that starts after the end of a chunk '''
+
+
+class _WindowKnown(Exception):
+    ''' raised when a MarkerWindow no longer has markers, to continue with an OutputWindow '''
+
+
+def resolveMarkers(data, history):
+    ''' replaces the markers of data (array('H') from a MarkerWindow) with the bytes of history,
+        the output preceding the chunk. Returns bytes '''
+
+    history = bytes(WINDOW_SIZE - len(history)) + history[-WINDOW_SIZE:]
+    table = list(range(256)) + list(history)
+    return bytes(map(table.__getitem__, data))
+
+
+def inflateRange(gz, startBit, stopBit, history=None, markers=None):
+    ''' decodes the deflate blocks of gz (a GZIP with verify False over a seekable input) from
+        the block starting at startBit up to the first block starting at or after stopBit (or the
+        end of the member). history is the output before startBit or None if unknown, in which
+        case markers (a MarkerWindow, by default a new one) is used until the output no longer
+        depends on it. Returns (endBit, parts, final): parts is a list of bytes and array('H')
+        with the output, endBit the start of the next block or the end of the member trailer if final '''
+
+    def onBlockStart(gz):
+        if gz.reader.tell() >= stopBit:
+            raise _ChunkEnd()
+        if isinstance(gz.window, MarkerWindow) and not gz.window.hasMarkers():
+            raise _WindowKnown()
+
+    gz.onBlockStart = onBlockStart
+    gz.reader.seekBit(startBit)
+
+    parts = []
+    while True:
+        if history is None:
+            window = markers if markers is not None else MarkerWindow()
+            window.reset()
+        else:
+            window = OutputWindow()
+            window.prime(history)
+        try:
+            for view in gz.inflate(window):
+                parts.append(bytes(view) if isinstance(view, memoryview) else view)
+            return gz.reader.tell(), parts, True
+        except _ChunkEnd:
+            parts.append(window.take() if history is None else bytes(window.take()))
+            return gz.reader.tell(), parts, False
+        except _WindowKnown:
+            # a partir daqui a saida ja nao depende da janela desconhecida
+            parts.append(window.take())
+            history = bytes(window.buf[window.pos - WINDOW_SIZE:window.pos])
+
+
+def decodeChunk(path, startBit, stopBit, history=None):
+    ''' inflateRange over the file path. Returns (endBit, parts, final) '''
+
+    gz = GZIP(path, verify=False)
+    try:
+        return inflateRange(gz, startBit, stopBit, history)
+    finally:
+        gz.close()
+
+
+def dynamicBlockStarts(data, start, stop):
+    ''' generator of the bit offsets in data[start:stop] (bytes-like) where a non final dynamic
+        block may start: BTYPE 10, HLIT and HDIST in range and a complete code for the code
+        lengths alphabet (which deflate encoders always produce). The first tests are made on
+        every bit offset at once, over the bits of the range as a single integer '''
+
+    X = int.from_bytes(data[start:stop + 2], 'little')
+    # BFINAL = 0 e BTYPE = 10
+    M = ~X & ~(X >> 1) & X >> 2
+    # HLIT e HDIST ate 29: 30 e 31 sao os valores com os 4 bits de cima a 1
+    M &= ~(X >> 4 & X >> 5 & X >> 6 & X >> 7) & ~(X >> 9 & X >> 10 & X >> 11 & X >> 12)
+    M &= (1 << (stop - start) * 8) - 1
+
+    # bits de M, do menos significativo para o mais significativo
+    bits = bin(M)[:1:-1]
+    i = bits.find('1')
+    while i >= 0:
+        bit = start * 8 + i
+        w = int.from_bytes(data[bit >> 3:(bit >> 3) + 11], 'little') >> (bit & 7)
+        w = w >> 17 & FIELDS[w >> 13 & 15]
+        if KRAFT[w & 4095] + KRAFT[w >> 12 & 4095] + KRAFT[w >> 24 & 4095] + KRAFT[w >> 36 & 4095] + KRAFT[w >> 48] == 128:
+            yield bit
+        i = bits.find('1', i + 1)
+
+
+def storedBlockStarts(data, start, stop):
+    ''' generator of the non final stored blocks whose LEN is in data[start:stop] (bytes-like):
+        NLEN is the complement of LEN and the header and padding bits before LEN are zero, as
+        encoders write them. As the header may then be anywhere in those bits, yields
+        (first, last), the range of bit offsets where the block may start '''
+
+    X = int.from_bytes(data[start:stop + 4], 'little')
+    # bit q de Y a 1 se os 16 bits a partir de q (LEN) forem o complemento dos 16 seguintes (NLEN)
+    Y = X ^ X >> 16
+    Y &= Y >> 1
+    Y &= Y >> 2
+    Y &= Y >> 4
+    Y &= Y >> 8
+    # LEN esta alinhado ao byte
+    Y &= int.from_bytes(b'\x01' * (stop - start), 'little')
+
+    bits = bin(Y)[:1:-1]
+    i = bits.find('1')
+    while i >= 0:
+        byte = start + i // 8
+        if byte > 1 and not data[byte - 1] & 0xe0:
+            # BFINAL e BTYPE ocupam 3 bits, seguidos de menos de 8 de padding
+            last = first = byte * 8 - 3
+            while first > byte * 8 - 10 and not data[(first - 1) >> 3] >> ((first - 1) & 7) & 1:
+                first -= 1
+            yield first, last
+        i = bits.find('1', i + 1)
+
+
+def storedBlockEnds(data, byte):
+    ''' bit offsets where the block after a stored block that spans byte of data (bytes-like) may
+        start, for the stored blocks found in the 64 KB before it, nearest first. Inside stored
+        data there is nothing else to look for '''
+
+    ends = []
+    for first, last in storedBlockStarts(data, max(0, byte - MAX_STORED - 4), byte):
+        # LEN comeca no byte a seguir ao cabecalho e ao padding
+        start = (last + 3) // 8
+        end = start + 4 + (data[start] | data[start + 1] << 8)
+        if end >= byte:
+            ends.append(end * 8)
+    return ends[::-1]
+
+
+def validCode(lens):
+    ''' True if the code lengths lens form a code that zlib accepts: complete, a single code of
+        length 1 or no code at all '''
+
+    kraft = 0
+    for length in lens:
+        if length:
+            kraft += 32768 >> length
+    return kraft == 32768 or kraft == 0 or (kraft == 16384 and max(lens) == 1)
+
+
+def dynamicHeaderAt(gz, bit):
+    ''' True if the header of a dynamic block that zlib accepts starts at bit of gz (a GZIP over
+        a seekable input): its code lengths decode with the code lengths code, the end of block
+        symbol has a code and the literal/length and distance codes are valid. Much cheaper
+        than decoding the block, it rejects nearly every false candidate '''
+
+    try:
+        gz.reader.seekBit(bit + 3)
+        HLIT, HDIST, HCLEN = gz.readDynamicBlock()
+        # a tabela nao vai para a cache: quase todos os candidatos sao falsos
+        CLENTable = HuffmanTable(gz.storeCLENLengths(HCLEN))
+        lens = gz.storeTreeCodeLens(HLIT + 257 + HDIST + 1, CLENTable)
+    except (ValueError, EOFError):
+        return False
+    return lens[256] != 0 and validCode(lens[:HLIT + 257]) and validCode(lens[HLIT + 257:])
+
+
+def speculativeChunk(path, startByte, stopByte, window=SEARCH_WINDOW):
+    ''' worker: finds the first block starting in the first window bytes of [startByte, stopByte[
+        from which the stream decodes without errors up to stopByte. If startByte is inside a
+        stored block, the end of that block is tried first. Otherwise candidates are tried in
+        order, stored blocks by LEN and NLEN and dynamic ones by their header (dynamicHeaderAt)
+        first, all over the same mapped GZIP and MarkerWindow.
+        Returns (first, last, result): the block starts somewhere from bit first to last (the
+        padding of a stored block) and result is from inflateRange; None if no block was found '''
+
+    gz = GZIP(path, verify=False)
+    markers = MarkerWindow()
+    try:
+        data = gz.data
+        # dados stored (ex: incompressiveis) nao precisam de procura
+        for bit in storedBlockEnds(data, startByte):
+            try:
+                return bit, bit, inflateRange(gz, bit, stopByte * 8, None, markers)
+            except (ValueError, EOFError):
+                continue
+
+        end = min(startByte + window, stopByte)
+        for scanStart in range(startByte, end, SCAN_STEP):
+            scanStop = min(scanStart + SCAN_STEP, end)
+            candidates = [(bit, bit, False) for bit in dynamicBlockStarts(data, scanStart, scanStop)]
+            # um bloco stored que possa comecar antes de startByte pertence ao chunk anterior
+            candidates += [(first, last, True) for first, last in storedBlockStarts(data, scanStart, scanStop)
+                           if first >= startByte * 8]
+            for first, last, stored in sorted(candidates):
+                if not stored and not dynamicHeaderAt(gz, first):
+                    continue
+                try:
+                    return first, last, inflateRange(gz, last, stopByte * 8, None, markers)
+                except (ValueError, EOFError):
+                    continue
+    finally:
+        gz.close()
+    return None
+
+
+def decompressSpeculative(path, out, jobs=None, chunkSize=SPECULATIVE_CHUNK):
+    ''' decompresses the gzip file path into the binary file out, decoding its first member in
+        parallel: the compressed data is split in chunks of chunkSize bytes and each worker
+        looks for a block near the start of its chunk (see speculativeChunk) and decodes it with
+        the unknown preceding window marked. The chunks are then stitched in order, resolving
+        the markers with the output of the previous chunk; a chunk whose start does not match
+        the end of the previous one is decoded again sequentially. Remaining members are decoded
+        sequentially, and so is everything with a single process or chunk. jobs (default: one
+        per CPU) is capped at the number of CPUs: speculation only pays off on idle ones.
+        Returns the number of bytes written. Raises GZIPError if the data is not valid '''
+
+    gz = GZIP(path)
+    try:
+        if gz.getHeader() != 0:
+            raise GZIPError('invalid gzip header')
+        startBit = gz.reader.tell()
+        size = gz.fileSize
+
+        # limites dos chunks; o ultimo vai ate ao fim do membro
+        bounds = list(range(startBit // 8 + chunkSize, size - 8, chunkSize))
+        jobs = min(jobs or os.cpu_count() or 1, os.cpu_count() or 1)
+        if jobs == 1 or not bounds:
+            # nada para descodificar em paralelo
+            return gz.decompressTo(out)
+    except GZIPError:
+        raise
+    except (ValueError, EOFError) as e:
+        raise GZIPError(str(e)) from e
+    finally:
+        gz.close()
+    stops = [b * 8 for b in bounds] + [size * 8 + 1]
+
+    crc = total = 0
+    history = b''
+    expected = startBit
+    final = False
+
+    def submit(i):
+        if i == 0:
+            return pool.submit(decodeChunk, path, startBit, stops[0], b'')
+        return pool.submit(speculativeChunk, path, bounds[i - 1], bounds[i] if i < len(bounds) else size)
+
+    with ProcessPoolExecutor(jobs) as pool:
+        ahead = 2 * jobs
+        futures = deque(submit(i) for i in range(min(ahead, len(stops))))
+        try:
+            for i in range(len(stops)):
+                found = futures.popleft().result()
+                if i + ahead < len(stops):
+                    futures.append(submit(i + ahead))
+
+                if i == 0:
+                    result = found
+                elif found is not None and found[0] <= expected <= found[1]:
+                    result = found[2]
+                else:
+                    # o worker nao encontrou o bloco certo: descodifica o chunk a partir do fim do anterior
+                    logger.debug('chunk %d: speculative start does not match, decoding it sequentially', i)
+                    try:
+                        result = decodeChunk(path, expected, stops[i], history)
+                    except (ValueError, EOFError) as e:
+                        raise GZIPError(str(e)) from e
+
+                expected, parts, final = result
+                # os marcadores referem-se a janela anterior ao inicio do chunk
+                chunkHistory = history
+                for part in parts:
+                    data = resolveMarkers(part, chunkHistory) if isinstance(part, array) else part
+                    out.write(data)
+                    crc = crc32(data, crc)
+                    total += len(data)
+                    history = (history + data)[-WINDOW_SIZE:]
+                if final:
+                    break
+        finally:
+            for future in futures:
+                future.cancel()
+
+    with open(path, 'rb') as f:
+        # o trailer sao os 8 bytes antes do fim do membro
+        f.seek(expected // 8 - 8)
+        trailer = f.read(8)
+        if int.from_bytes(trailer[0:4], 'little') != crc:
+            raise GZIPError('CRC32 mismatch')
+        if int.from_bytes(trailer[4:8], 'little') != total & 0xffffffff:
+            raise GZIPError('ISIZE mismatch')
+
+        # restantes membros, se houver
+        if expected // 8 < size:
+            f.seek(0)
+            gz = GZIP(f)
+            gz.reader.seekBit(expected)
+            gz.numMembers = 1
+            try:
+                while gz.nextMember():
+                    for view in gz.inflate():
+                        out.write(view)
+                        total += len(view)
+            except (ValueError, EOFError) as e:
+                raise GZIPError(str(e)) from e
+            finally:
+                gz.close()
+
+    return total
@@ -0,0 +1,213 @@
+# Pipelined decompression: input prefetch, decoding and output on separate threads
+# Teoria da Informacao, LEI
+
+import io
+import queue
+import threading
+
+from crc32 import crc32
+from gzip import GZIP, GZIPError
+from outputwindow import FLUSH_SIZE, MAX_MATCH
+
+
+# number of chunks (input) or buffers (output) that can wait between two threads
+DEPTH = 4
+
+# compressed bytes read from the source at a time by PrefetchReader
+PREFETCH_CHUNK = 1 << 18
+
+# how often (in seconds) a thread blocked on a full queue checks if it was stopped
+POLL = 0.1
+
+
+class PrefetchReader(io.RawIOBase):
+    ''' read-only binary file over source (a path or a binary file), read ahead by a thread in
+        chunks of chunkSize bytes, up to depth chunks, so that slow reads overlap with decoding.
+        Errors of the source are raised by read. close() stops the thread and, if source was a
+        path, closes the file '''
+
+    def __init__(self, source, chunkSize=PREFETCH_CHUNK, depth=DEPTH):
+        if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+            self.f = open(source, 'rb')
+            self.ownsFile = True
+        else:
+            self.f = source
+            self.ownsFile = False
+        self.name = getattr(self.f, 'name', '')
+        self.chunkSize = chunkSize
+        self.chunks = queue.Queue(depth)
+        self.chunk = memoryview(b'')
+        self.eof = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.prefetch, name='gzip-prefetch', daemon=True)
+        self.thread.start()
+
+    def prefetch(self):
+        ''' thread: reads the source until its end, an error or close() '''
+
+        while not self.stopped.is_set():
+            try:
+                data = self.f.read(self.chunkSize)
+            except Exception as e:
+                data = e
+            # espera por espaco na fila, mas acaba se o leitor for fechado
+            while not self.stopped.is_set():
+                try:
+                    self.chunks.put(data, timeout=POLL)
+                    break
+                except queue.Full:
+                    pass
+            if not data or isinstance(data, Exception):
+                return
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def read(self, n=-1):
+        ''' returns up to n bytes (the rest of the current chunk if n < 0), b'' at the end '''
+
+        if not self.chunk:
+            if self.eof:
+                return b''
+            data = self.chunks.get()
+            if isinstance(data, Exception):
+                self.eof = True
+                raise data
+            if not data:
+                self.eof = True
+                return b''
+            self.chunk = memoryview(data)
+        if n is None or n < 0 or n >= len(self.chunk):
+            data, self.chunk = self.chunk, memoryview(b'')
+        else:
+            data, self.chunk = self.chunk[:n], self.chunk[n:]
+        return bytes(data)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            if self.ownsFile:
+                self.f.close()
+        super().close()
+
+
+class OutputWriter(threading.Thread):
+    ''' thread that writes the decompressed output to out (a binary file or a Sink) and computes
+        the CRC32 and size of each member, checking them against its trailer. The decoder copies
+        each piece of output into one of depth reusable buffers (waiting for a free one if the
+        writer is behind) and queues it. An error of the writer is raised by the next put '''
+
+    def __init__(self, out, bufferSize=FLUSH_SIZE + MAX_MATCH, depth=DEPTH):
+        super().__init__(name='gzip-writer', daemon=True)
+        self.out = out
+        self.pending = queue.Queue()
+        self.free = queue.Queue()
+        for i in range(depth):
+            self.free.put(bytearray(bufferSize))
+        self.error = None
+        self.size = 0           # bytes written
+        self.crc = 0            # CRC32 of the current member
+        self.memberSize = 0
+        self.start()
+
+    def put(self, view):
+        ''' queues a copy of view (which the decoder will overwrite) to be written '''
+
+        if self.error is not None:
+            raise self.error
+        buf = self.free.get()
+        if len(buf) < len(view):
+            buf = bytearray(len(view))
+        buf[:len(view)] = view
+        self.pending.put((buf, len(view)))
+
+    def endMember(self, trailer):
+        ''' queues the check of the member written so far against trailer, (CRC32, ISIZE) '''
+
+        self.pending.put((None, trailer))
+
+    def finish(self):
+        ''' waits until everything queued is written. Raises the error of the writer, if any '''
+
+        self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        ''' waits for the writer to end, after what was already queued '''
+
+        self.pending.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            buf, n = item
+            # depois de um erro os buffers continuam a ser devolvidos, para o decoder nao ficar bloqueado
+            if self.error is None:
+                try:
+                    if buf is None:
+                        self.checkMember(*n)
+                    else:
+                        with memoryview(buf) as view:
+                            self.out.write(view[:n])
+                            self.crc = crc32(view[:n], self.crc)
+                        self.size += n
+                        self.memberSize += n
+                except Exception as e:
+                    self.error = e
+            if buf is not None:
+                self.free.put(buf)
+
+    def checkMember(self, CRC32, ISIZE):
+        if CRC32 != self.crc:
+            raise GZIPError('CRC32 mismatch: trailer has %08x, output has %08x' % (CRC32, self.crc))
+        if ISIZE != self.memberSize & 0xffffffff:
+            raise GZIPError('ISIZE mismatch: trailer has %d, output has %d bytes' % (ISIZE, self.memberSize))
+        self.crc = self.memberSize = 0
+
+
+def openPipelined(source, flushSize=FLUSH_SIZE, chunkSize=PREFETCH_CHUNK, depth=DEPTH):
+    ''' GZIP over a PrefetchReader of source (a path or a binary file), for decompressPipelined.
+        Its trailers are checked by the OutputWriter, not by the decoder; close() stops the
+        prefetch thread '''
+
+    gz = GZIP(PrefetchReader(source, chunkSize, depth), verify=False, useMmap=False, flushSize=flushSize)
+    # o GZIP fecha o PrefetchReader (e este o ficheiro, se o abriu)
+    gz.ownsFile = True
+    return gz
+
+
+def decompressPipelined(gz, out, depth=DEPTH):
+    ''' writes the decompressed data of every member of gz (from openPipelined, with the header of
+        the first member already read) to out, a binary file or a Sink, on an OutputWriter thread,
+        so that decoding overlaps with reading and writing. Returns the number of bytes written.
+        Raises GZIPError if the data is not valid and the errors of out '''
+
+    writer = OutputWriter(out, gz.flushSize + MAX_MATCH, depth)
+    try:
+        while True:
+            for view in gz.inflate():
+                writer.put(view)
+            writer.endMember(gz.trailer)
+            if not gz.nextMember():
+                break
+    except BaseException as e:
+        # o writer acaba o que tem na fila; o primeiro erro e o que conta
+        writer.stop()
+        if isinstance(e, (ValueError, EOFError)) and not isinstance(e, GZIPError):
+            raise GZIPError(str(e)) from e
+        raise
+    writer.finish()
+    return writer.size
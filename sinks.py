@@ -0,0 +1,95 @@
+# Output sinks: destinations for the decompressed data (file, standard output, callback, hash, nothing)
+# Teoria da Informacao, LEI
+
+import hashlib
+import sys
+
+
+class Sink:
+    ''' destination of decompressed data, used as a binary file by GZIP.decompressTo: write gets
+        each piece of output (a bytes-like object that is only valid during the call) and close
+        finishes the output. size counts the bytes written. Base class: discards the data '''
+
+    size = 0
+
+    def write(self, data):
+        n = len(data)
+        self.size += n
+        return n
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullSink(Sink):
+    ''' discards the output, only counting it (to test a file, as gzip -t) '''
+
+
+class FileSink(Sink):
+    ''' writes to target, a path (the file is created and closed by the sink) or a binary file '''
+
+    def __init__(self, target):
+        if isinstance(target, (str, bytes)) or hasattr(target, '__fspath__'):
+            self.f = open(target, 'wb')
+            self.ownsFile = True
+        else:
+            self.f = target
+            self.ownsFile = False
+
+    def write(self, data):
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        if self.ownsFile:
+            self.f.close()
+        else:
+            self.f.flush()
+
+
+class StdoutSink(FileSink):
+    ''' writes to the standard output (which is flushed, not closed) '''
+
+    def __init__(self):
+        super().__init__(sys.stdout.buffer)
+
+
+class CallbackSink(Sink):
+    ''' calls callback with each piece of output, as bytes (copied, since the decoder reuses its
+        buffer) or, if copy is False, as the memoryview itself, only valid during the call '''
+
+    def __init__(self, callback, copy=True):
+        self.callback = callback
+        self.copy = copy
+
+    def write(self, data):
+        self.size += len(data)
+        self.callback(bytes(data) if self.copy else data)
+        return len(data)
+
+
+class HashSink(Sink):
+    ''' computes a hashlib digest (e.g. 'sha256', 'md5') of the output instead of storing it '''
+
+    def __init__(self, algorithm='sha256'):
+        self.hash = hashlib.new(algorithm)
+
+    def write(self, data):
+        self.size += len(data)
+        self.hash.update(data)
+        return len(data)
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
@@ -0,0 +1,35 @@
+import random
+import sys
+import zlib
+
+from benchmark import peakRSS
+from compressor import DeflateEncoder, HASH_SIZE
+
+
+# dados incompressiveis: quase todas as strings de 3 bytes sao novas
+data = random.Random(2024).randbytes(3 << 20)
+CHUNK = 1 << 16
+
+failed = 0
+
+encoder = DeflateEncoder(1)
+out = []
+for i in range(0, len(data), CHUNK):
+	out.append(encoder.compress(data[i:i + CHUNK]))
+out.append(encoder.flush())
+
+# a tabela de hash tem tamanho fixo e a memoria nao cresce com o input (so o buffer e as cadeias)
+print('hash table: %d entries (expected %d)' % (len(encoder.head), HASH_SIZE))
+failed += len(encoder.head) != HASH_SIZE
+
+# com um dicionario de strings (sem limite) o pico passava os 450 MB
+peak = peakRSS()
+if peak is not None:
+	print('peak RSS: %.1f MB (limit 150 MB)' % (peak / 1e6))
+	failed += peak > 150e6
+
+ok = zlib.decompress(b''.join(out), -15) == data
+print('output decodes back: %s' % ('ok' if ok else 'WRONG'))
+failed += not ok
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,62 @@
+import os
+import random
+import sys
+import tempfile
+import zlib
+
+import gunzip
+import parallel
+
+
+# ficheiro com varios membros (como "cat a.gz b.gz c.gz"): texto, dados aleatorios e texto
+rng = random.Random(2024)
+words = [bytes(rng.choice(b'etaoinshrdlu') for k in range(rng.randint(1, 8))) for i in range(500)]
+parts = [b' '.join(rng.choice(words) for i in range(60000)),
+         rng.randbytes(200000),
+         b'\n'.join(rng.choice(words) for i in range(40000))]
+data = b''.join(parts)
+
+failed = 0
+
+# conta as chamadas do modo por membros feitas pela linha de comandos
+calls = []
+decompressMembers = parallel.decompressMembers
+
+def countMembers(path, out, jobs=None):
+	calls.append(path)
+	return decompressMembers(path, out, jobs)
+
+gunzip.decompressMembers = countMembers
+
+with tempfile.TemporaryDirectory() as tmp:
+	path = os.path.join(tmp, 'members.gz')
+	with open(path, 'wb') as f:
+		for part in parts:
+			f.write(zlib.compress(part, 6, 31))
+
+	# gunzip -j 2 -k -o tmp members.gz
+	status = gunzip.main(['-q', '-j', '2', '-k', '-o', tmp, path])
+	with open(os.path.join(tmp, 'members'), 'rb') as f:
+		ok = f.read() == data
+	print('gunzip -j 2: status %d, output %s, decompressMembers called %d time(s)' % (status, 'ok' if ok else 'WRONG', len(calls)))
+	failed += status != 0 or not ok or len(calls) != 1
+
+	# um so membro: decompressMembers passa ao modo especulativo, com o mesmo resultado
+	single = os.path.join(tmp, 'single.gz')
+	with open(single, 'wb') as f:
+		f.write(zlib.compress(data, 6, 31))
+	status = gunzip.main(['-q', '-j', '2', '-k', '-f', '-o', tmp, single])
+	with open(os.path.join(tmp, 'single'), 'rb') as f:
+		ok = f.read() == data
+	print('gunzip -j 2, one member: status %d, output %s' % (status, 'ok' if ok else 'WRONG'))
+	failed += status != 0 or not ok
+
+	# um membro corrompido tem de ser reportado
+	with open(path, 'r+b') as f:
+		f.seek(os.path.getsize(path) - 6)
+		f.write(b'\xff')
+	status = gunzip.main(['-q', '-t', '-j', '2', path])
+	print('gunzip -t -j 2, corrupted trailer: status %d (expected 1)' % status)
+	failed += status != 1 or len(calls) != 3
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,403 @@
+# Search of regular expressions in gzip files (as "zgrep"), without writing the decompressed data
+# Teoria da Informacao, LEI
+
+import argparse
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from gunzip import expandInputs
+from gzip import GZIP
+from gzlist import expandTree
+from outputwindow import FLUSH_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+# a file is binary (as for grep) if its first output has a NUL byte
+BINARY_BYTE = b'\0'
+
+# bytes of a binary file kept between two pieces of output, so that matches up to this long
+# across them are found (binary files are not split in lines)
+OVERLAP = 1 << 12
+
+# kinds of the output records: matching line (or part of it, with -o), context line, separator
+MATCH, CONTEXT, SEPARATOR = ':', '-', '--'
+
+
+class GrepResult:
+    ''' outcome of searching one file: output records (kind, line number, offset, bytes), number
+        of matching lines, whether the file is binary and error message (None if it could be read) '''
+
+    __slots__ = ('path', 'records', 'count', 'binary', 'error')
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self.count = 0
+        self.binary = False
+        self.error = None
+
+
+class Searcher:
+    ''' streaming search of regex (a compiled bytes pattern) in data fed piece by piece with feed
+        and ended with finish. The last incomplete line is carried to the next piece, so matches
+        are found wherever the pieces are cut. Matching lines are stored in records with their
+        line number and offset (from the start of the data), along with before and after lines
+        of context; with onlyMatching, the matched parts instead. Stops after maxCount matching
+        lines (0: no limit); context lines are then not stored, but still separate the groups (as
+        grep). Binary data is searched without lines: only the matches are counted '''
+
+    def __init__(self, regex, maxCount=0, before=0, after=0, onlyMatching=False, countOnly=False):
+        self.regex = regex
+        self.maxCount = maxCount
+        self.before = before
+        self.after = after
+        self.onlyMatching = onlyMatching
+        self.countOnly = countOnly
+        self.records = []
+        self.count = 0
+        self.binary = None          # decidido pela primeira saida
+
+        self.buf = b''              # data carried from the previous pieces plus the new one
+        self.pieces = []            # pieces of a line still without newline, joined when it arrives
+        self.bufStart = 0           # offset of buf[0] in the data
+        self.searchFrom = 0         # index of buf where the search goes on
+        self.cursor = (0, 1)        # an index of buf and the number of its line
+        self.printed = 0            # offset after the last line in records
+        self.afterLeft = 0          # lines of context still to be stored after a match
+        self.lastLine = -1          # offset of the last matching line (with -o)
+        self.done = False           # True after maxCount matches (context may still be missing)
+
+    @property
+    def finished(self):
+        ''' True when more data would not change the result '''
+
+        return self.done and self.afterLeft == 0
+
+    def feed(self, data):
+        ''' searches the next piece of data (a bytes-like object, only read during the call).
+            Returns False once finished '''
+
+        data = bytes(data)
+        if self.binary is None:
+            self.binary = BINARY_BYTE in data
+        if not self.binary and b'\n' not in data:
+            # nada a procurar ainda: juntar ao buf a cada peca seria quadratico numa linha longa
+            self.pieces.append(data)
+            return True
+        self.joinPieces(data)
+        if self.binary:
+            self.scanBinary(len(self.buf) - OVERLAP)
+        else:
+            self.scanText(self.buf.rfind(b'\n') + 1)
+        return not self.finished
+
+    def joinPieces(self, data=b''):
+        ''' appends the pending pieces and data to buf '''
+
+        self.pieces.append(data)
+        self.buf = b''.join([self.buf] + self.pieces)
+        self.pieces = []
+
+    def finish(self):
+        ''' searches what is left at the end of the data (a last line without a newline) '''
+
+        self.joinPieces()
+        if self.binary:
+            self.scanBinary(len(self.buf))
+        elif not self.finished:
+            self.scanText(len(self.buf), final=True)
+        self.buf = b''
+
+    # ---------------------------------------------------------------- text
+
+    def lineOf(self, i):
+        ''' number of the line that contains index i of buf '''
+
+        pos, line = self.cursor
+        if i >= pos:
+            line += self.buf.count(b'\n', pos, i)
+        else:
+            line -= self.buf.count(b'\n', i, pos)
+        self.cursor = (i, line)
+        return line
+
+    def lineEnd(self, i, end):
+        ''' index after the line (with its newline) that contains index i of buf, up to end '''
+
+        j = self.buf.find(b'\n', i, end)
+        return end if j < 0 else j + 1
+
+    def store(self, kind, start, stop):
+        ''' stores buf[start:stop] (a line, without its newline) as a record. With onlyMatching
+            only the position is kept (the matches are stored by storeMatch) '''
+
+        if not self.countOnly and not self.onlyMatching:
+            line = self.buf[start:stop]
+            if line.endswith(b'\n'):
+                line = line[:-1]
+            self.records.append((kind, self.lineOf(start), self.bufStart + start, line))
+        self.printed = self.bufStart + stop
+
+    def storeMatch(self, m):
+        ''' stores the part of buf matched by m (with onlyMatching), unless it is empty '''
+
+        if not self.countOnly and m.end() > m.start():
+            self.records.append((MATCH, self.lineOf(m.start()), self.bufStart + m.start(), m.group()))
+
+    def storeBefore(self, start):
+        ''' stores the lines of context before the matching line that starts at index start of buf
+            (those not stored yet), preceded by a separator if they do not follow the last record '''
+
+        buf = self.buf
+        first = start
+        oldest = max(0, self.printed - self.bufStart)
+        for _ in range(self.before):
+            if first <= oldest:
+                break
+            first = buf.rfind(b'\n', 0, first - 1) + 1
+        if (self.before or self.after) and self.records and self.bufStart + first > self.printed:
+            self.records.append((SEPARATOR, 0, 0, b''))
+        i = first
+        while i < start:
+            j = self.lineEnd(i, start)
+            self.store(CONTEXT, i, j)
+            i = j
+
+    def storeAfter(self, stop):
+        ''' stores the pending lines of context after a match, up to index stop of buf '''
+
+        i = self.printed - self.bufStart
+        while self.afterLeft and i < stop:
+            j = self.lineEnd(i, stop)
+            self.store(CONTEXT, i, j)
+            self.afterLeft -= 1
+            i = j
+
+    def scanText(self, end, final=False):
+        ''' searches the complete lines of buf, which end at end (or the last line too, if final),
+            and keeps the rest (with the lines that may be needed as context before a match) for
+            the next piece '''
+
+        buf = self.buf
+        pos = self.searchFrom
+        # um match vazio no fim e da linha seguinte, a nao ser que a ultima linha nao tenha newline
+        last = end if final and end and buf[end - 1] != 10 else end - 1
+        while pos <= last and (not self.done or self.onlyMatching):
+            m = self.regex.search(buf, pos, end)
+            if m is None or m.start() > last:
+                break
+            start = buf.rfind(b'\n', 0, m.start()) + 1
+            stop = self.lineEnd(m.start(), end)
+            self.storeAfter(start)
+
+            if self.onlyMatching and self.bufStart + start == self.lastLine:
+                # cada linha conta uma vez, mesmo com varios matches (e depois do ultimo contado, como grep)
+                self.storeMatch(m)
+                pos = max(m.end(), m.start() + 1)
+                continue
+            if self.done:
+                break
+
+            self.storeBefore(start)
+            if self.onlyMatching:
+                self.storeMatch(m)
+                self.store(MATCH, start, stop)
+                self.lastLine = self.bufStart + start
+                pos = max(m.end(), m.start() + 1)
+            else:
+                self.store(MATCH, start, stop)
+                pos = max(stop, m.start() + 1)
+            self.afterLeft = self.after
+
+            self.count += 1
+            if self.maxCount and self.count >= self.maxCount:
+                self.done = True
+        self.storeAfter(end)
+
+        # guarda a linha incompleta e as que podem ser contexto do proximo match
+        keep = end
+        for _ in range(self.before):
+            if keep == 0:
+                break
+            keep = buf.rfind(b'\n', 0, keep - 1) + 1
+        line = self.lineOf(end)
+        self.buf = buf[keep:]
+        self.bufStart += keep
+        self.searchFrom = end - keep
+        self.cursor = (end - keep, line)
+
+    # ---------------------------------------------------------------- binary
+
+    def scanBinary(self, limit):
+        ''' counts the matches that start before index limit of buf, keeping the rest for the next
+            piece. Stops at the first match unless counting '''
+
+        buf = self.buf
+        pos = self.searchFrom
+        while not self.done and pos < limit:
+            m = self.regex.search(buf, pos)
+            if m is None or m.start() >= limit:
+                break
+            self.count += 1
+            pos = max(m.end(), m.start() + 1)
+            if not self.countOnly or (self.maxCount and self.count >= self.maxCount):
+                self.done = True
+        limit = max(limit, 0)
+        self.buf = buf[limit:]
+        self.bufStart += limit
+        self.searchFrom = max(0, pos - limit)
+
+
+def compilePatterns(patterns, fixed=False, ignoreCase=False, word=False):
+    ''' one bytes regular expression that matches any of patterns (text), literally if fixed.
+        Raises re.error if a pattern is not valid '''
+
+    parts = [os.fsencode(pattern) for pattern in patterns]
+    if fixed:
+        parts = [re.escape(part) for part in parts]
+    regex = b'|'.join(b'(?:' + part + b')' for part in parts)
+    if word:
+        regex = rb'\b(?:' + regex + rb')\b'
+    return re.compile(regex, re.MULTILINE | (re.IGNORECASE if ignoreCase else 0))
+
+
+def grepFile(path, regex, maxCount=0, before=0, after=0, onlyMatching=False, countOnly=False, flushSize=FLUSH_SIZE):
+    ''' searches regex in the decompressed data of the gzip file path, as it is decoded (the data
+        is never stored). Decoding stops once maxCount matching lines were found, so the trailers
+        are only checked if the whole file is read. Returns a GrepResult (errors are returned,
+        not raised, so it can run in a worker) '''
+
+    result = GrepResult(path)
+    searcher = Searcher(regex, maxCount, before, after, onlyMatching, countOnly)
+    gz = None
+    try:
+        gz = GZIP(path, flushSize=flushSize)
+        for view in gz.stream():
+            if not searcher.feed(view):
+                break
+        searcher.finish()
+    except (ValueError, EOFError, OSError) as e:
+        result.error = str(e)
+    finally:
+        if gz is not None:
+            gz.close()
+    result.records = searcher.records
+    result.count = searcher.count
+    result.binary = bool(searcher.binary)
+    return result
+
+
+def grepFiles(paths, regex, jobs=1, **options):
+    ''' searches regex in the gzip files of paths (folders are scanned recursively), on a pool of
+        jobs processes if jobs > 1 (0: one per CPU). options are those of grepFile.
+        Returns the GrepResult of each file, in order '''
+
+    files = expandTree(paths)
+    work = partial(grepFile, regex=regex, **options)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            return list(pool.map(work, files, chunksize=max(1, len(files) // (4 * jobs))))
+    return [work(path) for path in files]
+
+
+def printResult(result, out, withName=False, lineNumbers=False, byteOffsets=False, countOnly=False, namesOnly=False):
+    ''' writes what grep would print for result to out, a binary file '''
+
+    name = os.fsencode(result.path)
+    if namesOnly:
+        if result.count:
+            out.write(name + b'\n')
+        return
+    if countOnly:
+        out.write((name + b':' if withName else b'') + b'%d\n' % result.count)
+        return
+    if result.binary:
+        if result.count:
+            out.write(b'Binary file ' + name + b' matches\n')
+        return
+    for kind, line, offset, data in result.records:
+        if kind == SEPARATOR:
+            out.write(b'--\n')
+            continue
+        sep = kind.encode()
+        prefix = name + sep if withName else b''
+        if lineNumbers:
+            prefix += b'%d' % line + sep
+        if byteOffsets:
+            prefix += b'%d' % offset + sep
+        out.write(prefix + data + b'\n')
+
+
+def main(argv=None):
+    ''' entry point of the command line. Returns the exit status, as grep: 0 if a line was
+        found, 1 if none was, 2 if a file could not be read '''
+
+    parser = argparse.ArgumentParser(description='searches regular expressions in gzip files, without decompressing them to disk')
+    parser.add_argument('pattern', nargs='?', help='regular expression (Python syntax), unless given with -e')
+    parser.add_argument('inputs', nargs='*', help='gzip files, glob patterns or folders (scanned recursively)')
+    parser.add_argument('-e', '--regexp', action='append', dest='patterns', metavar='PATTERN',
+                        help='pattern to search (may be repeated: lines matching any of them are found)')
+    parser.add_argument('-F', '--fixed-strings', action='store_true', help='the patterns are plain strings')
+    parser.add_argument('-i', '--ignore-case', action='store_true', help='ignore case')
+    parser.add_argument('-w', '--word-regexp', action='store_true', help='only match whole words')
+    parser.add_argument('-m', '--max-count', type=int, default=0, help='stop reading a file after this many matching lines')
+    parser.add_argument('-n', '--line-number', action='store_true', help='show the line number of each line')
+    parser.add_argument('-b', '--byte-offset', action='store_true', help='show the offset in the decompressed data of each line (or match, with -o)')
+    parser.add_argument('-o', '--only-matching', action='store_true', help='only show the matched parts of the lines')
+    parser.add_argument('-c', '--count', action='store_true', help='only show the number of matching lines of each file')
+    parser.add_argument('-l', '--files-with-matches', action='store_true', help='only show the names of the files with matches')
+    parser.add_argument('-A', '--after-context', type=int, default=0, metavar='NUM', help='show NUM lines after each match')
+    parser.add_argument('-B', '--before-context', type=int, default=0, metavar='NUM', help='show NUM lines before each match')
+    parser.add_argument('-C', '--context', type=int, default=None, metavar='NUM', help='show NUM lines before and after each match')
+    parser.add_argument('-H', '--with-filename', action='store_true', default=None, help='show the file name of each line')
+    parser.add_argument('--no-filename', action='store_false', dest='with_filename', help='do not show file names')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes searching files at once (0: one per CPU)')
+    args = parser.parse_args(argv)
+
+    if args.patterns is None:
+        if args.pattern is None:
+            parser.error('no pattern given')
+        args.patterns = [args.pattern]
+    elif args.pattern is not None:
+        args.inputs.insert(0, args.pattern)
+    if not args.inputs:
+        parser.error('no input files given')
+    if min(args.max_count, args.after_context, args.before_context, args.context or 0) < 0:
+        parser.error('counts must not be negative')
+    if args.context is not None:
+        args.after_context = args.before_context = args.context
+    try:
+        regex = compilePatterns(args.patterns, args.fixed_strings, args.ignore_case, args.word_regexp)
+    except re.error as e:
+        parser.error('invalid pattern: %s' % e)
+
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    maxCount = 1 if args.files_with_matches else args.max_count
+    countOnly = args.count or args.files_with_matches
+    results = grepFiles(expandInputs(args.inputs), regex, args.jobs, maxCount=maxCount,
+                        before=args.before_context, after=args.after_context,
+                        onlyMatching=args.only_matching, countOnly=countOnly)
+
+    # como grep: nomes dos ficheiros so quando ha mais do que um
+    withName = len(results) > 1 if args.with_filename is None else args.with_filename
+    out = sys.stdout.buffer
+    failed = found = 0
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            logger.error('%s: %s', result.path, result.error)
+            continue
+        found += result.count > 0
+        printResult(result, out, withName, args.line_number, args.byte_offset, args.count, args.files_with_matches)
+    out.flush()
+    return 2 if failed else 0 if found else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())